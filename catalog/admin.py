@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Author, Genre, Book, BookInstance, Language
+from .models import Author, Genre, Book, BookInstance, Language, ImportJob, LibraryStats, LoanReminder, BookSimilarity
 
 
 class BooksInstanceInline(admin.TabularInline):
@@ -11,22 +11,45 @@ class BookAdmin(admin.ModelAdmin):
     list_display = ('title', 'author', 'display_genre')
     inlines = [BooksInstanceInline]
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('author').prefetch_related('genre')
+
 
 @admin.register(BookInstance)
 class BookInstanceAdmin(admin.ModelAdmin):
-    list_display = ('book', 'status', 'borrower', 'due_back', 'id')
+    list_display = ('book', 'status', 'borrower', 'due_back', 'overdue_since', 'fine', 'id')
     list_filter = ('status', 'due_back')
+    list_select_related = ('book', 'borrower')
 
     fieldsets = (
         (None, {
             'fields': ('book', 'imprint', 'id')
         }),
         ('Availability', {
-            'fields': ('status', 'due_back', 'borrower')
+            'fields': ('status', 'due_back', 'borrower', 'overdue_since', 'fine')
         }),
     )
 
 
+@admin.register(ImportJob)
+class ImportJobAdmin(admin.ModelAdmin):
+    list_display = ('file', 'status', 'rows_processed', 'books_created', 'worker', 'created', 'finished')
+    list_filter = ('status',)
+
+
+@admin.register(LoanReminder)
+class LoanReminderAdmin(admin.ModelAdmin):
+    list_display = ('instance', 'borrower', 'due_back', 'created', 'sent')
+    list_filter = ('sent',)
+    list_select_related = ('instance__book', 'borrower')
+
+
+@admin.register(BookSimilarity)
+class BookSimilarityAdmin(admin.ModelAdmin):
+    list_display = ('book', 'similar', 'score', 'co_likes')
+    list_select_related = ('book', 'similar')
+
+
 class AuthorAdmin(admin.ModelAdmin):
     list_display = ('last_name', 'first_name', 'date_of_birth', 'date_of_death')
     fields = ['first_name', 'last_name', ('date_of_birth', 'date_of_death')]
@@ -36,3 +59,4 @@ class AuthorAdmin(admin.ModelAdmin):
 admin.site.register(Author, AuthorAdmin)
 admin.site.register(Genre)
 admin.site.register(Language)
+admin.site.register(LibraryStats)
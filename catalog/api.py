@@ -0,0 +1,263 @@
+"""
+Read-only JSON API of the catalog: books, authors, genres, languages and copies.
+
+Every endpoint reads values() rows with only the columns of the fields the
+caller asked for (?fields=id,title,copies), so no model instances are built
+and unused columns and joins are never queried. Lists are cursor paginated
+with catalog.pagination on an indexed ordering, without COUNT(*); the
+response carries the next and previous page urls. A page of books is one
+query, or two when the genres are requested. Copy counts come from
+correlated subqueries on the bookinstance book index, so the page query
+doesn't need a GROUP BY.
+
+    GET /catalog/api/books/?fields=id,title,genres&genre=3&language=English&available=1&page_size=100
+"""
+from collections import defaultdict
+
+from django.db.models import Exists, OuterRef
+from django.http import Http404, JsonResponse
+from django.urls import reverse
+from django.views import generic
+
+from .models import Author, Book, BookInstance, Genre, Language, copy_count
+from .pagination import paginate_by_cursor
+
+API_PAGE_SIZE = 20
+API_MAX_PAGE_SIZE = 100
+# Наибольший id, который помещается в BigAutoField (64-битное целое со знаком)
+MAX_ID = 2 ** 63 - 1
+
+
+class ApiError(Exception):
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def parse_id(value, name):
+    """
+    Returns value as an id if it is a decimal number, None otherwise.
+    A number that doesn't fit in an id column is an ApiError, the database would fail on it.
+    """
+    if not value.isdecimal():
+        return None
+    if int(value) > MAX_ID:
+        raise ApiError('%s id is out of range' % name)
+    return int(value)
+
+
+class ApiListView(generic.View):
+    """
+    Cursor paginated list of values() rows with sparse fieldsets.
+
+    columns maps every public field to the values() columns it needs, annotations
+    holds the expressions of computed columns and render_<field>(row) builds
+    a field that isn't a single column. Subclasses add filters in filter_queryset().
+    """
+    model = None
+    columns = {}
+    annotations = {}
+    ordering = ('id',)
+    # Запросы на страницу
+    query_budget = 1
+
+    def requested_fields(self):
+        fields = self.request.GET.get('fields')
+        if not fields:
+            return list(self.columns)
+        fields = [field.strip() for field in fields.split(',') if field.strip()]
+        unknown = [field for field in fields if field not in self.columns]
+        if unknown:
+            raise ApiError('Unknown fields: %s. Available fields: %s' % (', '.join(unknown), ', '.join(self.columns)))
+        return fields
+
+    def page_size(self):
+        try:
+            size = int(self.request.GET.get('page_size', API_PAGE_SIZE))
+        except ValueError:
+            raise ApiError('page_size must be a number')
+        return min(max(size, 1), API_MAX_PAGE_SIZE)
+
+    def get_queryset(self, fields):
+        selected = dict.fromkeys(self.ordering)
+        for field in fields:
+            selected.update(dict.fromkeys(self.columns[field]))
+        plain = [column for column in selected if column not in self.annotations]
+        computed = {column: self.annotations[column] for column in selected if column in self.annotations}
+        return self.model.objects.order_by().values(*plain, **computed)
+
+    def filter_queryset(self, queryset):
+        return queryset
+
+    def render_row(self, row, fields):
+        result = {}
+        for field in fields:
+            render = getattr(self, 'render_' + field, None)
+            result[field] = render(row) if render else row[self.columns[field][0]]
+        return result
+
+    def render_rows(self, rows, fields):
+        return [self.render_row(row, fields) for row in rows]
+
+    def page_url(self, cursor):
+        if cursor is None:
+            return None
+        params = self.request.GET.copy()
+        params['cursor'] = cursor
+        return self.request.path + '?' + params.urlencode()
+
+    def get(self, request, *args, **kwargs):
+        try:
+            fields = self.requested_fields()
+            queryset = self.filter_queryset(self.get_queryset(fields))
+            page = paginate_by_cursor(queryset, self.ordering, self.page_size(), request.GET.get('cursor'), with_count=False)
+        except ApiError as error:
+            return JsonResponse({'error': str(error)}, status=error.status)
+        except Http404:
+            return JsonResponse({'error': 'Invalid cursor'}, status=400)
+        return JsonResponse({
+            'next': self.page_url(page.next_cursor),
+            'previous': self.page_url(page.previous_cursor),
+            'results': self.render_rows(page.object_list, fields),
+        })
+
+
+class BookApiView(ApiListView):
+    """
+    Books with their author, language, genres, like count and copy availability.
+    Filters: ?genre=<id or name>, ?language=<id or name>, ?available=1.
+    """
+    model = Book
+    columns = {
+        'id': ('id',),
+        'url': ('id',),
+        'title': ('title',),
+        'summary': ('summary',),
+        'isbn': ('isbn',),
+        'author': ('author_id', 'author__first_name', 'author__last_name'),
+        'language': ('language_id', 'language__name'),
+        'genres': ('id',),
+        'cover': ('online_cover',),
+        'like_count': ('like_count',),
+        'copies': ('total_copies', 'available_copies'),
+    }
+    annotations = {
+        'total_copies': copy_count(),
+        'available_copies': copy_count(status__exact='a'),
+    }
+    # Книги и, если запрошены, их жанры
+    query_budget = 2
+
+    def filter_queryset(self, queryset):
+        genre = self.request.GET.get('genre')
+        if genre:
+            # Подзапрос вместо join по жанрам: книга не дублируется и не нужен DISTINCT
+            genre_id = parse_id(genre, 'genre')
+            genres = Genre.objects.filter(**({'name__iexact': genre} if genre_id is None else {'pk': genre_id}))
+            queryset = queryset.filter(pk__in=Book.genre.through.objects.filter(genre__in=genres).values('book_id'))
+        language = self.request.GET.get('language')
+        if language:
+            language_id = parse_id(language, 'language')
+            queryset = queryset.filter(**({'language__name__iexact': language} if language_id is None else {'language_id': language_id}))
+        if self.request.GET.get('available') == '1':
+            queryset = queryset.filter(Exists(BookInstance.objects.filter(book=OuterRef('pk'), status__exact='a')))
+        return queryset
+
+    def render_rows(self, rows, fields):
+        if 'genres' in fields:
+            # Жанры всей страницы одним запросом к промежуточной таблице
+            self.genres = defaultdict(list)
+            through = Book.genre.through.objects.filter(book_id__in=[row['id'] for row in rows]).order_by('genre__name')
+            for book_id, genre_id, name in through.values_list('book_id', 'genre_id', 'genre__name'):
+                self.genres[book_id].append({'id': genre_id, 'name': name})
+        return super().render_rows(rows, fields)
+
+    def render_url(self, row):
+        return reverse('book-detail', args=[row['id']])
+
+    def render_author(self, row):
+        if row['author_id'] is None:
+            return None
+        return {'id': row['author_id'], 'first_name': row['author__first_name'], 'last_name': row['author__last_name'],
+                'url': reverse('author-detail', args=[row['author_id']])}
+
+    def render_language(self, row):
+        if row['language_id'] is None:
+            return None
+        return {'id': row['language_id'], 'name': row['language__name']}
+
+    def render_genres(self, row):
+        return self.genres.get(row['id'], [])
+
+    def render_copies(self, row):
+        return {'total': row['total_copies'], 'available': row['available_copies']}
+
+
+class AuthorApiView(ApiListView):
+    """
+    Authors. Filter: ?last_name=<name>, answered by the (last_name, first_name) index.
+    """
+    model = Author
+    columns = {
+        'id': ('id',),
+        'url': ('id',),
+        'first_name': ('first_name',),
+        'last_name': ('last_name',),
+        'date_of_birth': ('date_of_birth',),
+        'date_of_death': ('date_of_death',),
+    }
+
+    def filter_queryset(self, queryset):
+        last_name = self.request.GET.get('last_name')
+        if last_name:
+            queryset = queryset.filter(last_name=last_name)
+        return queryset
+
+    def render_url(self, row):
+        return reverse('author-detail', args=[row['id']])
+
+
+class GenreApiView(ApiListView):
+    model = Genre
+    columns = {
+        'id': ('id',),
+        'name': ('name',),
+    }
+
+
+class LanguageApiView(ApiListView):
+    model = Language
+    columns = {
+        'id': ('id',),
+        'name': ('name',),
+    }
+
+
+class CopyApiView(ApiListView):
+    """
+    Copies of books and their availability, without borrowers.
+    Filters: ?book=<id>, ?status=<a, o, r or m>.
+    """
+    model = BookInstance
+    columns = {
+        'id': ('id',),
+        'book': ('book_id',),
+        'imprint': ('imprint',),
+        'status': ('status',),
+        'due_back': ('due_back',),
+    }
+
+    def filter_queryset(self, queryset):
+        book = self.request.GET.get('book')
+        if book:
+            book_id = parse_id(book, 'book')
+            if book_id is None:
+                raise ApiError('book must be a book id')
+            queryset = queryset.filter(book_id=book_id)
+        status = self.request.GET.get('status')
+        if status:
+            if status not in dict(BookInstance.LOAN_STATUS):
+                raise ApiError('status must be one of %s' % ', '.join(dict(BookInstance.LOAN_STATUS)))
+            queryset = queryset.filter(status__exact=status)
+        return queryset
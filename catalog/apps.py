@@ -1,6 +1,14 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class CatalogConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'catalog'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from .search import create_search_index
+
+        # FTS5 таблицы не описываются моделями, поэтому создаются после migrate
+        post_migrate.connect(create_search_index, sender=self)
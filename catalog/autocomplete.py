@@ -0,0 +1,212 @@
+"""
+Process-local snapshot of book titles and author names for typeahead.
+
+The snapshot is a sorted prefix index kept in flat, array-backed
+structures (one string per text column plus array offsets) instead of
+a list of model instances, so it costs tens of bytes per entry.
+Book saves and deletes are applied to it incrementally from signals:
+the packed columns are kept, and the changed books go to a small sorted
+delta that lookups merge with them. Only when the delta grows past
+MAX_DELTA_SIZE is it folded into new columns, in one linear pass over
+the two sorted sequences. Author changes and bulk imports trigger a
+full rebuild, and a snapshot older than SNAPSHOT_TTL is rebuilt to pick
+up changes made by other worker processes.
+"""
+import heapq
+import sys
+import threading
+import time
+import unicodedata
+from array import array
+from bisect import bisect_left
+from itertools import islice
+
+from .models import Author, Book
+
+BOOK, AUTHOR = 0, 1
+# Максимальная длина названия или имени, которая хранится в снимке
+MAX_LABEL_LENGTH = 100
+# Максимальное количество записей в снимке, остальные не попадают в подсказки
+MAX_ENTRIES = 2_000_000
+# Через сколько секунд снимок перестраивается целиком
+SNAPSHOT_TTL = 600
+# Сколько измененных книг копится в дельте, прежде чем она сливается с колонками
+MAX_DELTA_SIZE = 1000
+
+
+def normalize(text):
+    """
+    Lower-cased text without diacritics and punctuation: 'Le Guin, Úrsula' -> 'le guin ursula'.
+    """
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(char if char.isalnum() else ' ' for char in text if not unicodedata.combining(char))
+    return ' '.join(text.lower().split())
+
+
+def book_entries(book_id, title, first_name, last_name):
+    author = ' '.join(name for name in (first_name, last_name) if name)
+    yield normalize(title)[:MAX_LABEL_LENGTH], BOOK, book_id, title[:MAX_LABEL_LENGTH], author[:MAX_LABEL_LENGTH]
+
+
+def author_entries(author_id, first_name, last_name):
+    name = ('%s %s' % (first_name, last_name))[:MAX_LABEL_LENGTH]
+    yield normalize(name), AUTHOR, author_id, name, ''
+    yield normalize('%s %s' % (last_name, first_name)), AUTHOR, author_id, name, ''
+
+
+class _Column:
+    """
+    Strings packed into a single str, item i is text[offsets[i]:offsets[i + 1]].
+    """
+    def __init__(self, values):
+        self.offsets = array('I', [0])
+        parts = []
+        position = 0
+        for value in values:
+            parts.append(value)
+            position += len(value)
+            self.offsets.append(position)
+        self.text = ''.join(parts)
+
+    def __getitem__(self, i):
+        return self.text[self.offsets[i]:self.offsets[i + 1]]
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def memory_bytes(self):
+        return sys.getsizeof(self.text) + sys.getsizeof(self.offsets)
+
+
+class CatalogSnapshot:
+    """
+    Immutable prefix index over (key, kind, id, label, author) entries: sorted packed columns
+    plus a delta of changed (kind, id) pairs, whose packed entries are skipped.
+    """
+    def __init__(self, entries, presorted=False):
+        if not presorted:
+            # Усечение после сортировки, чтобы в снимок попали первые по порядку ключи
+            entries = heapq.nsmallest(MAX_ENTRIES, entries)
+        keys, labels, authors = [], [], []
+        self.kinds, self.ids = array('b'), array('q')
+        for key, kind, object_id, label, author in islice(entries, MAX_ENTRIES):
+            keys.append(key)
+            self.kinds.append(kind)
+            self.ids.append(object_id)
+            labels.append(label)
+            authors.append(author)
+        self.keys, self.labels, self.authors = _Column(keys), _Column(labels), _Column(authors)
+        self.changes = {}
+        self.delta = []
+        self.built = time.monotonic()
+
+    @classmethod
+    def from_database(cls):
+        def entries():
+            books = Book.objects.values_list('id', 'title', 'author__first_name', 'author__last_name')
+            for row in books.iterator(chunk_size=10000):
+                yield from book_entries(*row)
+            for row in Author.objects.values_list('id', 'first_name', 'last_name').iterator(chunk_size=10000):
+                yield from author_entries(*row)
+        return cls(entries())
+
+    def _packed(self, start=0):
+        for i in range(start, len(self)):
+            if (self.kinds[i], self.ids[i]) not in self.changes:
+                yield self.keys[i], self.kinds[i], self.ids[i], self.labels[i], self.authors[i]
+
+    def entries(self):
+        return heapq.merge(self._packed(), self.delta)
+
+    def replace(self, changes):
+        """
+        Returns a new snapshot with the entries of the changed (kind, id) pairs replaced.
+        changes maps (kind, id) to a list of new entries (empty for a deletion).
+        The new snapshot shares the packed columns and only sorts its delta,
+        a delta larger than MAX_DELTA_SIZE is merged into new columns.
+        """
+        snapshot = object.__new__(CatalogSnapshot)
+        snapshot.__dict__.update(self.__dict__)
+        snapshot.changes = {**self.changes, **changes}
+        snapshot.delta = sorted(entry for new_entries in snapshot.changes.values() for entry in new_entries)
+        if len(snapshot.changes) > MAX_DELTA_SIZE:
+            return CatalogSnapshot(snapshot.entries(), presorted=True)
+        return snapshot
+
+    def lookup(self, text, limit=10):
+        """
+        Returns up to limit (kind, id, label, author) tuples whose key starts with the normalized text.
+        """
+        prefix = normalize(text)
+        if not prefix:
+            return []
+        results, seen = [], set()
+        matches = heapq.merge(self._packed(bisect_left(self.keys, prefix)),
+                              islice(self.delta, bisect_left(self.delta, (prefix,)), None))
+        for key, kind, object_id, label, author in matches:
+            if len(results) >= limit or not key.startswith(prefix):
+                break
+            if (kind, object_id) not in seen:
+                seen.add((kind, object_id))
+                results.append((kind, object_id, label, author))
+        return results
+
+    def __len__(self):
+        return len(self.ids)
+
+    def memory_bytes(self):
+        return (self.keys.memory_bytes() + self.labels.memory_bytes() + self.authors.memory_bytes()
+                + sys.getsizeof(self.kinds) + sys.getsizeof(self.ids))
+
+    def stats(self):
+        books = self.kinds.count(BOOK)
+        return {
+            'entries': len(self),
+            'books': books,
+            'memory_bytes': self.memory_bytes(),
+            'bytes_per_100k_books': round(self.memory_bytes() * 100000 / books) if books else 0,
+        }
+
+
+_lock = threading.Lock()
+_snapshot = None
+_pending = {}
+
+
+def get_snapshot():
+    """
+    Returns the snapshot of this process, building it or applying pending changes first.
+    """
+    global _snapshot, _pending
+    with _lock:
+        if _snapshot is None or time.monotonic() - _snapshot.built > SNAPSHOT_TTL:
+            _snapshot, _pending = CatalogSnapshot.from_database(), {}
+        elif _pending:
+            _snapshot, _pending = _snapshot.replace(_pending), {}
+        return _snapshot
+
+
+def invalidate_snapshot():
+    """
+    Drops the snapshot, the next lookup rebuilds it from the database.
+    """
+    global _snapshot
+    with _lock:
+        _snapshot = None
+        _pending.clear()
+
+
+def book_saved(book):
+    if _snapshot is None:
+        return
+    author = book.author
+    entries = list(book_entries(book.id, book.title, author and author.first_name, author and author.last_name))
+    with _lock:
+        _pending[(BOOK, book.id)] = entries
+
+
+def book_deleted(book_id):
+    if _snapshot is None:
+        return
+    with _lock:
+        _pending[(BOOK, book_id)] = []
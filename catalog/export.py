@@ -0,0 +1,93 @@
+"""
+Streaming export of the catalog in the all_books.csv layout
+(genre, title, summary, isbn, cover_url), as CSV or NDJSON.
+
+Books are read ordered by id with iterator(chunk_size=...), which uses a
+server-side cursor where the database has one, and their genres come from
+a second cursor over the Book.genre through table ordered by (book_id,
+genre_id), the order of its unique index. The two ordered streams are
+merged in Python, so genres cost one query for the whole export instead
+of one per book and no more than a chunk of either stream is in memory.
+Output is produced in chunks of ROWS_PER_CHUNK rows, so memory use
+doesn't depend on the number of books. A book with several genres gets
+them joined by GENRE_SEPARATOR, which the importer splits again.
+"""
+import csv
+import io
+import itertools
+import json
+from operator import itemgetter
+
+from .models import Book
+from .utils import GENRE_SEPARATOR
+
+EXPORT_COLUMNS = ('genre', 'title', 'summary', 'isbn', 'cover_url')
+# Сколько строк читается из базы за один fetch
+EXPORT_CHUNK_SIZE = 2000
+# Сколько строк отдается клиенту одним куском ответа
+ROWS_PER_CHUNK = 500
+
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson; charset=utf-8',
+}
+
+
+def book_genres(chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Yields (book_id, 'Genre|Genre') for every book that has genres, ordered by book id.
+    """
+    rows = (Book.genre.through.objects.order_by('book_id', 'genre_id')
+            .values_list('book_id', 'genre__name').iterator(chunk_size=chunk_size))
+    for book_id, group in itertools.groupby(rows, key=itemgetter(0)):
+        yield book_id, GENRE_SEPARATOR.join(name for _, name in group)
+
+
+def export_rows(chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Yields a (genre, title, summary, isbn, cover_url) tuple for every book, ordered by id.
+    """
+    books = Book.objects.order_by('id').values_list('id', 'title', 'summary', 'isbn', 'online_cover')
+    genres = book_genres(chunk_size)
+    genre_book_id, genre_names = next(genres, (None, ''))
+    for book_id, title, summary, isbn, cover in books.iterator(chunk_size=chunk_size):
+        # Жанры книг, удаленных между запросами, пропускаются
+        while genre_book_id is not None and genre_book_id < book_id:
+            genre_book_id, genre_names = next(genres, (None, ''))
+        yield (genre_names if genre_book_id == book_id else '', title, summary, isbn, cover or '')
+
+
+def _chunked(lines, rows_per_chunk):
+    buffer = []
+    for line in lines:
+        buffer.append(line)
+        if len(buffer) >= rows_per_chunk:
+            yield ''.join(buffer)
+            buffer = []
+    if buffer:
+        yield ''.join(buffer)
+
+
+def csv_lines(rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    for row in itertools.chain([EXPORT_COLUMNS], rows):
+        writer.writerow(row)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def ndjson_lines(rows):
+    for row in rows:
+        yield json.dumps(dict(zip(EXPORT_COLUMNS, row)), ensure_ascii=False) + '\n'
+
+
+def export_chunks(file_format, chunk_size=EXPORT_CHUNK_SIZE, rows_per_chunk=ROWS_PER_CHUNK):
+    """
+    Yields the export of the whole catalog in file_format ('csv' or 'ndjson') as text chunks.
+    """
+    if file_format not in CONTENT_TYPES:
+        raise ValueError('Unsupported file format')
+    lines = csv_lines if file_format == 'csv' else ndjson_lines
+    return _chunked(lines(export_rows(chunk_size)), rows_per_chunk)
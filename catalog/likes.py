@@ -0,0 +1,72 @@
+"""
+Book likes: an atomic toggle keeping Book.like_count up to date and the
+"most liked" leaderboard.
+
+toggle_like() deletes or inserts the Profile.liked_books row and moves
+like_count with an F() expression in one transaction, so double clicks
+and concurrent requests can't make the count drift. Changes made through
+the m2m manager (admin, profile forms) recount the affected books from
+signals instead.
+
+The leaderboard is read straight from the book_like_count_idx index on
+(-like_count, id): a single query that walks the first LEADERBOARD_SIZE
+index entries, so it is always current in every process and needs no
+cache to keep in sync.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from users_and_accounts.models import Profile
+from .models import Book
+
+LikedBook = Profile.liked_books.through
+
+# Сколько книг отдает лидерборд
+LEADERBOARD_SIZE = 10
+
+
+def toggle_like(user, book_id):
+    """
+    Likes the book for the user, or removes the like if it is already there.
+    Returns (liked, like_count). Raises Book.DoesNotExist for an unknown book.
+    """
+    with transaction.atomic():
+        profile_id = Profile.objects.filter(user=user).values_list('id', flat=True).first()
+        if profile_id is None:
+            profile_id = Profile.objects.create(user=user).id
+
+        if LikedBook.objects.filter(profile_id=profile_id, book_id=book_id).delete()[0]:
+            liked, delta = False, -1
+        else:
+            try:
+                with transaction.atomic():
+                    LikedBook.objects.create(profile_id=profile_id, book_id=book_id)
+                liked, delta = True, 1
+            except IntegrityError:
+                # Параллельный запрос уже поставил лайк, счетчик он и увеличил
+                liked, delta = True, 0
+
+        if not Book.objects.filter(pk=book_id).update(like_count=F('like_count') + delta):
+            raise Book.DoesNotExist('Book %s does not exist' % book_id)
+        like_count = Book.objects.filter(pk=book_id).values_list('like_count', flat=True).get()
+    return liked, like_count
+
+
+def recount_likes(book_ids):
+    """
+    Recounts like_count of the given books from the through table.
+    """
+    book_ids = list(book_ids)
+    if not book_ids:
+        return
+    likes = LikedBook.objects.filter(book_id=OuterRef('pk')).order_by().values('book_id').annotate(n=Count('*')).values('n')
+    Book.objects.filter(pk__in=book_ids).update(like_count=Coalesce(Subquery(likes), 0))
+
+
+def leaderboard(limit=LEADERBOARD_SIZE):
+    """
+    Returns [(book_id, title, like_count)] of the most liked books, best first.
+    """
+    rows = Book.objects.filter(like_count__gt=0).order_by('-like_count', 'id').values_list('id', 'title', 'like_count')
+    return list(rows[:min(limit, LEADERBOARD_SIZE)])
@@ -0,0 +1,95 @@
+"""
+Overdue loan sweeps run by 'manage.py sweep_overdue_loans'.
+
+Every sweep is a series of UPDATE (or INSERT ... SELECT) statements over
+primary key ranges of SWEEP_BATCH_SIZE copies, so no rows are loaded into
+Python and no statement holds the write lock for long, however many loans
+are active. The only value read per batch is the key closing the range.
+"""
+from decimal import Decimal
+from datetime import date
+
+from django.db import connection, transaction
+from django.db.models import DecimalField, F, Value
+from django.db.models.functions import Least
+from django.utils import timezone
+
+from .models import BookInstance, DaysBetween, LoanReminder
+
+# Сколько копий обновляет один запрос
+SWEEP_BATCH_SIZE = 5000
+# Штраф за день просрочки и его максимальный размер
+FINE_PER_DAY = Decimal('0.25')
+MAX_FINE = Decimal('20.00')
+
+
+def batches(queryset, batch_size=SWEEP_BATCH_SIZE):
+    """
+    Yields querysets covering queryset in consecutive primary key ranges of at most batch_size rows.
+    """
+    queryset = queryset.order_by()
+    last = None
+    while True:
+        remaining = queryset if last is None else queryset.filter(pk__gt=last)
+        boundary = remaining.order_by('pk').values_list('pk', flat=True)[batch_size - 1:batch_size].first()
+        if boundary is None:
+            yield remaining
+            return
+        yield remaining.filter(pk__lte=boundary)
+        last = boundary
+
+
+def batched_update(queryset, batch_size=SWEEP_BATCH_SIZE, **updates):
+    """
+    queryset.update(**updates) split into primary key ranges, one transaction per range.
+    Returns the number of updated rows.
+    """
+    updated = 0
+    for batch in batches(queryset, batch_size):
+        with transaction.atomic():
+            updated += batch.update(**updates)
+    return updated
+
+
+def flag_overdue(today=None, batch_size=SWEEP_BATCH_SIZE):
+    """
+    Sets overdue_since on newly overdue loans and clears it on returned or renewed ones.
+    Returns (flagged, cleared).
+    """
+    today = today or date.today()
+    flagged = batched_update(BookInstance.objects.overdue(today).filter(overdue_since__isnull=True),
+                             batch_size, overdue_since=F('due_back'))
+    cleared = batched_update(BookInstance.objects.filter(overdue_since__isnull=False)
+                             .exclude(status__exact='o', due_back__lt=today),
+                             batch_size, overdue_since=None)
+    return flagged, cleared
+
+
+def compute_fines(today=None, batch_size=SWEEP_BATCH_SIZE, per_day=FINE_PER_DAY, maximum=MAX_FINE):
+    """
+    Sets the fine of every overdue loan to per_day for each day overdue, capped at maximum.
+    Fines of returned copies are kept until they are settled.
+    """
+    today = today or date.today()
+    days = DaysBetween('due_back', Value(today))
+    fine = Least(days * Value(per_day), Value(maximum), output_field=DecimalField(max_digits=8, decimal_places=2))
+    return batched_update(BookInstance.objects.overdue(today), batch_size, fine=fine)
+
+
+def queue_reminders(today=None, batch_size=SWEEP_BATCH_SIZE):
+    """
+    Queues a LoanReminder for every overdue loan that doesn't have one for its current due date.
+    Returns the number of queued reminders.
+    """
+    today = today or date.today()
+    columns = ', '.join(connection.ops.quote_name(name) for name in ('instance_id', 'borrower_id', 'due_back', 'created'))
+    queued = 0
+    overdue = BookInstance.objects.overdue(today).filter(borrower__isnull=False)
+    for batch in batches(overdue, batch_size):
+        select = batch.annotate(queued_at=Value(timezone.now())).values_list('pk', 'borrower_id', 'due_back', 'queued_at')
+        sql, params = select.query.sql_with_params()
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute('INSERT INTO %s (%s) %s ON CONFLICT DO NOTHING'
+                           % (connection.ops.quote_name(LoanReminder._meta.db_table), columns, sql), params)
+            queued += cursor.rowcount
+    return queued
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from catalog.autocomplete import CatalogSnapshot
+
+
+class Command(BaseCommand):
+    help = "Builds the autocomplete snapshot and reports its size and memory use."
+
+    def handle(self, *args, **options):
+        stats = CatalogSnapshot.from_database().stats()
+        self.stdout.write(
+            f"{stats['entries']} entries ({stats['books']} books), "
+            f"{stats['memory_bytes'] / 1024 / 1024:.1f} MiB, "
+            f"{stats['bytes_per_100k_books'] / 1024 / 1024:.1f} MiB per 100k books")
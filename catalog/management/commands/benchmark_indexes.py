@@ -0,0 +1,132 @@
+import datetime
+import random
+import statistics
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, models
+
+from catalog import search
+from catalog.models import Author, Book, BookInstance, Genre
+
+
+def _queries(borrower, genre_names):
+    """
+    (name, callable) pairs running the query of every view the catalog indexes are meant for.
+    """
+    return [
+        ('all borrowed (status, due_back)',
+         lambda: list(BookInstance.objects.filter(status__exact='o').select_related('book', 'borrower').order_by('due_back')[:10])),
+        ('borrowed by user (borrower, status, due_back)',
+         lambda: list(BookInstance.objects.filter(borrower=borrower, status__exact='o').select_related('book').order_by('due_back')[:10])),
+        ('available copies count (status)',
+         lambda: BookInstance.objects.filter(status__exact='a').count()),
+        ('import genre lookup (Genre.name)',
+         lambda: list(Genre.objects.filter(name__in=genre_names))),
+        ('authors by name (last_name, first_name)',
+         lambda: list(Author.objects.filter(last_name__startswith='Last1').order_by('last_name', 'first_name')[:10])),
+        ('books by title (title)',
+         lambda: list(Book.objects.filter(title__startswith='Title 12').order_by('title')[:10])),
+    ]
+
+
+class Command(BaseCommand):
+    help = ("Seeds a throwaway test database and reports the query plan and median latency "
+            "of the catalog list queries with and without the catalog indexes.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--books', type=int, default=50000)
+        parser.add_argument('--copies', type=int, default=4, help='Copies per book.')
+        parser.add_argument('--users', type=int, default=500)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        old_name = connection.settings_dict['NAME']
+        # Отдельная база, рабочие данные не трогаются
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            # Триггеры полнотекстового индекса замедляют заполнение и мешают пересозданию таблицы жанров
+            if search.is_supported():
+                search.drop_search_index()
+            borrower, genre_names = self.seed(options['books'], options['copies'], options['users'])
+            queries = _queries(borrower, genre_names)
+            with_indexes = self.measure(queries, options['repeat'])
+            self.drop_indexes()
+            without_indexes = self.measure(queries, options['repeat'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        for name, _ in queries:
+            (plan_with, time_with), (plan_without, time_without) = with_indexes[name], without_indexes[name]
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            self.stdout.write(f'  without indexes: {time_without * 1000:8.2f} ms  {plan_without}')
+            self.stdout.write(f'  with indexes:    {time_with * 1000:8.2f} ms  {plan_with}')
+
+    def seed(self, num_books, copies, num_users):
+        rng = random.Random(0)
+        genres = Genre.objects.bulk_create([Genre(name=f'Genre {i}') for i in range(200)])
+        authors = Author.objects.bulk_create(
+            [Author(first_name=f'First{i}', last_name=f'Last{i}') for i in range(num_books // 10 or 1)])
+        books = Book.objects.bulk_create(
+            [Book(title=f'Title {i}', summary='', isbn=str(i)[:13], author=rng.choice(authors)) for i in range(num_books)],
+            batch_size=5000)
+        Book.genre.through.objects.bulk_create(
+            [Book.genre.through(book_id=book.id, genre_id=rng.choice(genres).id) for book in books], batch_size=5000)
+        users = User.objects.bulk_create([User(username=f'reader{i}') for i in range(num_users)])
+
+        today = datetime.date.today()
+        instances = []
+        for book in books:
+            for _ in range(copies):
+                status = rng.choice('aaaaorm')
+                on_loan = status == 'o'
+                instances.append(BookInstance(
+                    book=book, imprint='', status=status,
+                    due_back=today + datetime.timedelta(days=rng.randint(-30, 30)) if on_loan else None,
+                    borrower=rng.choice(users) if on_loan else None))
+        BookInstance.objects.bulk_create(instances, batch_size=5000)
+        self.stdout.write(f'Seeded {len(books)} books, {len(instances)} copies, {len(users)} users')
+        return users[0], [genre.name for genre in rng.sample(genres, 20)]
+
+    def measure(self, queries, repeat):
+        """
+        Returns {name: (query plan, median seconds)}.
+        """
+        # Свежая статистика для планировщика
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        results = {}
+        for name, query in queries:
+            timings = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                query()
+                timings.append(time.perf_counter() - start)
+            results[name] = (self.plan(query), statistics.median(timings))
+        return results
+
+    def plan(self, query):
+        with connection.execute_wrapper(self._capture):
+            self._captured = []
+            query()
+        sql, params = self._captured[-1]
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql if connection.vendor == 'sqlite' else 'EXPLAIN ' + sql, params)
+            return ' | '.join(str(row[-1]) for row in cursor.fetchall())
+
+    def _capture(self, execute, sql, params, many, context):
+        self._captured.append((sql, params))
+        return execute(sql, params, many, context)
+
+    def drop_indexes(self):
+        with connection.schema_editor() as schema_editor:
+            for model in (Book, BookInstance, Author):
+                for index in model._meta.indexes:
+                    schema_editor.remove_index(model, index)
+            old_field = Genre._meta.get_field('name')
+            name, path, args, kwargs = old_field.deconstruct()
+            new_field = models.CharField(*args, **dict(kwargs, unique=False))
+            new_field.set_attributes_from_name(name)
+            new_field.model = Genre
+            schema_editor.alter_field(Genre, old_field, new_field)
@@ -0,0 +1,66 @@
+import os
+import statistics
+import tempfile
+import time
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import RequestFactory, override_settings
+
+from locallibrary import ratelimit
+from users_and_accounts.views import validate_username
+
+
+class Command(BaseCommand):
+    help = "Measures the overhead the rate limiter adds to a request, using a throwaway bucket store."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=20000)
+
+    def timed(self, function, number):
+        timings = []
+        for _ in range(number):
+            start = time.perf_counter()
+            function()
+            timings.append(time.perf_counter() - start)
+        return statistics.median(timings) * 1e6, sorted(timings)[int(len(timings) * 0.99)] * 1e6
+
+    def handle(self, *args, **options):
+        number = options['requests']
+        old_name = connection.settings_dict['NAME']
+        # validate_username читает пользователей, поэтому нужна (пустая) тестовая база
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            results = self.measure(number)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+        new_key, same_key, unlimited, limited = results
+
+        self.stdout.write(f'take(), new bucket:       median {new_key[0]:7.1f} us, p99 {new_key[1]:7.1f} us')
+        self.stdout.write(f'take(), existing bucket:  median {same_key[0]:7.1f} us, p99 {same_key[1]:7.1f} us')
+        self.stdout.write(f'validate_username:        median {unlimited[0]:7.1f} us, p99 {unlimited[1]:7.1f} us')
+        self.stdout.write(f'validate_username+limit:  median {limited[0]:7.1f} us, p99 {limited[1]:7.1f} us')
+        self.stdout.write(f'limiter overhead:         {limited[0] - unlimited[0]:7.1f} us per request')
+
+    def measure(self, number):
+        with tempfile.TemporaryDirectory() as directory, override_settings(
+                RATELIMIT_ENABLED=True, RATELIMIT_STORE=os.path.join(directory, 'ratelimit.sqlite3')):
+            store = ratelimit.get_store()
+            counter = iter(range(10 ** 9))
+            # Разные ключи - худший случай: каждая проверка вставляет новую корзину
+            new_key = self.timed(lambda: store.take('bench:%s' % next(counter), 100, 10), number)
+            same_key = self.timed(lambda: store.take('bench:same', 10 ** 9, 10 ** 9), number)
+
+            request = RequestFactory().get('/validate_username', {'username': 'free-name'})
+            request.user = AnonymousUser()
+            view = validate_username.__wrapped__
+            # С настоящим лимитом представления ('20/s') почти все запросы цикла получили бы 429,
+            # поэтому замеряется та же проверка с лимитом, который цикл не исчерпает
+            limited_view = ratelimit.ratelimit('%d/s' % (number * 10))(view)
+            limited_view(request)
+            limited = self.timed(lambda: limited_view(request), number)
+            unlimited = self.timed(lambda: view(request), number)
+            if limited_view(request).status_code == 429:
+                raise CommandError('The rate limit was exhausted, the measurement is not valid')
+        return new_key, same_key, unlimited, limited
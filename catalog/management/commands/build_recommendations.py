@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from catalog import recommendations
+
+
+class Command(BaseCommand):
+    help = ("Rebuilds the 'readers who liked this also liked' similarity table from all likes. "
+            "Meant to run periodically (e.g. nightly from cron).")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--per-book', type=int, default=recommendations.RECOMMENDATIONS_PER_BOOK)
+        parser.add_argument('--min-co-likes', type=int, default=recommendations.MIN_CO_LIKES)
+
+    def handle(self, *args, **options):
+        result = recommendations.build_similarities(options['per_book'], options['min_co_likes'])
+        self.stdout.write(
+            f"{result['likes']} likes of {result['books']} books, {result['pairs']} similar pairs, "
+            f"{result['rows']} rows written in {result['seconds']}s")
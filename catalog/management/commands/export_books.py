@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from catalog import export
+
+
+class Command(BaseCommand):
+    help = ("Writes the whole catalog in the all_books.csv layout as CSV or NDJSON, streaming it "
+            "from the database in chunks. The file can be imported again with the book upload page.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=sorted(export.CONTENT_TYPES), default='csv')
+        parser.add_argument('--output', '-o', default='-', help='Output file, stdout by default.')
+        parser.add_argument('--chunk-size', type=int, default=export.EXPORT_CHUNK_SIZE,
+                            help='Rows fetched from the database at a time.')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        chunks = export.export_chunks(options['format'], options['chunk_size'])
+        if options['output'] == '-':
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
+            return
+        with open(options['output'], 'w', encoding='utf-8', newline='') as output:
+            for chunk in chunks:
+                output.write(chunk)
+        self.stderr.write(f'Exported to {options["output"]} in {time.monotonic() - started:.1f}s')
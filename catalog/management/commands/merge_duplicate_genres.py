@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, DatabaseError, transaction
+from django.db.models import Count, Min
+
+from catalog.models import Book, Genre
+
+
+class Command(BaseCommand):
+    help = ("Merges genres with the same name into the oldest one. "
+            "Run before migrating to the unique Genre.name constraint.")
+
+    def handle(self, *args, **options):
+        BookGenre = Book.genre.through
+        try:
+            duplicates = list(Genre.objects.values('name').annotate(keep=Min('id'), copies=Count('id')).filter(copies__gt=1))
+        except DatabaseError:
+            # Таблицы еще нет (первый запуск) - объединять нечего
+            self.stdout.write('No genres table yet, nothing to merge')
+            return
+
+        # Команда запускается до migrate, поэтому работает только с таблицами жанров и связей:
+        # Genre.delete() вызвал бы сигналы, которые обращаются к еще не созданным колонкам книг
+        with transaction.atomic(), connection.cursor() as cursor:
+            for duplicate in duplicates:
+                other_ids = list(Genre.objects.filter(name=duplicate['name']).exclude(id=duplicate['keep']).values_list('id', flat=True))
+                links = BookGenre.objects.filter(genre_id__in=other_ids)
+                BookGenre.objects.bulk_create(
+                    [BookGenre(book_id=book_id, genre_id=duplicate['keep']) for book_id in links.values_list('book_id', flat=True).distinct()],
+                    ignore_conflicts=True)
+                placeholders = ', '.join(['%s'] * len(other_ids))
+                cursor.execute('DELETE FROM {} WHERE genre_id IN ({})'.format(BookGenre._meta.db_table, placeholders), other_ids)
+                cursor.execute('DELETE FROM {} WHERE id IN ({})'.format(Genre._meta.db_table, placeholders), other_ids)
+                self.stdout.write(f"Merged {duplicate['copies']} genres named {duplicate['name']!r}")
+        self.stdout.write(f'{len(duplicates)} duplicated genre names merged')
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from catalog.models import Author, Book
+from catalog.search import is_supported, rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the FTS5 full-text search index of books and authors."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default', help="Database alias to rebuild the index in.")
+
+    def handle(self, *args, **options):
+        using = options['database']
+        if not is_supported(using):
+            raise CommandError("Full-text search index requires SQLite with FTS5.")
+
+        rebuild_search_index(using)
+        self.stdout.write(
+            f'Indexed {Book.objects.using(using).count()} books and {Author.objects.using(using).count()} authors')
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from catalog.models import LibraryStats
+
+
+class Command(BaseCommand):
+    help = "Recounts the home page statistics, correcting any drift. Meant to run periodically (e.g. from cron)."
+
+    def handle(self, *args, **options):
+        before = LibraryStats.objects.filter(pk=1).values().first()
+        stats = LibraryStats.reconcile()
+        for field in ('num_books', 'num_instances', 'num_instances_available', 'num_authors'):
+            old = before[field] if before else None
+            new = getattr(stats, field)
+            if old != new:
+                self.stdout.write(f'{field}: {old} -> {new}')
+        self.stdout.write('Library stats reconciled')
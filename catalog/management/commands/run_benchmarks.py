@@ -0,0 +1,84 @@
+import json
+import shutil
+import tempfile
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import override_settings
+
+from catalog import visits
+from locallibrary import benchmarks
+
+BENCHMARKS_DIR = settings.BASE_DIR / 'benchmarks'
+
+
+class Command(BaseCommand):
+    help = ("Seeds a throwaway database scaled from all_books.csv, benchmarks every URL of the catalog "
+            "and users_and_accounts apps and the import path, writes the results as JSON and fails "
+            "if they regress against the stored baseline of the same scale.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', choices=sorted(benchmarks.SCALES), default='10k')
+        parser.add_argument('--books', type=int, help='Number of books, overrides --scale.')
+        parser.add_argument('--requests', type=int, default=benchmarks.DEFAULT_REQUESTS, help='Requests per URL.')
+        parser.add_argument('--import-rows', type=int, default=benchmarks.DEFAULT_IMPORT_ROWS)
+        parser.add_argument('--only', nargs='+', metavar='URL_NAME', help='Benchmark only these URL names.')
+        parser.add_argument('--output', help='Results file, benchmarks/results-<scale>.json by default.')
+        parser.add_argument('--baseline', help='Baseline file, benchmarks/baseline-<scale>.json by default.')
+        parser.add_argument('--save-baseline', action='store_true', help='Store the results as the new baseline.')
+        parser.add_argument('--tolerance', type=float, default=benchmarks.DEFAULT_TOLERANCE,
+                            help='Allowed relative growth of latency and memory (0.5 = 50%%).')
+        parser.add_argument('--compare-latency', action='store_true', default=None,
+                            help='Compare latencies even if the baseline was recorded on another host.')
+
+    def handle(self, *args, **options):
+        num_books = options['books'] or benchmarks.SCALES[options['scale']]
+        label = options['scale'] if not options['books'] else str(num_books)
+        output = Path(options['output'] or BENCHMARKS_DIR / f'results-{label}.json')
+        baseline = Path(options['baseline'] or BENCHMARKS_DIR / f'baseline-{label}.json')
+
+        old_name = connection.settings_dict['NAME']
+        if connection.vendor == 'sqlite':
+            # База в файле, а не в памяти: миллион книг в память не помещается, и диск ближе к рабочей установке
+            connection.settings_dict['TEST']['NAME'] = str(settings.BASE_DIR / 'benchmark.sqlite3')
+        media_root = tempfile.mkdtemp()
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            with override_settings(ALLOWED_HOSTS=['testserver'], MEDIA_ROOT=media_root):
+                benchmarks.seed(num_books, self.stdout)
+                results = benchmarks.run(num_books, options['requests'], options['import_rows'], options['only'], self.stdout)
+        except benchmarks.BenchmarkError as e:
+            raise CommandError(e)
+        finally:
+            # Посещения из сценариев относятся к удаляемой базе и не должны записаться в рабочую при выходе
+            visits.buffer.clear()
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            shutil.rmtree(media_root, ignore_errors=True)
+
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_text(json.dumps(results, indent=2) + '\n')
+        self.stdout.write(f'Results written to {output}')
+
+        if options['save_baseline']:
+            baseline.write_text(json.dumps(results, indent=2) + '\n')
+            self.stdout.write(self.style.SUCCESS(f'Baseline saved to {baseline}'))
+            return
+        if not baseline.exists():
+            self.stdout.write(self.style.WARNING(f'No baseline at {baseline}, run with --save-baseline to store one'))
+            return
+        baseline_results = json.loads(baseline.read_text())
+        if options['compare_latency'] is None and baseline_results['meta'].get('host') != results['meta']['host']:
+            self.stdout.write(self.style.WARNING(
+                'The baseline was recorded on another host, only queries and memory are compared '
+                '(--compare-latency compares timings too)'))
+        try:
+            regressions = benchmarks.compare(results, baseline_results, options['tolerance'], options['compare_latency'])
+        except benchmarks.BenchmarkError as e:
+            raise CommandError(e)
+        if regressions:
+            for regression in regressions:
+                self.stderr.write(self.style.ERROR('REGRESSION ' + regression))
+            raise CommandError(f'{len(regressions)} regressions against {baseline}')
+        self.stdout.write(self.style.SUCCESS(f'No regressions against {baseline}'))
@@ -0,0 +1,40 @@
+import os
+import socket
+import time
+
+from django.core.management.base import BaseCommand
+
+from catalog.models import ImportJob
+from catalog.utils import IMPORT_CHUNK_SIZE, run_import_job
+
+
+class Command(BaseCommand):
+    help = ("Processes queued book import jobs. Several workers can run in parallel, "
+            "jobs of a worker that stopped reporting progress are taken over.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Exit when the queue is empty instead of polling.")
+        parser.add_argument('--poll-interval', type=float, default=2.0, help="Seconds to wait when the queue is empty.")
+        parser.add_argument('--chunksize', type=int, default=IMPORT_CHUNK_SIZE, help="Rows read from the file at a time.")
+
+    def handle(self, *args, **options):
+        worker = f'{socket.gethostname()}:{os.getpid()}'
+        self.stdout.write(f'Import worker {worker} started')
+
+        while True:
+            job = ImportJob.claim_next(worker)
+            if job is None:
+                if options['once']:
+                    break
+                time.sleep(options['poll_interval'])
+                continue
+
+            if job.rows_processed:
+                # Задача брошенного воркера (см. ImportJob.claim_next) продолжается с места остановки
+                self.stdout.write(f'Job {job.id}: resuming {job.file.name} after row {job.rows_processed}')
+            else:
+                self.stdout.write(f'Job {job.id}: importing {job.file.name}')
+            job = run_import_job(job, options['chunksize'])
+            self.stdout.write(
+                f'Job {job.id}: {job.get_status_display()}, {job.rows_processed} rows, '
+                f'{job.books_created} books, {len(job.errors)} errors')
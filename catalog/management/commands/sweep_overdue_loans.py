@@ -0,0 +1,34 @@
+import datetime
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+
+from catalog import loans
+
+
+class Command(BaseCommand):
+    help = ("Flags overdue loans, computes their fines and queues reminders in batched UPDATEs. "
+            "Meant to run daily (e.g. from cron). Without options all three sweeps run.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--flag', action='store_true', help='Set or clear overdue_since.')
+        parser.add_argument('--fines', action='store_true', help='Recompute fines of overdue loans.')
+        parser.add_argument('--reminders', action='store_true', help='Queue reminders for overdue loans.')
+        parser.add_argument('--batch-size', type=int, default=loans.SWEEP_BATCH_SIZE)
+        parser.add_argument('--fine-per-day', type=Decimal, default=loans.FINE_PER_DAY)
+        parser.add_argument('--today', type=datetime.date.fromisoformat, default=None,
+                            help='Sweep as of this date (YYYY-MM-DD) instead of today.')
+
+    def handle(self, *args, **options):
+        sweep_all = not (options['flag'] or options['fines'] or options['reminders'])
+        today, batch_size = options['today'], options['batch_size']
+
+        if sweep_all or options['flag']:
+            flagged, cleared = loans.flag_overdue(today, batch_size)
+            self.stdout.write(f'{flagged} loans flagged overdue, {cleared} flags cleared')
+        if sweep_all or options['fines']:
+            fined = loans.compute_fines(today, batch_size, per_day=options['fine_per_day'])
+            self.stdout.write(f'{fined} fines updated')
+        if sweep_all or options['reminders']:
+            queued = loans.queue_reminders(today, batch_size)
+            self.stdout.write(f'{queued} reminders queued')
@@ -1,17 +1,44 @@
-from datetime import date
+from datetime import date, timedelta
+import time
 import uuid
 
 from django.db import models
+from django.db.models import F, Q
+from django.db.models.functions import Coalesce
 from django.urls import reverse
+from django.utils import timezone
 from django.contrib.auth.models import User
 
 
+class DaysBetween(models.Func):
+    """
+    Whole days from the start date to the end date: DaysBetween('due_back', Value(today)).
+    """
+    output_field = models.IntegerField()
+    arity = 2
+
+    def _compile(self, compiler, template):
+        start, start_params = compiler.compile(self.source_expressions[0])
+        end, end_params = compiler.compile(self.source_expressions[1])
+        return template % {'start': start, 'end': end}, (*end_params, *start_params)
+
+    def as_sql(self, compiler, connection, **extra_context):
+        # В PostgreSQL разность дат - целое число дней
+        return self._compile(compiler, '(%(end)s - %(start)s)')
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return self._compile(compiler, 'CAST(julianday(%(end)s) - julianday(%(start)s) AS INTEGER)')
+
+    def as_mysql(self, compiler, connection, **extra_context):
+        return self._compile(compiler, 'DATEDIFF(%(end)s, %(start)s)')
+
+
 # Create your models here.
 class Genre(models.Model):
     """
     Model representing a book genre (e.g. Science Fiction, Non Fiction).
     """
-    name = models.CharField(max_length=200, help_text="Enter a book genre (e.g. Science Fiction, French Poetry etc.)")
+    name = models.CharField(max_length=200, unique=True, help_text="Enter a book genre (e.g. Science Fiction, French Poetry etc.)")
 
     def __str__(self):
         """
@@ -20,6 +47,32 @@ class Genre(models.Model):
         return self.name
 
 
+def copy_count(**filters):
+    """
+    Number of copies of the outer book matching filters, as a correlated subquery.
+    """
+    copies = (BookInstance.objects.filter(book=models.OuterRef('pk'), **filters).order_by()
+              .values('book').annotate(n=models.Count('*')).values('n'))
+    return Coalesce(models.Subquery(copies), 0)
+
+
+class BookQuerySet(models.QuerySet):
+
+    def with_availability(self):
+        """
+        Annotates total_count and available_count of copies.
+        Correlated subqueries on the bookinstance book index instead of a grouped join:
+        without GROUP BY an ordered page reads only its own books.
+        """
+        return self.annotate(total_count=copy_count(), available_count=copy_count(status__exact='a'))
+
+    def available(self):
+        """
+        Books with at least one available copy (needs with_availability()).
+        """
+        return self.filter(available_count__gt=0)
+
+
 class Book(models.Model):
     """
     Model representing a book (but not a specific copy of a book).
@@ -36,11 +89,26 @@ class Book(models.Model):
     language = models.ForeignKey('Language', on_delete=models.SET_NULL, null=True)
     online_cover = models.URLField(max_length=200, blank=True, null=True, default="https://www.shutterstock.com/shutterstock/photos/2139823959/display_1500/stock-vector-vector-realistic-standing-d-magazine-mockup-with-white-blank-cover-isolated-closed-vertical-2139823959.jpg")
 
+    # Денормализованное количество лайков, поддерживается catalog.likes
+    like_count = models.PositiveIntegerField(default=0, editable=False)
+    # Меняется при изменении книги, ее экземпляров, жанров и автора; входит в ключи кэша фрагментов
+    updated = models.DateTimeField(auto_now=True)
+
+    objects = BookQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['title'], name='book_title_idx'),
+            # Лидерборд "самые любимые книги"
+            models.Index(fields=['-like_count', 'id'], name='book_like_count_idx'),
+        ]
+
     def display_genre(self):
             """
             Creates a string for the Genre. This is required to display genre in Admin.
             """
-            return ', '.join([genre.name for genre in self.genre.all()[:3]])
+            # Срез делается в Python, чтобы использовать prefetch_related('genre')
+            return ', '.join([genre.name for genre in self.genre.all()][:3])
     display_genre.short_description = 'Genre'
     
     def __str__(self):
@@ -57,6 +125,21 @@ class Book(models.Model):
         return reverse('book-detail', args=[str(self.id)])
     
 
+class BookInstanceQuerySet(models.QuerySet):
+
+    def on_loan(self):
+        return self.filter(status__exact='o')
+
+    def overdue(self, today=None):
+        """
+        Copies on loan past their due date, answered by the (status, due_back) index.
+        """
+        return self.on_loan().filter(due_back__lt=today or date.today())
+
+    def with_days_overdue(self, today=None):
+        return self.annotate(days_overdue=DaysBetween('due_back', models.Value(today or date.today(), models.DateField())))
+
+
 class BookInstance(models.Model):
     """
     Model representing a specific copy of a book (i.e. that can be borrowed from the library).
@@ -75,6 +158,18 @@ class BookInstance(models.Model):
     )
 
     status = models.CharField(max_length=1, choices=LOAN_STATUS, blank=True, default='m', help_text='Book availability')
+    # Заполняются командой sweep_overdue_loans
+    overdue_since = models.DateField(null=True, blank=True, help_text='Date the loan was first flagged as overdue')
+    fine = models.DecimalField(max_digits=8, decimal_places=2, default=0)
+
+    objects = BookInstanceQuerySet.as_manager()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Статус на момент загрузки нужен сигналам, чтобы пересчитать доступные копии
+        instance._loaded_status = instance.__dict__.get('status')
+        return instance
 
     @property
     def is_overdue(self):
@@ -84,6 +179,12 @@ class BookInstance(models.Model):
     
     class Meta:
         ordering = ["due_back"]
+        indexes = [
+            # Все выданные копии по дате возврата (AllBorrowedBooksListView, просроченные)
+            models.Index(fields=['status', 'due_back'], name='bookinstance_status_due_idx'),
+            # Выданные копии читателя по дате возврата (LoanedBooksByUserListView)
+            models.Index(fields=['borrower', 'status', 'due_back'], name='bookinstance_borrower_idx'),
+        ]
 
         permissions = (
             ("can_mark_returned", "Set book as returned"),
@@ -94,7 +195,8 @@ class BookInstance(models.Model):
         """
         String for representing the Model object
         """
-        return '%s (%s)' % (self.id, self.book.title)
+        # Для списков используйте select_related('book'), иначе здесь будет запрос на каждую копию
+        return '%s (%s)' % (self.id, self.book.title if self.book_id else '-')
 
 
 class Author(models.Model):
@@ -106,6 +208,11 @@ class Author(models.Model):
     date_of_birth = models.DateField(null=True, blank=True)
     date_of_death = models.DateField('died', null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['last_name', 'first_name'], name='author_name_idx'),
+        ]
+
     def get_absolute_url(self):
         """
         Returns the url to access a particular author instance.
@@ -128,4 +235,180 @@ class Language(models.Model):
 
     def __str__(self):
         return self.name
-    
\ No newline at end of file
+    
+
+class BookSimilarity(models.Model):
+    """
+    Model representing how often readers who liked a book also liked another one.
+    Rebuilt offline by 'manage.py build_recommendations' (see catalog.recommendations).
+    """
+    book = models.ForeignKey('Book', on_delete=models.CASCADE, related_name='similarities')
+    similar = models.ForeignKey('Book', on_delete=models.CASCADE, related_name='+')
+    score = models.FloatField()
+    co_likes = models.PositiveIntegerField()
+
+    class Meta:
+        indexes = [
+            # "Читатели, которым понравилась эта книга, также любят" - один запрос по индексу
+            models.Index(fields=['book', '-score'], name='booksimilarity_book_score_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['book', 'similar'], name='booksimilarity_unique_pair'),
+        ]
+        verbose_name_plural = "book similarities"
+
+    def __str__(self):
+        return '%s ~ %s (%.3f)' % (self.book_id, self.similar_id, self.score)
+
+
+class LoanReminder(models.Model):
+    """
+    Model representing a reminder about an overdue loan, queued by sweep_overdue_loans.
+    One reminder is queued per loan and due date, so a renewed loan that becomes overdue again gets a new one.
+    """
+    instance = models.ForeignKey('BookInstance', on_delete=models.CASCADE)
+    borrower = models.ForeignKey(User, on_delete=models.CASCADE)
+    due_back = models.DateField()
+    created = models.DateTimeField(auto_now_add=True)
+    sent = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["created"]
+        constraints = [
+            models.UniqueConstraint(fields=['instance', 'due_back'], name='loanreminder_unique_loan'),
+        ]
+
+    def __str__(self):
+        return 'Reminder to %s (due %s)' % (self.borrower, self.due_back)
+
+
+class LibraryStats(models.Model):
+    """
+    Model holding the record counts shown on the home page (a single row).
+    Kept up to date incrementally from signals, so the home page never runs COUNT(*).
+    'manage.py reconcile_library_stats' corrects any drift.
+    """
+    num_books = models.IntegerField(default=0)
+    num_instances = models.IntegerField(default=0)
+    num_instances_available = models.IntegerField(default=0)
+    num_authors = models.IntegerField(default=0)
+    reconciled = models.DateTimeField(null=True, blank=True)
+    # Версия кэша поиска (catalog.search), общая для всех процессов. Новая строка получает
+    # версию от текущего времени, чтобы результаты, закэшированные до нее, не стали снова верными
+    search_version = models.BigIntegerField(default=time.time_ns, editable=False)
+
+    class Meta:
+        verbose_name_plural = "library stats"
+
+    @classmethod
+    def load(cls):
+        """
+        Returns the statistics row, counting everything once if it does not exist yet.
+        """
+        stats = cls.objects.filter(pk=1).first()
+        return stats if stats is not None else cls.reconcile()
+
+    @classmethod
+    def adjust(cls, **deltas):
+        """
+        Atomically adds the given deltas, e.g. adjust(num_books=1, num_authors=-1).
+        """
+        deltas = {field: F(field) + delta for field, delta in deltas.items() if delta}
+        if deltas:
+            cls.objects.filter(pk=1).update(**deltas)
+
+    @classmethod
+    def reconcile(cls):
+        """
+        Recounts all statistics from the catalog tables.
+        """
+        stats, _ = cls.objects.update_or_create(pk=1, defaults={
+            'num_books': Book.objects.count(),
+            'num_instances': BookInstance.objects.count(),
+            'num_instances_available': BookInstance.objects.filter(status__exact='a').count(),
+            'num_authors': Author.objects.count(),
+            'reconciled': timezone.now(),
+        })
+        return stats
+
+    def __str__(self):
+        return 'Library stats (%s books)' % self.num_books
+
+
+class VisitCount(models.Model):
+    """
+    Model representing a page visit counter, written in batches by catalog.visits.
+    """
+    key = models.CharField(max_length=200, unique=True)
+    count = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return '%s: %s' % (self.key, self.count)
+
+
+class ImportJob(models.Model):
+    """
+    Model representing an uploaded books file queued for the import worker.
+    """
+    file = models.FileField(upload_to='imports/%Y/%m/%d')
+    file_format = models.CharField(max_length=4)
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+
+    JOB_STATUS = (
+        ('q', 'Queued'),
+        ('r', 'Running'),
+        ('d', 'Done'),
+        ('f', 'Failed'),
+    )
+
+    status = models.CharField(max_length=1, choices=JOB_STATUS, default='q', db_index=True)
+    worker = models.CharField(max_length=100, blank=True)
+    rows_processed = models.PositiveIntegerField(default=0)
+    books_created = models.PositiveIntegerField(default=0)
+    errors = models.JSONField(default=list, blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+    started = models.DateTimeField(null=True, blank=True)
+    finished = models.DateTimeField(null=True, blank=True)
+    # Обновляется воркером после каждого куска файла, по нему находятся задачи упавших воркеров
+    heartbeat = models.DateTimeField(null=True, blank=True)
+
+    # Через сколько секунд без heartbeat задача в статусе 'r' считается брошенной
+    STALE_AFTER = 15 * 60
+
+    class Meta:
+        ordering = ["created"]
+
+    @classmethod
+    def claim_next(cls, worker):
+        """
+        Atomically takes the oldest queued job for the given worker, or a running job
+        whose worker has not reported progress for STALE_AFTER seconds (it crashed or was killed).
+        The conditional UPDATE makes sure two workers never get the same job.
+        Returns None when the queue is empty.
+        """
+        while True:
+            now = timezone.now()
+            claimable = Q(status='q') | Q(status='r', heartbeat__lt=now - timedelta(seconds=cls.STALE_AFTER))
+            job_id = cls.objects.filter(claimable).order_by('created', 'id').values_list('id', flat=True).first()
+            if job_id is None:
+                return None
+            claimed = cls.objects.filter(claimable, id=job_id).update(
+                status='r', worker=worker, heartbeat=now, started=Coalesce('started', now))
+            if claimed:
+                return cls.objects.get(id=job_id)
+
+    @property
+    def rows_per_second(self):
+        if not self.started:
+            return 0
+        elapsed = ((self.finished or timezone.now()) - self.started).total_seconds()
+        return round(self.rows_processed / elapsed, 1) if elapsed > 0 else 0
+
+    def get_absolute_url(self):
+        """
+        Returns the url of the job status endpoint.
+        """
+        return reverse('import-job-status', args=[str(self.id)])
+
+    def __str__(self):
+        return '%s (%s)' % (self.file.name, self.get_status_display())
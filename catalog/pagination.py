@@ -0,0 +1,173 @@
+"""
+Opt-in keyset (cursor) pagination for the catalog list views.
+
+Offset pagination runs a COUNT(*) on every page and OFFSET gets slower
+the deeper the page. With ?paginate=cursor (or a ?cursor= token) a list
+view using CursorPaginationMixin instead filters on the position of the
+last row shown, using a stable indexed ordering, so page 10,000 costs
+the same as page 1. The total shown with cursor pages is an approximate
+count cached for APPROXIMATE_COUNT_TIMEOUT seconds.
+"""
+import base64
+import hashlib
+import json
+
+from django.core.cache import cache
+from django.db.models import F, Q
+from django.http import Http404
+
+# Время жизни закэшированного приблизительного количества (секунды)
+APPROXIMATE_COUNT_TIMEOUT = 600
+
+
+def encode_cursor(values, forward=True):
+    data = json.dumps({'v': values, 'f': forward}, default=str, separators=(',', ':'))
+    return base64.urlsafe_b64encode(data.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    try:
+        data = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+        return data['v'], bool(data['f'])
+    except (ValueError, TypeError, KeyError):
+        raise Http404('Invalid cursor')
+
+
+class CursorPage:
+    """
+    Page of a cursor paginated list, compatible with what the templates use from Django's Page.
+    """
+    is_cursor = True
+
+    def __init__(self, object_list, next_cursor, previous_cursor, approximate_count=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.approximate_count = approximate_count
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+def _beyond(field, value, forward):
+    """
+    Rows strictly after (forward) or before value in field, nulls sort first.
+    """
+    if value is None:
+        return Q(**{field.name + '__isnull': False}) if forward else None
+    condition = Q(**{field.name + ('__gt' if forward else '__lt'): value})
+    if not forward and field.null:
+        condition |= Q(**{field.name + '__isnull': True})
+    return condition
+
+
+def _equal(field, value):
+    if value is None:
+        return Q(**{field.name + '__isnull': True})
+    return Q(**{field.name: value})
+
+
+def keyset_filter(fields, values, forward):
+    """
+    (f1 > v1) OR (f1 = v1 AND f2 > v2) OR ... for the ordering fields.
+    """
+    condition = Q(pk__in=[])
+    for i, (field, value) in enumerate(zip(fields, values)):
+        beyond = _beyond(field, value, forward)
+        if beyond is None:
+            continue
+        for previous_field, previous_value in zip(fields[:i], values[:i]):
+            beyond &= _equal(previous_field, previous_value)
+        condition |= beyond
+    return condition
+
+
+def keyset_order(fields, forward):
+    if forward:
+        return [F(field.name).asc(nulls_first=True) if field.null else F(field.name).asc() for field in fields]
+    return [F(field.name).desc(nulls_last=True) if field.null else F(field.name).desc() for field in fields]
+
+
+def approximate_count(queryset):
+    """
+    COUNT(*) of the queryset, cached so that it is run at most once per timeout.
+    """
+    key = 'catalog:count:' + hashlib.md5(str(queryset.query).encode()).hexdigest()
+    count = cache.get(key)
+    if count is None:
+        count = queryset.count()
+        cache.set(key, count, APPROXIMATE_COUNT_TIMEOUT)
+    return count
+
+
+def paginate_by_cursor(queryset, ordering, page_size, token=None, with_count=True):
+    """
+    Returns the CursorPage after (or before) the position encoded in token.
+    ordering is a tuple of field names ending with a unique field, e.g. ('due_back', 'id').
+    A values() queryset must select the ordering fields by their attnames.
+    """
+    fields = [queryset.model._meta.get_field(name) for name in ordering]
+    forward = True
+    page_queryset = queryset
+    if token:
+        values, forward = decode_cursor(token)
+        if len(values) != len(fields):
+            raise Http404('Invalid cursor')
+        try:
+            values = [None if value is None else field.to_python(value) for field, value in zip(fields, values)]
+        except Exception:
+            raise Http404('Invalid cursor')
+        page_queryset = page_queryset.filter(keyset_filter(fields, values, forward))
+
+    rows = list(page_queryset.order_by(*keyset_order(fields, forward))[:page_size + 1])
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    if not forward:
+        rows.reverse()
+
+    def position(obj):
+        # Строки values() - словари
+        if isinstance(obj, dict):
+            return [obj[field.attname] for field in fields]
+        return [getattr(obj, field.attname) for field in fields]
+
+    next_cursor = previous_cursor = None
+    if rows:
+        if has_more or not forward:
+            next_cursor = encode_cursor(position(rows[-1]), forward=True)
+        if (has_more and not forward) or (forward and token):
+            previous_cursor = encode_cursor(position(rows[0]), forward=False)
+
+    count = approximate_count(queryset) if with_count else None
+    return CursorPage(rows, next_cursor, previous_cursor, count)
+
+
+class CursorPaginationMixin:
+    """
+    ListView mixin switching to keyset pagination on ?paginate=cursor or ?cursor=<token>.
+    Without them the view keeps Django's page number pagination.
+    """
+    cursor_ordering = ('id',)
+    cursor_count = True
+
+    def cursor_mode(self):
+        return 'cursor' in self.request.GET or self.request.GET.get('paginate') == 'cursor'
+
+    def paginate_queryset(self, queryset, page_size):
+        if not self.cursor_mode():
+            return super().paginate_queryset(queryset, page_size)
+        page = paginate_by_cursor(queryset, self.cursor_ordering, page_size,
+                                  self.request.GET.get('cursor'), self.cursor_count)
+        return None, page, page.object_list, page.has_other_pages()
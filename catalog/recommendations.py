@@ -0,0 +1,131 @@
+"""
+"Readers who liked this also liked" recommendations.
+
+build_similarities() reads the Profile.liked_books through table into
+NumPy arrays and counts how many profiles liked each pair of books with
+vectorized sparse co-occurrence counting: the likes of every profile are
+expanded into (book, book) pair keys in chunks of about PAIR_CHUNK_SIZE
+pairs, and np.unique sums them. Pairs are scored with the cosine
+similarity co_likes / sqrt(likes_a * likes_b), the RECOMMENDATIONS_PER_BOOK
+best neighbours of every book are kept and the BookSimilarity table is
+replaced in one transaction. The detail page then needs a single indexed
+query (similar_books).
+"""
+import time
+
+import numpy as np
+from django.db import transaction
+
+from users_and_accounts.models import Profile
+from .models import BookSimilarity
+
+LikedBook = Profile.liked_books.through
+
+# Сколько похожих книг хранится для каждой книги
+RECOMMENDATIONS_PER_BOOK = 10
+# Минимальное число общих читателей, при котором пара считается похожей
+MIN_CO_LIKES = 2
+# Лайки читателя, учитываемые при подсчете (самые новые); ограничивает квадратичный рост пар
+MAX_LIKES_PER_PROFILE = 500
+# Сколько пар считается за один проход np.unique (память ~ 16 байт на пару)
+PAIR_CHUNK_SIZE = 20_000_000
+WRITE_BATCH_SIZE = 5000
+
+
+def load_likes():
+    """
+    Returns (profile_ids, book_ids) int64 arrays of the through table, sorted by profile, newest like first.
+    """
+    rows = LikedBook.objects.order_by('profile_id', '-id').values_list('profile_id', 'book_id')
+    pairs = np.fromiter((value for row in rows.iterator(chunk_size=20000) for value in row), dtype=np.int64)
+    pairs = pairs.reshape(-1, 2)
+    return pairs[:, 0], pairs[:, 1]
+
+
+def _cap_per_profile(profiles, books, limit):
+    """
+    Keeps the first limit likes of every profile (the arrays are grouped by profile).
+    """
+    starts = np.flatnonzero(np.r_[True, profiles[1:] != profiles[:-1]])
+    sizes = np.diff(np.r_[starts, len(profiles)])
+    position = np.arange(len(profiles)) - np.repeat(starts, sizes)
+    keep = position < limit
+    return profiles[keep], books[keep]
+
+
+def co_occurrence(profiles, books, n_books, chunk_size=PAIR_CHUNK_SIZE):
+    """
+    Counts co-likes of dense book indices. profiles must be grouped.
+    Returns (first, second, counts) for every ordered pair of different books liked by the same profile.
+    """
+    starts = np.flatnonzero(np.r_[True, profiles[1:] != profiles[:-1]]) if len(profiles) else np.array([], dtype=np.int64)
+    sizes = np.diff(np.r_[starts, len(profiles)]).astype(np.int64)
+    # Профили режутся на куски так, чтобы в каждом было не больше chunk_size пар
+    pair_totals = np.cumsum(sizes * sizes)
+    keys, counts = np.array([], dtype=np.int64), np.array([], dtype=np.int64)
+    first_group = 0
+    while first_group < len(starts):
+        offset = pair_totals[first_group - 1] if first_group else 0
+        last_group = max(int(np.searchsorted(pair_totals, offset + chunk_size, side='right')), first_group + 1)
+        group_starts, group_sizes = starts[first_group:last_group], sizes[first_group:last_group]
+
+        # Каждый лайк повторяется size раз и сочетается со всеми лайками своего профиля
+        items = np.arange(group_starts[0], group_starts[-1] + group_sizes[-1])
+        item_sizes = np.repeat(group_sizes, group_sizes)
+        item_starts = np.repeat(group_starts, group_sizes)
+        left = np.repeat(items, item_sizes)
+        pair_group_starts = np.repeat(np.cumsum(item_sizes) - item_sizes, item_sizes)
+        right = np.repeat(item_starts, item_sizes) + np.arange(len(left)) - pair_group_starts
+
+        left, right = books[left], books[right]
+        different = left != right
+        chunk_keys, chunk_counts = np.unique(left[different] * n_books + right[different], return_counts=True)
+        keys, inverse = np.unique(np.r_[keys, chunk_keys], return_inverse=True)
+        counts = np.bincount(inverse, weights=np.r_[counts, chunk_counts]).astype(np.int64)
+        first_group = last_group
+    return keys // n_books, keys % n_books, counts
+
+
+def top_neighbours(first, second, scores, limit):
+    """
+    Indices of the limit best scored pairs of every first book.
+    """
+    order = np.lexsort((-scores, first))
+    first_sorted = first[order]
+    starts = np.flatnonzero(np.r_[True, first_sorted[1:] != first_sorted[:-1]]) if len(order) else np.array([], dtype=np.int64)
+    rank = np.arange(len(order)) - np.repeat(starts, np.diff(np.r_[starts, len(order)]))
+    return order[rank < limit]
+
+
+def build_similarities(per_book=RECOMMENDATIONS_PER_BOOK, min_co_likes=MIN_CO_LIKES):
+    """
+    Recomputes the BookSimilarity table from all likes. Returns a dict with what was done.
+    """
+    started = time.monotonic()
+    profiles, books = load_likes()
+    profiles, books = _cap_per_profile(profiles, books, MAX_LIKES_PER_PROFILE)
+    book_ids, dense = np.unique(books, return_inverse=True)
+    n_books = len(book_ids)
+    likes_per_book = np.bincount(dense, minlength=n_books)
+
+    first, second, co_likes = co_occurrence(profiles, dense.astype(np.int64), max(n_books, 1))
+    frequent = co_likes >= min_co_likes
+    first, second, co_likes = first[frequent], second[frequent], co_likes[frequent]
+    scores = co_likes / np.sqrt(likes_per_book[first] * likes_per_book[second])
+    best = top_neighbours(first, second, scores, per_book)
+
+    rows = [BookSimilarity(book_id=int(book_ids[a]), similar_id=int(book_ids[b]), score=float(score), co_likes=int(count))
+            for a, b, score, count in zip(first[best], second[best], scores[best], co_likes[best])]
+    with transaction.atomic():
+        BookSimilarity.objects.all().delete()
+        BookSimilarity.objects.bulk_create(rows, batch_size=WRITE_BATCH_SIZE)
+    return {'likes': len(books), 'books': n_books, 'pairs': len(co_likes), 'rows': len(rows),
+            'seconds': round(time.monotonic() - started, 2)}
+
+
+def similar_books(book, limit=5):
+    """
+    Books most often liked together with book, best first. One query on the (book, -score) index.
+    """
+    return [similarity.similar for similarity in
+            BookSimilarity.objects.filter(book=book).select_related('similar').order_by('-score')[:limit]]
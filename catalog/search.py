@@ -0,0 +1,252 @@
+"""
+Full-text search over the catalog backed by SQLite FTS5 virtual tables.
+
+catalog_book_fts indexes book title, summary, author name and genre names,
+catalog_author_fts indexes author names. Both are kept in sync by SQLite
+triggers, so bulk inserts from the importer and raw updates are indexed too.
+The tables and triggers are created after migrate (see CatalogConfig.ready),
+indexing the books already in the database, and can be rebuilt with
+'manage.py rebuild_search_index'.
+
+On other databases the search falls back to icontains lookups.
+
+cached_search() keeps the result ids of normalized queries in the cache
+together with LibraryStats.search_version, and invalidate_search_cache(),
+called whenever books or authors change, bumps that version. The version
+lives in the database, so a bump made by any process (a gunicorn worker,
+run_import_worker) invalidates the results cached by all of them.
+"""
+import hashlib
+import re
+
+from django.core.cache import cache
+from django.db import connections, DEFAULT_DB_ALIAS
+from django.db.models import Q
+
+from .models import Author, Book, Genre, LibraryStats
+
+BOOK_INDEX = 'catalog_book_fts'
+AUTHOR_INDEX = 'catalog_author_fts'
+
+# Веса колонок для bm25: title, summary, author, genres
+BOOK_WEIGHTS = (10.0, 1.0, 5.0, 3.0)
+# Максимальное число результатов, которое возвращает один поиск
+SEARCH_MAX_RESULTS = 1000
+# Время жизни закэшированных результатов поиска (секунды)
+SEARCH_CACHE_TIMEOUT = 300
+
+WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def _tables():
+    return {
+        'book': Book._meta.db_table,
+        'author': Author._meta.db_table,
+        'genre': Genre._meta.db_table,
+        'book_genre': Book.genre.through._meta.db_table,
+        'book_fts': BOOK_INDEX,
+        'author_fts': AUTHOR_INDEX,
+    }
+
+
+# Текст книги для индекса: заголовок, описание, имя автора и жанры
+BOOK_ROWS_SQL = """
+    SELECT b.id, b.title, b.summary,
+           COALESCE(a.first_name || ' ' || a.last_name, ''),
+           COALESCE((SELECT group_concat(g.name, ' ')
+                     FROM {book_genre} bg JOIN {genre} g ON g.id = bg.genre_id
+                     WHERE bg.book_id = b.id), '')
+    FROM {book} b LEFT JOIN {author} a ON a.id = b.author_id
+"""
+
+REINDEX_BOOK_SQL = """
+    DELETE FROM {book_fts} WHERE rowid = {book_id};
+    INSERT INTO {book_fts}(rowid, title, summary, author, genres) """ + BOOK_ROWS_SQL + """ WHERE b.id = {book_id};
+"""
+
+REINDEX_AUTHOR_BOOKS_SQL = """
+    DELETE FROM {book_fts} WHERE rowid IN (SELECT id FROM {book} WHERE author_id = {author_id});
+    INSERT INTO {book_fts}(rowid, title, summary, author, genres) """ + BOOK_ROWS_SQL + """ WHERE b.author_id = {author_id};
+"""
+
+REINDEX_GENRE_BOOKS_SQL = """
+    DELETE FROM {book_fts} WHERE rowid IN (SELECT book_id FROM {book_genre} WHERE genre_id = {genre_id});
+    INSERT INTO {book_fts}(rowid, title, summary, author, genres) """ + BOOK_ROWS_SQL + """
+        WHERE b.id IN (SELECT book_id FROM {book_genre} WHERE genre_id = {genre_id});
+"""
+
+
+def _schema_statements():
+    tables = _tables()
+
+    def trigger(name, event, body):
+        return 'CREATE TRIGGER IF NOT EXISTS {} {} BEGIN {} END'.format(name, event.format(**tables), body)
+
+    def reindex_book(book_id):
+        return REINDEX_BOOK_SQL.format(book_id=book_id, **tables)
+
+    book_fts, author_fts = BOOK_INDEX, AUTHOR_INDEX
+    author_fts_insert = 'INSERT INTO {}(rowid, first_name, last_name) VALUES (NEW.id, NEW.first_name, NEW.last_name);'.format(author_fts)
+    author_fts_delete = 'DELETE FROM {} WHERE rowid = OLD.id;'.format(author_fts)
+
+    return [
+        "CREATE VIRTUAL TABLE IF NOT EXISTS {} USING fts5(title, summary, author, genres, "
+        "tokenize='unicode61 remove_diacritics 2')".format(book_fts),
+        "CREATE VIRTUAL TABLE IF NOT EXISTS {} USING fts5(first_name, last_name, "
+        "tokenize='unicode61 remove_diacritics 2')".format(author_fts),
+
+        trigger(book_fts + '_ai', 'AFTER INSERT ON {book}', reindex_book('NEW.id')),
+        trigger(book_fts + '_au', 'AFTER UPDATE OF title, summary, author_id ON {book}', reindex_book('NEW.id')),
+        trigger(book_fts + '_ad', 'AFTER DELETE ON {book}', 'DELETE FROM {} WHERE rowid = OLD.id;'.format(book_fts)),
+        trigger(book_fts + '_genre_ai', 'AFTER INSERT ON {book_genre}', reindex_book('NEW.book_id')),
+        trigger(book_fts + '_genre_ad', 'AFTER DELETE ON {book_genre}', reindex_book('OLD.book_id')),
+        trigger(book_fts + '_genre_au', 'AFTER UPDATE OF name ON {genre}',
+                REINDEX_GENRE_BOOKS_SQL.format(genre_id='NEW.id', **tables)),
+        trigger(book_fts + '_author_au', 'AFTER UPDATE OF first_name, last_name ON {author}',
+                REINDEX_AUTHOR_BOOKS_SQL.format(author_id='NEW.id', **tables)),
+
+        trigger(author_fts + '_ai', 'AFTER INSERT ON {author}', author_fts_insert),
+        trigger(author_fts + '_au', 'AFTER UPDATE OF first_name, last_name ON {author}', author_fts_delete + ' ' + author_fts_insert),
+        trigger(author_fts + '_ad', 'AFTER DELETE ON {author}', author_fts_delete),
+    ]
+
+
+def is_supported(using=DEFAULT_DB_ALIAS):
+    return connections[using].vendor == 'sqlite'
+
+
+def create_search_index(using=DEFAULT_DB_ALIAS, **kwargs):
+    """
+    Creates the FTS5 tables and the triggers keeping them in sync.
+    Safe to call repeatedly, used as a post_migrate handler.
+    When the tables did not exist yet, the books and authors already in the catalog are indexed.
+    """
+    if not is_supported(using):
+        return
+    connection = connections[using]
+    created = BOOK_INDEX not in connection.introspection.table_names()
+    with connection.cursor() as cursor:
+        for statement in _schema_statements():
+            cursor.execute(statement)
+    if created:
+        index_catalog(using)
+
+
+def drop_search_index(using=DEFAULT_DB_ALIAS):
+    """
+    Drops the FTS5 tables and their triggers.
+    """
+    tables = _tables()
+    with connections[using].cursor() as cursor:
+        cursor.execute('DROP TABLE IF EXISTS {book_fts}'.format(**tables))
+        cursor.execute('DROP TABLE IF EXISTS {author_fts}'.format(**tables))
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'trigger' AND (name LIKE %s OR name LIKE %s)",
+            [BOOK_INDEX + '%', AUTHOR_INDEX + '%'])
+        for (trigger,) in cursor.fetchall():
+            cursor.execute('DROP TRIGGER IF EXISTS %s' % trigger)
+
+
+def rebuild_search_index(using=DEFAULT_DB_ALIAS):
+    """
+    Drops and recreates the FTS5 tables and triggers, then indexes the whole catalog.
+    """
+    drop_search_index(using)
+    create_search_index(using)
+
+
+def index_catalog(using=DEFAULT_DB_ALIAS):
+    """
+    Fills the empty FTS5 tables with all books and authors of the catalog.
+    """
+    tables = _tables()
+    with connections[using].cursor() as cursor:
+        cursor.execute(('INSERT INTO {book_fts}(rowid, title, summary, author, genres) ' + BOOK_ROWS_SQL).format(**tables))
+        cursor.execute('INSERT INTO {author_fts}(rowid, first_name, last_name) SELECT id, first_name, last_name FROM {author}'.format(**tables))
+        cursor.execute("INSERT INTO {book_fts}({book_fts}) VALUES ('optimize')".format(**tables))
+        cursor.execute("INSERT INTO {author_fts}({author_fts}) VALUES ('optimize')".format(**tables))
+
+
+def build_match_query(text):
+    """
+    Turns free user input into an FTS5 query: every word must match as a prefix.
+    Quoting the words keeps FTS5 operators and punctuation in the input harmless.
+    """
+    words = WORD_RE.findall(text or '')
+    return ' '.join('"%s"*' % word for word in words)
+
+
+def _match(index, order_by, text, limit, using):
+    query = build_match_query(text)
+    if not query:
+        return []
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            'SELECT rowid FROM {index} WHERE {index} MATCH %s ORDER BY {order_by} LIMIT %s'.format(index=index, order_by=order_by),
+            [query, limit])
+        return [row[0] for row in cursor.fetchall()]
+
+
+def search_books(text, limit=SEARCH_MAX_RESULTS, using=DEFAULT_DB_ALIAS):
+    """
+    Returns the ids of the books matching text, best (BM25) match first.
+    """
+    if not is_supported(using):
+        books = Book.objects.using(using).filter(
+            Q(title__icontains=text) | Q(summary__icontains=text)
+            | Q(author__first_name__icontains=text) | Q(author__last_name__icontains=text)
+            | Q(genre__name__icontains=text)).distinct().order_by('title')
+        return list(books.values_list('id', flat=True)[:limit])
+    order_by = 'bm25({}, {})'.format(BOOK_INDEX, ', '.join(str(weight) for weight in BOOK_WEIGHTS))
+    return _match(BOOK_INDEX, order_by, text, limit, using)
+
+
+def search_authors(text, limit=SEARCH_MAX_RESULTS, using=DEFAULT_DB_ALIAS):
+    """
+    Returns the ids of the authors whose first or last name match text, best match first.
+    """
+    if not is_supported(using):
+        authors = Author.objects.using(using).filter(
+            Q(first_name__icontains=text) | Q(last_name__icontains=text)).order_by('last_name')
+        return list(authors.values_list('id', flat=True)[:limit])
+    return _match(AUTHOR_INDEX, 'rank', text, limit, using)
+
+
+def normalize_query(text):
+    """
+    Lower-cased words of the query, so that 'Dune ', 'dune' and 'DUNE!' share one cache entry.
+    """
+    return ' '.join(WORD_RE.findall((text or '').lower()))
+
+
+def invalidate_search_cache():
+    """
+    Makes every cached search result stale by bumping the search version.
+    """
+    LibraryStats.adjust(search_version=1)
+
+
+def search_version():
+    version = LibraryStats.objects.filter(pk=1).values_list('search_version', flat=True).first()
+    # Строки еще нет: load() создаст ее с новой версией
+    return version if version is not None else LibraryStats.load().search_version
+
+
+def cached_search(text):
+    """
+    Returns (book_ids, author_ids) for the query, ranked best match first.
+    The results are cached per normalized query together with the search version
+    they were computed for, so a repeated search costs a primary key lookup and a cache get.
+    """
+    query = normalize_query(text)
+    if not query:
+        return [], []
+    key = 'catalog:search:' + hashlib.md5(query.encode()).hexdigest()
+    version = search_version()
+    cached = cache.get(key)
+    if cached is not None and cached[0] == version:
+        return cached[1], cached[2]
+
+    book_ids, author_ids = search_books(query), search_authors(query)
+    cache.set(key, (version, book_ids, author_ids), SEARCH_CACHE_TIMEOUT)
+    return book_ids, author_ids
@@ -0,0 +1,136 @@
+"""
+Receivers keeping caches and derived data of the catalog up to date.
+Connected in CatalogConfig.ready().
+"""
+from django.db.models import QuerySet
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import autocomplete, likes
+from .models import Author, Book, BookInstance, Genre, LibraryStats
+from .search import invalidate_search_cache
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_delete, sender=Book)
+@receiver(post_save, sender=Author)
+@receiver(post_delete, sender=Author)
+@receiver(post_save, sender=Genre)
+@receiver(m2m_changed, sender=Book.genre.through)
+def catalog_changed(sender, **kwargs):
+    invalidate_search_cache()
+
+
+@receiver(post_save, sender=Book)
+def book_saved(sender, instance, **kwargs):
+    autocomplete.book_saved(instance)
+
+
+@receiver(post_delete, sender=Book)
+def book_deleted(sender, instance, **kwargs):
+    autocomplete.book_deleted(instance.id)
+
+
+@receiver(post_save, sender=Author)
+@receiver(post_delete, sender=Author)
+def author_changed(sender, **kwargs):
+    # Имя автора входит в подсказки всех его книг, проще перестроить снимок
+    autocomplete.invalidate_snapshot()
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_delete, sender=Book)
+@receiver(post_save, sender=Author)
+@receiver(post_delete, sender=Author)
+def count_books_and_authors(sender, created=False, **kwargs):
+    field = 'num_books' if sender is Book else 'num_authors'
+    if created:
+        LibraryStats.adjust(**{field: 1})
+    elif kwargs['signal'] is post_delete:
+        LibraryStats.adjust(**{field: -1})
+
+
+@receiver(post_save, sender=BookInstance)
+def count_saved_instance(sender, instance, created, **kwargs):
+    was_available = getattr(instance, '_loaded_status', None) == 'a'
+    is_available = instance.status == 'a'
+    if created:
+        LibraryStats.adjust(num_instances=1, num_instances_available=int(is_available))
+    elif hasattr(instance, '_loaded_status'):
+        LibraryStats.adjust(num_instances_available=int(is_available) - int(was_available))
+    else:
+        # Предыдущий статус неизвестен (объект не загружался из базы) - пересчитать доступные копии
+        LibraryStats.objects.filter(pk=1).update(
+            num_instances_available=BookInstance.objects.filter(status__exact='a').count())
+    instance._loaded_status = instance.status
+
+
+@receiver(post_delete, sender=BookInstance)
+def count_deleted_instance(sender, instance, **kwargs):
+    was_available = getattr(instance, '_loaded_status', instance.status) == 'a'
+    LibraryStats.adjust(num_instances=-1, num_instances_available=-int(was_available))
+
+
+# Фрагменты шаблонов книги закэшированы тегом {% cache %} с ключом (book.pk, book.updated).
+# Сохранение книги меняет updated само (auto_now), остальные изменения обновляют его здесь,
+# поэтому ключ меняется во всех процессах, а старые фрагменты просто истекают.
+
+def touch_books(books):
+    """
+    Sets Book.updated to now for the given queryset or ids, so their fragments get new cache keys.
+    """
+    if not isinstance(books, QuerySet):
+        books = Book.objects.filter(pk__in=list(books))
+    books.update(updated=timezone.now())
+
+
+@receiver(post_save, sender=BookInstance)
+@receiver(post_delete, sender=BookInstance)
+def copy_fragments_changed(sender, instance, **kwargs):
+    if instance.book_id:
+        touch_books([instance.book_id])
+
+
+@receiver(m2m_changed, sender=Book.genre.through)
+def genre_fragments_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action.startswith('post_'):
+            touch_books([instance.pk])
+    elif action == 'pre_clear':
+        # После clear() книги жанра уже не найти, поэтому они обновляются до очистки
+        touch_books(Book.objects.filter(genre=instance))
+    elif action in ('post_add', 'post_remove'):
+        touch_books(pk_set)
+
+
+@receiver(post_save, sender=Genre)
+def genre_renamed(sender, instance, created, **kwargs):
+    if not created:
+        touch_books(Book.objects.filter(genre=instance))
+
+
+@receiver(pre_delete, sender=Genre)
+def genre_deleted(sender, instance, **kwargs):
+    # Связи с книгами удаляются каскадом, без m2m_changed
+    touch_books(Book.objects.filter(genre=instance))
+
+
+@receiver(post_save, sender=Author)
+@receiver(pre_delete, sender=Author)
+def author_fragments_changed(sender, instance, **kwargs):
+    touch_books(Book.objects.filter(author_id=instance.pk))
+
+
+@receiver(m2m_changed, sender=likes.LikedBook)
+def likes_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    # like_book меняет счетчик сам, сюда попадают изменения через менеджер (админка, формы профиля)
+    if reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            likes.recount_likes([instance.pk])
+    elif action == 'pre_clear':
+        instance._cleared_likes = list(instance.liked_books.values_list('id', flat=True))
+    elif action == 'post_clear':
+        likes.recount_likes(instance.__dict__.pop('_cleared_likes', []))
+    elif action in ('post_add', 'post_remove'):
+        likes.recount_likes(pk_set)
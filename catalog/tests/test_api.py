@@ -0,0 +1,125 @@
+from django.test import TestCase
+from django.urls import reverse
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from catalog import api
+from catalog.models import Author, Book, BookInstance, Genre, Language
+
+
+class CatalogApiTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.english = Language.objects.create(name='English')
+        cls.french = Language.objects.create(name='French')
+        cls.fantasy = Genre.objects.create(name='Fantasy')
+        cls.poetry = Genre.objects.create(name='Poetry')
+        author = Author.objects.create(first_name='John', last_name='Smith')
+        cls.books = []
+        for book_num in range(25):
+            book = Book.objects.create(title='Book %s' % book_num, summary='Summary', isbn=str(book_num), author=author,
+                                       language=cls.english if book_num % 2 else cls.french)
+            book.genre.set([cls.fantasy] if book_num % 3 else [cls.fantasy, cls.poetry])
+            for copy_num in range(2):
+                BookInstance.objects.create(book=book, imprint='Imprint',
+                                            status='a' if book_num % 5 == 0 and copy_num == 0 else 'o')
+            cls.books.append(book)
+
+    def setUp(self):
+        cache.clear()
+
+    def get(self, url, **params):
+        resp = self.client.get(url, params)
+        self.assertEqual(resp.status_code, 200)
+        return resp.json()
+
+    def test_book_fields(self):
+        data = self.get(reverse('api-books'), page_size=1)
+        book = self.books[0]
+        self.assertEqual(data['results'], [{
+            'id': book.id,
+            'url': book.get_absolute_url(),
+            'title': 'Book 0',
+            'summary': 'Summary',
+            'isbn': '0',
+            'author': {'id': book.author_id, 'first_name': 'John', 'last_name': 'Smith',
+                       'url': book.author.get_absolute_url()},
+            'language': {'id': self.french.id, 'name': 'French'},
+            'genres': [{'id': self.fantasy.id, 'name': 'Fantasy'}, {'id': self.poetry.id, 'name': 'Poetry'}],
+            'cover': book.online_cover,
+            'like_count': 0,
+            'copies': {'total': 2, 'available': 1},
+        }])
+        self.assertIsNone(data['previous'])
+
+    def test_sparse_fields_select_only_their_columns(self):
+        with CaptureQueriesContext(connection) as queries:
+            data = self.get(reverse('api-books'), fields='id,title')
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('summary', queries[0]['sql'])
+        self.assertNotIn('catalog_author', queries[0]['sql'])
+        self.assertEqual(set(data['results'][0]), {'id', 'title'})
+
+    def test_unknown_field(self):
+        resp = self.client.get(reverse('api-books'), {'fields': 'id,borrower'})
+        self.assertEqual(resp.status_code, 400)
+        self.assertIn('borrower', resp.json()['error'])
+
+    def test_full_page_query_count(self):
+        with self.assertNumQueries(api.BookApiView.query_budget):
+            data = self.get(reverse('api-books'), page_size=100)
+        self.assertEqual(len(data['results']), 25)
+        self.assertIsNone(data['next'])
+
+    def test_cursor_walk(self):
+        ids, url, params = [], reverse('api-books'), {'fields': 'id', 'page_size': 10}
+        while url:
+            data = self.get(url, **params)
+            ids.extend(row['id'] for row in data['results'])
+            url, params = data['next'], {}
+        self.assertEqual(ids, [book.id for book in self.books])
+
+        previous = self.get(self.get(data['previous'])['next'])
+        self.assertEqual([row['id'] for row in previous['results']], [book.id for book in self.books[20:]])
+
+    def test_invalid_cursor(self):
+        resp = self.client.get(reverse('api-books'), {'cursor': 'garbage'})
+        self.assertEqual(resp.status_code, 400)
+
+    def test_filters(self):
+        def ids(**params):
+            return [row['id'] for row in self.get(reverse('api-books'), fields='id', page_size=100, **params)['results']]
+
+        self.assertEqual(ids(genre='poetry'), [book.id for book in self.books[::3]])
+        self.assertEqual(ids(genre=self.poetry.id), ids(genre='Poetry'))
+        self.assertEqual(ids(language='English'), [book.id for book in self.books[1::2]])
+        self.assertEqual(ids(language=self.french.id), [book.id for book in self.books[::2]])
+        self.assertEqual(ids(available=1), [book.id for book in self.books[::5]])
+        self.assertEqual(ids(available=1, language='French', genre='Poetry'), [self.books[0].id])
+
+    def test_other_endpoints(self):
+        self.assertEqual(self.get(reverse('api-genres'))['results'],
+                         [{'id': self.fantasy.id, 'name': 'Fantasy'}, {'id': self.poetry.id, 'name': 'Poetry'}])
+        self.assertEqual([row['name'] for row in self.get(reverse('api-languages'))['results']], ['English', 'French'])
+        self.assertEqual(self.get(reverse('api-authors'), last_name='Smith', fields='first_name')['results'], [{'first_name': 'John'}])
+
+        copies = self.get(reverse('api-copies'), book=self.books[0].id, status='a')['results']
+        self.assertEqual(len(copies), 1)
+        self.assertEqual(copies[0]['book'], self.books[0].id)
+        self.assertNotIn('borrower', copies[0])
+        self.assertEqual(self.client.get(reverse('api-copies'), {'status': 'x'}).status_code, 400)
+
+    def test_non_decimal_digits(self):
+        # '²'.isdigit() истинно, но int('²') падает
+        self.assertEqual(self.get(reverse('api-books'), genre='²')['results'], [])
+        self.assertEqual(self.get(reverse('api-books'), language='²')['results'], [])
+        self.assertEqual(self.client.get(reverse('api-copies'), {'book': '²'}).status_code, 400)
+
+    def test_id_out_of_range(self):
+        too_big = '9' * 25
+        for url, param in (('api-books', 'genre'), ('api-books', 'language'), ('api-copies', 'book')):
+            resp = self.client.get(reverse(url), {param: too_big})
+            self.assertEqual(resp.status_code, 400)
+            self.assertIn('out of range', resp.json()['error'])
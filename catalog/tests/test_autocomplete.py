@@ -0,0 +1,106 @@
+from django.test import TestCase
+from django.urls import reverse
+import json
+from unittest import mock
+
+from catalog import autocomplete
+from catalog.autocomplete import CatalogSnapshot, normalize
+from catalog.models import Author, Book, Language
+
+
+class CatalogSnapshotTest(TestCase):
+
+    def test_prefix_lookup(self):
+        snapshot = CatalogSnapshot([
+            *autocomplete.book_entries(1, 'Dune', 'Frank', 'Herbert'),
+            *autocomplete.book_entries(2, 'Dune Messiah', 'Frank', 'Herbert'),
+            *autocomplete.book_entries(3, 'Dracula', None, None),
+            *autocomplete.author_entries(1, 'Frank', 'Herbert'),
+        ])
+        self.assertEqual(snapshot.lookup('du'), [(0, 1, 'Dune', 'Frank Herbert'), (0, 2, 'Dune Messiah', 'Frank Herbert')])
+        self.assertEqual(snapshot.lookup('DUNE m'), [(0, 2, 'Dune Messiah', 'Frank Herbert')])
+        self.assertEqual(snapshot.lookup('herb'), [(1, 1, 'Frank Herbert', '')])
+        self.assertEqual(snapshot.lookup('d', limit=1), [(0, 3, 'Dracula', '')])
+        self.assertEqual(snapshot.lookup('x'), [])
+        self.assertEqual(snapshot.lookup(''), [])
+
+    def test_replace_keeps_packed_columns(self):
+        snapshot = CatalogSnapshot(entry for i in range(10) for entry in autocomplete.book_entries(i, 'Title %s' % i, None, None))
+        changed = snapshot.replace({(0, 3): list(autocomplete.book_entries(3, 'Another 3', None, None)), (0, 4): []})
+        # Колонки общие, изменения только в дельте
+        self.assertIs(changed.keys, snapshot.keys)
+        self.assertEqual(changed.lookup('another'), [(0, 3, 'Another 3', '')])
+        self.assertEqual([result[1] for result in changed.lookup('title', limit=20)], [0, 1, 2, 5, 6, 7, 8, 9])
+        self.assertEqual(len(snapshot.lookup('title', limit=20)), 10)
+
+        rebuilt = CatalogSnapshot(changed.entries())
+        self.assertEqual(list(rebuilt.entries()), list(changed.entries()))
+
+    def test_large_delta_is_merged(self):
+        snapshot = CatalogSnapshot(autocomplete.book_entries(0, 'Zero', None, None))
+        with mock.patch.object(autocomplete, 'MAX_DELTA_SIZE', 2):
+            for i in range(1, 4):
+                snapshot = snapshot.replace({(0, i): list(autocomplete.book_entries(i, 'Book %s' % i, None, None))})
+        self.assertEqual(snapshot.changes, {})
+        self.assertEqual([snapshot.ids[i] for i in range(len(snapshot))], [1, 2, 3, 0])
+
+    def test_entries_are_truncated_after_sorting(self):
+        with mock.patch.object(autocomplete, 'MAX_ENTRIES', 2):
+            snapshot = CatalogSnapshot([*autocomplete.book_entries(1, 'Zeta', None, None),
+                                        *autocomplete.book_entries(2, 'Beta', None, None),
+                                        *autocomplete.book_entries(3, 'Alpha', None, None)])
+        self.assertEqual(snapshot.lookup('a'), [(0, 3, 'Alpha', '')])
+        self.assertEqual(len(snapshot), 2)
+
+    def test_normalize(self):
+        self.assertEqual(normalize('  Le Guin, Úrsula! '), 'le guin ursula')
+
+    def test_stats(self):
+        snapshot = CatalogSnapshot(entry for i in range(1000) for entry in autocomplete.book_entries(i, 'Title %s' % i, 'First', 'Last'))
+        stats = snapshot.stats()
+        self.assertEqual(stats['books'], 1000)
+        # Компактное хранение: меньше 100 байт на книгу
+        self.assertLess(stats['memory_bytes'] / stats['books'], 100)
+
+
+class AutocompleteViewTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.language = Language.objects.create(name='English')
+        cls.author = Author.objects.create(first_name='Isaac', last_name='Asimov')
+        cls.book = Book.objects.create(title='Foundation', summary='', isbn='1', author=cls.author, language=cls.language)
+
+    def setUp(self):
+        autocomplete.invalidate_snapshot()
+
+    def lookup(self, q):
+        resp = self.client.get(reverse('autocomplete'), {'q': q})
+        self.assertEqual(resp.status_code, 200)
+        return json.loads(resp.content)['results']
+
+    def test_books_and_authors(self):
+        self.assertEqual(self.lookup('found'), [{'type': 'book', 'id': self.book.id, 'title': 'Foundation',
+                                                 'author': 'Isaac Asimov', 'url': self.book.get_absolute_url()}])
+        self.assertEqual(self.lookup('asim')[0]['name'], 'Isaac Asimov')
+
+    def test_repeated_lookup_does_not_query(self):
+        self.lookup('found')
+        with self.assertNumQueries(0):
+            self.lookup('foundation')
+
+    def test_snapshot_follows_book_changes(self):
+        self.lookup('found')
+        other = Book.objects.create(title='Foundation and Empire', summary='', isbn='2', author=self.author, language=self.language)
+        self.assertEqual([result['id'] for result in self.lookup('found')], [self.book.id, other.id])
+
+        self.book.delete()
+        with self.assertNumQueries(0):
+            self.assertEqual([result['id'] for result in self.lookup('found')], [other.id])
+
+    def test_author_change_rebuilds_snapshot(self):
+        self.lookup('asim')
+        self.author.last_name = 'Azimov'
+        self.author.save()
+        self.assertEqual(self.lookup('asim'), [])
+        self.assertEqual(self.lookup('foundation')[0]['author'], 'Isaac Azimov')
@@ -0,0 +1,91 @@
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.contrib.auth.models import Permission, User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+import csv
+import io
+import json
+import shutil
+import tempfile
+
+from catalog.export import export_chunks
+from catalog.models import Book, Genre, Language
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class ExportTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        Language.objects.create(name='English')
+        travel, poetry = Genre.objects.create(name='Travel'), Genre.objects.create(name='Poetry')
+        for book_num in range(7):
+            book = Book.objects.create(title='Book, "%s"' % book_num, summary='Line 1\nLine 2', isbn='%013d' % book_num,
+                                       online_cover=None if book_num == 3 else 'https://example.com/%s.jpg' % book_num)
+            book.genre.set([[], [travel], [travel, poetry]][book_num % 3])
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def snapshot(self):
+        return [(book.title, book.summary, book.isbn, book.online_cover or '', sorted(genre.name for genre in book.genre.all()))
+                for book in Book.objects.order_by('id').prefetch_related('genre')]
+
+    def download(self, file_format):
+        resp = self.client.get(reverse('export-books'), {'format': file_format})
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(resp.streaming)
+        self.assertIn('all_books.%s' % file_format, resp['Content-Disposition'])
+        return b''.join(resp.streaming_content)
+
+    def test_csv_layout(self):
+        content = self.download('csv').decode()
+        self.assertTrue(content.startswith('genre,title,summary,isbn,cover_url\n,"Book, ""0""","Line 1\nLine 2",0000000000000,'))
+        rows = list(csv.reader(io.StringIO(content)))
+        self.assertEqual(len(rows), 8)
+        self.assertEqual(rows[3], ['Travel|Poetry', 'Book, "2"', 'Line 1\nLine 2', '0000000000002', 'https://example.com/2.jpg'])
+        self.assertEqual(rows[4][4], '')
+
+    def test_ndjson_layout(self):
+        rows = [json.loads(line) for line in self.download('ndjson').decode().splitlines()]
+        self.assertEqual(len(rows), 7)
+        self.assertEqual(rows[2], {'genre': 'Travel|Poetry', 'title': 'Book, "2"', 'summary': 'Line 1\nLine 2',
+                                   'isbn': '0000000000002', 'cover_url': 'https://example.com/2.jpg'})
+        self.assertEqual(rows[3]['cover_url'], '')
+
+    def test_genres_are_not_queried_per_book(self):
+        # книги и жанры, по одному запросу на весь экспорт
+        with self.assertNumQueries(2):
+            chunks = list(export_chunks('csv', chunk_size=2, rows_per_chunk=3))
+        self.assertEqual(len(chunks), 3)
+
+    def test_unsupported_format(self):
+        self.assertEqual(self.client.get(reverse('export-books'), {'format': 'xml'}).status_code, 400)
+
+    def round_trip(self, file_format):
+        content = self.download(file_format)
+        before = self.snapshot()
+        Book.objects.all().delete()
+        librarian = User.objects.create_user(username='librarian')
+        librarian.user_permissions.add(Permission.objects.get(codename='can_mark_returned'))
+        self.client.force_login(librarian)
+        resp = self.client.post(reverse('upload_book'), {'file': SimpleUploadedFile('all_books.' + file_format, content)})
+        self.assertEqual(resp.status_code, 200)
+        call_command('run_import_worker', once=True, stdout=io.StringIO())
+        self.assertEqual(self.snapshot(), before)
+
+    def test_csv_round_trip(self):
+        self.round_trip('csv')
+
+    def test_ndjson_round_trip(self):
+        self.round_trip('ndjson')
+
+    def test_command(self):
+        out = io.StringIO()
+        call_command('export_books', format='ndjson', stdout=out)
+        self.assertEqual(len(out.getvalue().splitlines()), 7)
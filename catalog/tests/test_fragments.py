@@ -0,0 +1,81 @@
+from django.test import TestCase
+from django.urls import reverse
+from django.core.cache import cache
+from django.utils import timezone
+
+from catalog import visits
+from catalog.models import Author, Book, BookInstance, Genre, Language
+
+
+class FragmentCacheTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = Author.objects.create(first_name='Mary', last_name='Shelley')
+        cls.genre = Genre.objects.create(name='Gothic')
+        language = Language.objects.create(name='English')
+        cls.book = Book.objects.create(title='Frankenstein', summary='', isbn='1', author=cls.author, language=language)
+        cls.book.genre.set([cls.genre])
+
+    def setUp(self):
+        cache.clear()
+        visits.buffer.clear()
+        self.addCleanup(visits.buffer.clear)
+
+    def test_book_card_is_cached(self):
+        self.assertContains(self.client.get(reverse('book-list')), 'Frankenstein')
+        # update() не отправляет сигналы, поэтому показывается закэшированный фрагмент
+        Book.objects.filter(pk=self.book.pk).update(title='The Modern Prometheus')
+        self.assertContains(self.client.get(reverse('book-list')), 'Frankenstein')
+
+    def test_book_card_is_invalidated(self):
+        self.client.get(reverse('book-list'))
+        self.book.title = 'The Modern Prometheus'
+        self.book.save()
+        self.assertContains(self.client.get(reverse('book-list')), 'The Modern Prometheus')
+
+        self.author.last_name = 'Wollstonecraft Shelley'
+        self.author.save()
+        self.assertContains(self.client.get(reverse('book-list')), 'Wollstonecraft Shelley')
+
+    def test_cached_detail_sections_skip_queries(self):
+        url = self.book.get_absolute_url()
+        # Без cookie посетителя счетчик посещений не читается
+        with self.assertNumQueries(4):
+            self.client.get(url)
+        with self.assertNumQueries(3):
+            resp = self.client.get(url)
+        self.assertContains(resp, 'Gothic')
+
+    def test_detail_sections_are_invalidated(self):
+        url = self.book.get_absolute_url()
+        self.client.get(url)
+
+        BookInstance.objects.create(book=self.book, imprint='Lackington 1818', status='a')
+        self.assertContains(self.client.get(url), 'Lackington 1818')
+
+        self.book.genre.add(Genre.objects.create(name='Science Fiction'))
+        self.assertContains(self.client.get(url), 'Science Fiction')
+
+        self.genre.name = 'Gothic Horror'
+        self.genre.save()
+        self.assertContains(self.client.get(url), 'Gothic Horror')
+
+        self.genre.book_set.clear()
+        self.assertNotContains(self.client.get(url), 'Gothic Horror')
+
+    def test_genre_deletion_changes_key(self):
+        url = self.book.get_absolute_url()
+        self.assertContains(self.client.get(url), 'Gothic')
+        self.genre.delete()
+        self.assertNotContains(self.client.get(url), 'Gothic')
+
+    def test_key_follows_book_version(self):
+        # Ключ зависит от Book.updated, поэтому изменение из другого процесса видно без удаления ключей
+        self.client.get(reverse('book-list'))
+        Book.objects.filter(pk=self.book.pk).update(title='The Modern Prometheus', updated=timezone.now())
+        self.assertContains(self.client.get(reverse('book-list')), 'The Modern Prometheus')
+
+    def test_visit_count_is_not_cached(self):
+        for visit_num in (0, 0, 1, 2):
+            self.assertEqual(self.client.get(self.book.get_absolute_url()).context['visit_num'], visit_num)
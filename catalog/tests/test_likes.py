@@ -0,0 +1,67 @@
+from django.test import TestCase
+from django.urls import reverse
+from django.contrib.auth.models import User
+
+from catalog import likes
+from catalog.models import Book
+from users_and_accounts.models import Profile
+
+
+class LikeBookTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='reader', password='12345')
+        cls.books = [Book.objects.create(title='Book %s' % i, summary='', isbn=str(i)) for i in range(5)]
+
+    def setUp(self):
+        self.client.login(username='reader', password='12345')
+
+    def like(self, book):
+        return self.client.post(reverse('like_book'), {'book_id': book.pk})
+
+    def test_toggle_returns_state_and_count(self):
+        resp = self.like(self.books[0])
+        self.assertEqual(resp.json(), {'status': 'liked', 'like_count': 1})
+        self.assertTrue(Profile.objects.get(user=self.user).liked_books.filter(pk=self.books[0].pk).exists())
+        resp = self.like(self.books[0])
+        self.assertEqual(resp.json(), {'status': 'unliked', 'like_count': 0})
+        self.books[0].refresh_from_db()
+        self.assertEqual(self.books[0].like_count, 0)
+
+    def test_requires_login_and_existing_book(self):
+        self.assertEqual(self.client.post(reverse('like_book'), {'book_id': 'x'}).status_code, 400)
+        self.assertEqual(self.client.post(reverse('like_book'), {'book_id': '9' * 25}).status_code, 400)
+        self.assertEqual(self.client.post(reverse('like_book'), {'book_id': 0}).status_code, 404)
+        self.assertEqual(self.client.get(reverse('like_book')).status_code, 405)
+        self.client.logout()
+        self.assertEqual(self.client.post(reverse('like_book'), {'book_id': self.books[0].pk}).status_code, 403)
+
+    def test_manager_changes_are_recounted(self):
+        profile = Profile.objects.create(user=User.objects.create_user(username='other'))
+        profile.liked_books.add(*self.books[:2])
+        self.books[1].profile_set.add(Profile.objects.create(user=self.user))
+        counts = dict(Book.objects.values_list('id', 'like_count'))
+        self.assertEqual([counts[book.id] for book in self.books[:3]], [1, 2, 0])
+        profile.liked_books.clear()
+        self.assertEqual(Book.objects.get(pk=self.books[1].pk).like_count, 1)
+
+    def test_leaderboard_follows_like_count(self):
+        self.like(self.books[2])
+        self.assertEqual(self.client.get(reverse('most-liked-books')).json()['results'][0]['id'], self.books[2].id)
+
+        self.like(self.books[3])
+        other = Profile.objects.create(user=User.objects.create_user(username='other', password='12345'))
+        likes.toggle_like(other.user, self.books[3].pk)
+        # Один запрос по индексу like_count, без кэша, который нужно согласовывать между процессами
+        with self.assertNumQueries(1):
+            board = likes.leaderboard()
+        self.assertEqual(board, [(self.books[3].id, 'Book 3', 2), (self.books[2].id, 'Book 2', 1)])
+
+        self.like(self.books[2])
+        self.assertEqual(likes.leaderboard(), [(self.books[3].id, 'Book 3', 2)])
+
+    def test_leaderboard_size(self):
+        Book.objects.filter(pk__in=[book.pk for book in self.books]).update(like_count=5)
+        self.assertEqual(len(likes.leaderboard(limit=3)), 3)
+        self.assertEqual([row[0] for row in likes.leaderboard()], [book.id for book in self.books])
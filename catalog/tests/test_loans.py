@@ -0,0 +1,103 @@
+from django.test import TestCase
+from django.urls import reverse
+from django.core.cache import cache
+from django.core.management import call_command
+from django.contrib.auth.models import User, Permission
+from decimal import Decimal
+import datetime
+import io
+
+from catalog import loans
+from catalog.models import Book, BookInstance, Language, LoanReminder
+
+
+class OverdueLoansTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.today = datetime.date(2024, 3, 20)
+        cls.reader = User.objects.create_user(username='reader', password='12345')
+        cls.librarian = User.objects.create_user(username='librarian', password='12345')
+        cls.librarian.user_permissions.add(Permission.objects.get(codename='can_mark_returned'))
+        language = Language.objects.create(name='English')
+        cls.book = Book.objects.create(title='Book', summary='', isbn='1', language=language)
+
+    def setUp(self):
+        cache.clear()
+
+    def loan(self, days_overdue, status='o', borrower=None):
+        return BookInstance.objects.create(book=self.book, imprint='Imprint', status=status,
+                                           borrower=borrower or self.reader,
+                                           due_back=self.today - datetime.timedelta(days=days_overdue))
+
+    def test_overdue_queryset(self):
+        late = self.loan(5)
+        self.loan(0)
+        self.loan(-3)
+        self.loan(5, status='a')
+        overdue = BookInstance.objects.overdue(self.today).with_days_overdue(self.today)
+        self.assertEqual([(copy.id, copy.days_overdue) for copy in overdue], [(late.id, 5)])
+
+    def test_batched_update_covers_every_row(self):
+        copies = [self.loan(days) for days in range(1, 12)]
+        updated = loans.batched_update(BookInstance.objects.all(), batch_size=4, imprint='Swept')
+        self.assertEqual(updated, len(copies))
+        self.assertFalse(BookInstance.objects.exclude(imprint='Swept').exists())
+
+    def test_flag_overdue_and_clear_after_return(self):
+        late, on_time = self.loan(3), self.loan(-1)
+        self.assertEqual(loans.flag_overdue(self.today, batch_size=1), (1, 0))
+        late.refresh_from_db()
+        on_time.refresh_from_db()
+        self.assertEqual(late.overdue_since, late.due_back)
+        self.assertIsNone(on_time.overdue_since)
+
+        # Повторный проход ничего не меняет
+        self.assertEqual(loans.flag_overdue(self.today), (0, 0))
+
+        BookInstance.objects.filter(pk=late.pk).update(status='a')
+        self.assertEqual(loans.flag_overdue(self.today), (0, 1))
+
+    def test_compute_fines(self):
+        late, very_late, on_time = self.loan(4), self.loan(400), self.loan(-1)
+        self.assertEqual(loans.compute_fines(self.today, per_day=Decimal('0.50')), 2)
+        fines = {copy.pk: copy.fine for copy in BookInstance.objects.all()}
+        self.assertEqual(fines[late.pk], Decimal('2.00'))
+        self.assertEqual(fines[very_late.pk], loans.MAX_FINE)
+        self.assertEqual(fines[on_time.pk], 0)
+
+    def test_queue_reminders_once_per_due_date(self):
+        late = self.loan(2)
+        self.loan(-2)
+        BookInstance.objects.create(book=self.book, imprint='Imprint', status='o',
+                                    due_back=self.today - datetime.timedelta(days=2))
+        self.assertEqual(loans.queue_reminders(self.today), 1)
+        self.assertEqual(loans.queue_reminders(self.today), 0)
+        reminder = LoanReminder.objects.get()
+        self.assertEqual((reminder.instance_id, reminder.borrower, reminder.due_back), (late.id, self.reader, late.due_back))
+
+        # Продленная и снова просроченная выдача получает новое напоминание
+        BookInstance.objects.filter(pk=late.pk).update(due_back=self.today - datetime.timedelta(days=1))
+        self.assertEqual(loans.queue_reminders(self.today), 1)
+
+    def test_sweep_command(self):
+        self.loan(3)
+        out = io.StringIO()
+        call_command('sweep_overdue_loans', today=self.today, batch_size=10, stdout=out)
+        self.assertIn('1 loans flagged overdue', out.getvalue())
+        self.assertIn('1 fines updated', out.getvalue())
+        self.assertIn('1 reminders queued', out.getvalue())
+
+    def test_overdue_view(self):
+        late = BookInstance.objects.create(book=self.book, imprint='Imprint', status='o', borrower=self.reader,
+                                           due_back=datetime.date.today() - datetime.timedelta(days=2))
+        BookInstance.objects.create(book=self.book, imprint='Imprint', status='o', borrower=self.reader,
+                                    due_back=datetime.date.today() + datetime.timedelta(days=2))
+        resp = self.client.get(reverse('overdue-books'))
+        self.assertEqual(resp.status_code, 302)
+
+        self.client.login(username='librarian', password='12345')
+        resp = self.client.get(reverse('overdue-books'))
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual([copy.id for copy in resp.context['bookinstance_list']], [late.id])
+        self.assertContains(resp, '2 days overdue')
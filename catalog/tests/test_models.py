@@ -32,4 +32,120 @@ class AuthorModelTest(TestCase):
     def test_get_absolute_url(self):
         author=Author.objects.get(id=1)
         #This will also fail if the urlconf is not defined.
-        self.assertEqual(author.get_absolute_url(),'/catalog/author/1')
\ No newline at end of file
+        self.assertEqual(author.get_absolute_url(),'/catalog/author/1')
+
+from django.core.management import call_command
+from django.db import connection, IntegrityError, models, transaction
+from django.test import TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+import io
+import pandas as pd
+from catalog import visits
+from catalog.models import Book, BookInstance, Genre, Language, LibraryStats
+from catalog.search import create_search_index, drop_search_index
+from catalog.utils import create_books_from_df
+
+
+class LibraryStatsTest(TestCase):
+
+    def setUp(self):
+        visits.buffer.clear()
+        self.addCleanup(visits.buffer.clear)
+        self.language = Language.objects.create(name='English')
+        self.book = Book.objects.create(title='Book', summary='', isbn='1', language=self.language)
+        Author.objects.create(first_name='Big', last_name='Bob')
+
+    def assertStats(self, books, instances, available, authors):
+        stats = LibraryStats.load()
+        self.assertEqual((stats.num_books, stats.num_instances, stats.num_instances_available, stats.num_authors),
+                         (books, instances, available, authors))
+
+    def test_counts_follow_changes(self):
+        self.assertStats(1, 0, 0, 1)
+
+        copy = BookInstance.objects.create(book=self.book, imprint='Imprint', status='a')
+        BookInstance.objects.create(book=self.book, imprint='Imprint', status='m')
+        self.assertStats(1, 2, 1, 1)
+
+        copy = BookInstance.objects.get(pk=copy.pk)
+        copy.status = 'o'
+        copy.save()
+        self.assertStats(1, 2, 0, 1)
+
+        copy.status = 'a'
+        copy.save()
+        self.assertStats(1, 2, 1, 1)
+
+        copy.delete()
+        Book.objects.create(title='Book 2', summary='', isbn='2', language=self.language)
+        Author.objects.get(first_name='Big').delete()
+        self.assertStats(2, 1, 0, 0)
+
+    def test_bulk_import_is_counted(self):
+        LibraryStats.load()
+        create_books_from_df(pd.DataFrame({'genre': ['Travel'] * 3, 'title': ['A', 'B', 'C'], 'summary': [''] * 3,
+                                           'isbn': ['1', '2', '3'], 'cover_url': [None] * 3}))
+        self.assertStats(4, 0, 0, 1)
+
+    def test_reconcile_command_fixes_drift(self):
+        LibraryStats.load()
+        LibraryStats.objects.filter(pk=1).update(num_books=100, num_authors=7)
+        call_command('reconcile_library_stats', stdout=io.StringIO())
+        self.assertStats(1, 0, 0, 1)
+
+    def test_home_page_runs_no_count_queries(self):
+        LibraryStats.load()
+        with CaptureQueriesContext(connection) as queries:
+            resp = self.client.get(reverse('catalog_main_page'))
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.context['num_books'], 1)
+        self.assertFalse([query for query in queries if 'COUNT(' in query['sql']])
+
+
+class GenreModelTest(TestCase):
+
+    def test_name_is_unique(self):
+        Genre.objects.create(name='Poetry')
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Genre.objects.create(name='Poetry')
+
+
+class MergeDuplicateGenresTest(TransactionTestCase):
+    """
+    Duplicate genres only exist in databases created before the unique constraint,
+    so the test drops the constraint for its duration.
+    """
+
+    def setUp(self):
+        old_field = Genre._meta.get_field('name')
+        new_field = models.CharField(max_length=200)
+        new_field.set_attributes_from_name('name')
+        # Пересоздание таблицы жанров ломает триггеры полнотекстового индекса, они создаются заново после теста
+        drop_search_index()
+        with connection.schema_editor() as editor:
+            editor.alter_field(Genre, old_field, new_field)
+
+        def restore():
+            with connection.schema_editor() as editor:
+                editor.alter_field(Genre, new_field, old_field)
+            create_search_index()
+        self.addCleanup(restore)
+
+    def test_books_are_moved_to_the_oldest_genre(self):
+        language = Language.objects.create(name='English')
+        poetry, duplicate, travel = Genre.objects.bulk_create(
+            [Genre(name='Poetry'), Genre(name='Poetry'), Genre(name='Travel')])
+        both = Book.objects.create(title='Both', summary='', isbn='1', language=language)
+        both.genre.set([poetry, duplicate, travel])
+        other = Book.objects.create(title='Other', summary='', isbn='2', language=language)
+        other.genre.set([duplicate])
+
+        with CaptureQueriesContext(connection) as queries:
+            call_command('merge_duplicate_genres', stdout=io.StringIO())
+
+        self.assertEqual(sorted(Genre.objects.values_list('name', flat=True)), ['Poetry', 'Travel'])
+        self.assertEqual(set(both.genre.all()), {poetry, travel})
+        self.assertEqual(list(other.genre.all()), [poetry])
+        # Команда работает до migrate, поэтому не трогает таблицу книг (сигналы не вызываются)
+        self.assertFalse([query for query in queries if Book._meta.db_table + '"' in query['sql']])
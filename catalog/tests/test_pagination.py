@@ -0,0 +1,108 @@
+from django.test import TestCase
+from django.urls import reverse
+from django.core.cache import cache
+from django.contrib.auth.models import User
+import datetime
+
+from catalog.models import Author, Book, BookInstance, Language
+from catalog.pagination import paginate_by_cursor, encode_cursor
+
+
+class CursorPaginationTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        for author_num in range(23):
+            Author.objects.create(first_name='First %s' % author_num, last_name='Last %s' % author_num)
+        language = Language.objects.create(name='English')
+        book = Book.objects.create(title='Book', summary='', isbn='1', language=language)
+        today = datetime.date.today()
+        for copy_num in range(17):
+            due_back = None if copy_num % 6 == 0 else today + datetime.timedelta(days=copy_num % 4)
+            BookInstance.objects.create(book=book, imprint='Imprint', due_back=due_back, status='o')
+
+    def setUp(self):
+        cache.clear()
+
+    def walk(self, queryset, ordering, page_size):
+        pages, token = [], None
+        while True:
+            page = paginate_by_cursor(queryset, ordering, page_size, token)
+            pages.append(page)
+            if not page.has_next():
+                return pages
+            token = page.next_cursor
+
+    def test_forward_walk_visits_every_row_once(self):
+        pages = self.walk(Author.objects.all(), ('id',), 10)
+        self.assertEqual([len(page) for page in pages], [10, 10, 3])
+        ids = [author.id for page in pages for author in page]
+        self.assertEqual(ids, list(Author.objects.order_by('id').values_list('id', flat=True)))
+        self.assertFalse(pages[0].has_previous())
+        self.assertEqual(pages[0].approximate_count, 23)
+
+    def test_backward_walk(self):
+        pages = self.walk(Author.objects.all(), ('id',), 10)
+        previous = paginate_by_cursor(Author.objects.all(), ('id',), 10, pages[2].previous_cursor)
+        self.assertEqual(list(previous), list(pages[1]))
+        first = paginate_by_cursor(Author.objects.all(), ('id',), 10, previous.previous_cursor)
+        self.assertEqual(list(first), list(pages[0]))
+        self.assertFalse(first.has_previous())
+
+    def test_nullable_composite_ordering(self):
+        queryset = BookInstance.objects.all()
+        pages = self.walk(queryset, ('due_back', 'id'), 4)
+        copies = [copy for page in pages for copy in page]
+        self.assertEqual(len(copies), 17)
+        self.assertEqual(len({copy.id for copy in copies}), 17)
+        keys = [(copy.due_back is not None, copy.due_back or datetime.date.min, copy.id.hex) for copy in copies]
+        self.assertEqual(keys, sorted(keys))
+
+        previous = paginate_by_cursor(queryset, ('due_back', 'id'), 4, pages[3].previous_cursor)
+        self.assertEqual(list(previous), list(pages[2]))
+
+    def test_deep_page_has_constant_query_count(self):
+        pages = self.walk(Author.objects.all(), ('id',), 2)
+        # страница и закэшированное количество
+        with self.assertNumQueries(1):
+            paginate_by_cursor(Author.objects.all(), ('id',), 2, pages[-2].next_cursor)
+
+
+class CursorPaginatedViewTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        for author_num in range(13):
+            Author.objects.create(first_name='Christian %s' % author_num, last_name='Surname %s' % author_num)
+
+    def test_cursor_mode_is_opt_in(self):
+        resp = self.client.get(reverse('author-list'))
+        self.assertFalse(getattr(resp.context['page_obj'], 'is_cursor', False))
+
+        resp = self.client.get(reverse('author-list'), {'paginate': 'cursor'})
+        page = resp.context['page_obj']
+        self.assertTrue(page.is_cursor)
+        self.assertEqual(len(resp.context['author_list']), 10)
+        self.assertContains(resp, '?cursor=' + page.next_cursor)
+
+        resp = self.client.get(reverse('author-list'), {'cursor': page.next_cursor})
+        self.assertEqual(len(resp.context['author_list']), 3)
+        self.assertTrue(resp.context['page_obj'].has_previous())
+
+    def test_invalid_cursor(self):
+        resp = self.client.get(reverse('author-list'), {'cursor': 'not-a-cursor'})
+        self.assertEqual(resp.status_code, 404)
+        resp = self.client.get(reverse('author-list'), {'cursor': encode_cursor(['x', 'y'])})
+        self.assertEqual(resp.status_code, 404)
+
+    def test_borrowed_books_cursor(self):
+        user = User.objects.create_user(username='reader', password='12345')
+        language = Language.objects.create(name='English')
+        book = Book.objects.create(title='Book', summary='', isbn='1', language=language)
+        for copy_num in range(12):
+            BookInstance.objects.create(book=book, imprint='Imprint', status='o', borrower=user,
+                                        due_back=datetime.date.today() + datetime.timedelta(days=copy_num % 3))
+        self.client.login(username='reader', password='12345')
+        resp = self.client.get(reverse('my-borrowed'), {'paginate': 'cursor'})
+        resp = self.client.get(reverse('my-borrowed'), {'cursor': resp.context['page_obj'].next_cursor})
+        self.assertEqual(len(resp.context['bookinstance_list']), 2)
@@ -0,0 +1,76 @@
+from django.test import TestCase
+from django.urls import reverse
+from django.contrib.auth.models import User, Permission
+from django.core.cache import cache
+import datetime
+
+from catalog import views, visits
+from catalog.models import Author, Book, BookInstance, Genre, Language
+
+# Сессия, пользователь и его права (меню проверяет perms) для вошедшего пользователя
+AUTH_QUERIES = 4
+
+
+class QueryBudgetTest(TestCase):
+    """
+    Every view must stay within its query_budget whatever the page size.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='librarian', password='12345')
+        cls.user.user_permissions.add(Permission.objects.get(codename='can_mark_returned'))
+        cls.language = Language.objects.create(name='English')
+        cls.genres = [Genre.objects.create(name='Genre %s' % i) for i in range(3)]
+
+    def setUp(self):
+        visits.buffer.clear()
+        self.addCleanup(visits.buffer.clear)
+        # Бюджет считается для вернувшегося посетителя, у которого есть счетчик посещений
+        self.client.cookies[visits.VISITOR_COOKIE] = '0' * 32
+        cache.clear()
+
+    def create_books(self, number_of_books):
+        for book_num in range(number_of_books):
+            author = Author.objects.create(first_name='First %s' % book_num, last_name='Last')
+            book = Book.objects.create(title='Book %s' % book_num, summary='', isbn=str(book_num), author=author, language=self.language)
+            book.genre.set(self.genres)
+            for copy_num in range(2):
+                BookInstance.objects.create(book=book, imprint='Imprint', status='o', borrower=self.user,
+                                            due_back=datetime.date.today() + datetime.timedelta(days=copy_num - 1))
+        return book
+
+    def assertQueriesForSizes(self, url_for_book, num_queries):
+        for number_of_books in (1, 5):
+            book = self.create_books(number_of_books)
+            with self.assertNumQueries(num_queries):
+                resp = self.client.get(url_for_book(book))
+            self.assertEqual(resp.status_code, 200)
+
+    def test_book_list(self):
+        self.assertQueriesForSizes(lambda book: reverse('book-list'), views.BookListView.query_budget)
+
+    def test_book_detail(self):
+        self.assertQueriesForSizes(lambda book: book.get_absolute_url(), views.BookDetailView.query_budget)
+
+    def test_book_detail_logged_in(self):
+        self.client.login(username='librarian', password='12345')
+        self.assertQueriesForSizes(lambda book: book.get_absolute_url(), views.BookDetailView.query_budget + AUTH_QUERIES + 1)
+
+    def test_author_list(self):
+        self.assertQueriesForSizes(lambda book: reverse('author-list'), views.AuthorListView.query_budget)
+
+    def test_author_detail(self):
+        self.assertQueriesForSizes(lambda book: book.author.get_absolute_url(), views.AuthorDetailView.query_budget)
+
+    def test_my_borrowed(self):
+        self.client.login(username='librarian', password='12345')
+        self.assertQueriesForSizes(lambda book: reverse('my-borrowed'), views.LoanedBooksByUserListView.query_budget + AUTH_QUERIES)
+
+    def test_all_borrowed(self):
+        self.client.login(username='librarian', password='12345')
+        self.assertQueriesForSizes(lambda book: reverse('all-borrowed'), views.AllBorrowedBooksListView.query_budget + AUTH_QUERIES)
+
+    def test_overdue(self):
+        self.client.login(username='librarian', password='12345')
+        self.assertQueriesForSizes(lambda book: reverse('overdue-books'), views.OverdueBooksListView.query_budget + AUTH_QUERIES)
@@ -0,0 +1,66 @@
+from django.test import TestCase
+from django.core.cache import cache
+from django.core.management import call_command
+from django.contrib.auth.models import User
+import io
+import numpy as np
+
+from catalog import recommendations, visits
+from catalog.models import Book, BookSimilarity
+from users_and_accounts.models import Profile
+
+
+class CoOccurrenceTest(TestCase):
+
+    def test_counts_match_pairwise_loops(self):
+        rng = np.random.default_rng(1)
+        profiles = np.sort(rng.integers(0, 40, 600))
+        books = rng.integers(0, 30, 600)
+        expected = {}
+        for profile in set(profiles.tolist()):
+            liked = set(books[profiles == profile].tolist())
+            for a in liked:
+                for b in liked - {a}:
+                    expected[(a, b)] = expected.get((a, b), 0) + 1
+        # Дубли лайков в случайных данных считаются как у цикла только без повторов
+        profiles, books = np.unique(np.c_[profiles, books], axis=0).T
+        for chunk_size in (50, recommendations.PAIR_CHUNK_SIZE):
+            first, second, counts = recommendations.co_occurrence(profiles, books, 30, chunk_size)
+            self.assertEqual(dict(zip(zip(first.tolist(), second.tolist()), counts.tolist())), expected)
+
+
+class BookSimilarityTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.books = [Book.objects.create(title='Book %s' % i, summary='', isbn=str(i)) for i in range(5)]
+        # Книги 0 и 1 нравятся трем читателям, 0 и 2 - двум, 3 - одному
+        likes = [(0, 1, 2), (0, 1, 2), (0, 1), (3,), (4,)]
+        for reader_num, liked in enumerate(likes):
+            profile = Profile.objects.create(user=User.objects.create_user(username='reader%s' % reader_num))
+            profile.liked_books.add(*[cls.books[i] for i in liked])
+
+    def setUp(self):
+        cache.clear()
+        visits.buffer.clear()
+        self.addCleanup(visits.buffer.clear)
+
+    def test_build_and_lookup(self):
+        out = io.StringIO()
+        call_command('build_recommendations', stdout=out)
+        self.assertIn('rows written', out.getvalue())
+        self.assertEqual(recommendations.similar_books(self.books[0]), [self.books[1], self.books[2]])
+        self.assertEqual(recommendations.similar_books(self.books[3]), [])
+        similarity = BookSimilarity.objects.get(book=self.books[0], similar=self.books[1])
+        self.assertEqual(similarity.co_likes, 3)
+        self.assertAlmostEqual(similarity.score, 1.0)
+
+        # Повторная сборка заменяет таблицу
+        recommendations.build_similarities(per_book=1)
+        self.assertEqual(BookSimilarity.objects.filter(book=self.books[0]).count(), 1)
+
+    def test_detail_page_section(self):
+        recommendations.build_similarities()
+        resp = self.client.get(self.books[2].get_absolute_url())
+        self.assertEqual(resp.context['also_liked'], [self.books[0], self.books[1]])
+        self.assertContains(resp, 'Readers who liked this also liked')
@@ -0,0 +1,143 @@
+from django.test import TestCase
+from django.urls import reverse
+from django.core.management import call_command
+from django.core.cache import cache
+import io
+
+from catalog.models import Author, Book, Genre, Language, LibraryStats
+from catalog.search import (build_match_query, cached_search, create_search_index, drop_search_index, normalize_query,
+                            search_authors, search_books)
+
+
+class SearchIndexTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = Author.objects.create(first_name='Ursula', last_name='Le Guin')
+        cls.genre = Genre.objects.create(name='Fantasy')
+        language = Language.objects.create(name='English')
+        cls.wizard = Book.objects.create(title='A Wizard of Earthsea', summary='A young mage on an island.', isbn='1', author=cls.author, language=language)
+        cls.wizard.genre.set([cls.genre])
+        cls.dispossessed = Book.objects.create(title='The Dispossessed', summary='An anarchist wizard physicist.', isbn='2', author=cls.author, language=language)
+        cls.other = Book.objects.create(title='Cooking at Home', summary='Recipes.', isbn='3', language=language)
+
+    def test_title_match_ranks_first(self):
+        self.assertEqual(search_books('wizard'), [self.wizard.id, self.dispossessed.id])
+
+    def test_prefix_and_multiple_words(self):
+        self.assertEqual(search_books('earth'), [self.wizard.id])
+        self.assertEqual(search_books('young island'), [self.wizard.id])
+
+    def test_author_and_genre_names_are_indexed(self):
+        self.assertCountEqual(search_books('ursula'), [self.wizard.id, self.dispossessed.id])
+        self.assertEqual(search_books('fantasy'), [self.wizard.id])
+        self.assertEqual(search_authors('guin'), [self.author.id])
+
+    def test_index_follows_changes(self):
+        self.other.title = 'Cooking with Wizards'
+        self.other.save()
+        self.assertIn(self.other.id, search_books('wizards'))
+
+        self.genre.name = 'Magic'
+        self.genre.save()
+        self.assertEqual(search_books('magic'), [self.wizard.id])
+        self.assertEqual(search_books('fantasy'), [])
+
+        self.author.first_name = 'Ursa'
+        self.author.save()
+        self.assertEqual(search_books('ursula'), [])
+        self.assertEqual(search_authors('ursa'), [self.author.id])
+
+        self.wizard.delete()
+        self.assertEqual(search_books('earthsea'), [])
+
+    def test_operators_in_query_are_harmless(self):
+        self.assertEqual(build_match_query('wizard" OR (*'), '"wizard"* "OR"*')
+        self.assertEqual(search_books('"*'), [])
+
+    def test_rebuild_command(self):
+        call_command('rebuild_search_index', stdout=io.StringIO())
+        self.assertEqual(search_books('wizard'), [self.wizard.id, self.dispossessed.id])
+        self.assertEqual(search_authors('guin'), [self.author.id])
+
+    def test_new_index_includes_existing_books(self):
+        # Как на базе, где книги появились раньше индекса
+        drop_search_index()
+        create_search_index()
+        self.assertEqual(search_books('wizard'), [self.wizard.id, self.dispossessed.id])
+        self.assertEqual(search_authors('guin'), [self.author.id])
+
+        create_search_index()
+        self.assertEqual(search_books('earthsea'), [self.wizard.id])
+
+
+class SearchViewTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        language = Language.objects.create(name='English')
+        for book_num in range(13):
+            Book.objects.create(title='Dragon %s' % book_num, summary='Summary', isbn=str(book_num), language=language)
+
+    def test_post_redirects_to_get(self):
+        resp = self.client.post(reverse('searching'), {'searched': 'dragon'})
+        self.assertRedirects(resp, reverse('searching') + '?searched=dragon')
+
+    def test_results_are_paginated(self):
+        resp = self.client.get(reverse('searching'), {'searched': 'dragon'})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(len(resp.context['books_results']), 10)
+        self.assertTrue(resp.context['is_paginated'])
+
+        resp = self.client.get(reverse('searching'), {'searched': 'dragon', 'page': 2})
+        self.assertEqual(len(resp.context['books_results']), 3)
+
+    def test_empty_query(self):
+        resp = self.client.get(reverse('searching'))
+        self.assertEqual(resp.status_code, 200)
+        self.assertNotIn('books_results', resp.context)
+
+
+class CachedSearchTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.language = Language.objects.create(name='English')
+        cls.book = Book.objects.create(title='Solaris', summary='Ocean planet.', isbn='1', language=cls.language)
+
+    def setUp(self):
+        # Откат транзакции теста не отправляет сигналы, поэтому кэш очищается вручную
+        cache.clear()
+
+    def test_repeated_search_hits_cache(self):
+        self.assertEqual(cached_search('Solaris'), ([self.book.id], []))
+        # Только чтение версии поиска
+        with self.assertNumQueries(1):
+            self.assertEqual(cached_search('  SOLARIS! '), ([self.book.id], []))
+
+    def test_cache_is_invalidated_by_changes(self):
+        cached_search('solaris')
+        other = Book.objects.create(title='Solaris Revisited', summary='', isbn='2', language=self.language)
+        self.assertCountEqual(cached_search('solaris')[0], [self.book.id, other.id])
+
+        author = Author.objects.create(first_name='Stanislaw', last_name='Lem')
+        self.assertEqual(cached_search('lem')[1], [author.id])
+        author.delete()
+        self.assertEqual(cached_search('lem')[1], [])
+
+    def test_recreated_stats_row_invalidates_results(self):
+        cached_search('solaris')
+        # bulk_create не отправляет сигналы, версию меняет только новая строка статистики
+        other, = Book.objects.bulk_create([Book(title='Solaris Revisited', summary='', isbn='2', language=self.language)])
+        LibraryStats.objects.all().delete()
+        self.assertCountEqual(cached_search('solaris')[0], [self.book.id, other.id])
+
+    def test_version_is_shared_through_database(self):
+        cached_search('solaris')
+        # Другой процесс меняет каталог без сигналов в этом процессе и повышает версию
+        Book.objects.bulk_create([Book(title='Solaris Revisited', summary='', isbn='2', language=self.language)])
+        LibraryStats.adjust(search_version=1)
+        self.assertEqual(len(cached_search('solaris')[0]), 2)
+
+    def test_normalize_query(self):
+        self.assertEqual(normalize_query('  The  Left Hand, of DARKNESS '), 'the left hand of darkness')
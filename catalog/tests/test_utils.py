@@ -0,0 +1,90 @@
+from django.test import TestCase
+import io
+from unittest import mock
+import pandas as pd
+
+from catalog.models import Book, Genre, Language
+from catalog.utils import create_books_from_df, import_books_from_file
+
+
+def make_books_df(number_of_books, genres=('Travel', 'Poetry', 'Horror')):
+    return pd.DataFrame({
+        'genre': [genres[i % len(genres)] for i in range(number_of_books)],
+        'title': ['Title %s' % i for i in range(number_of_books)],
+        'summary': ['Summary %s' % i for i in range(number_of_books)],
+        'isbn': ['%013d' % i for i in range(number_of_books)],
+        'cover_url': ['https://example.com/%s.jpg' % i for i in range(number_of_books)],
+    })
+
+
+class CreateBooksFromDfTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        Language.objects.create(name='English')
+        Genre.objects.create(name='Travel')
+
+    def test_creates_books_with_genres(self):
+        created = create_books_from_df(make_books_df(7))
+
+        self.assertEqual(created, 7)
+        self.assertEqual(Book.objects.count(), 7)
+        self.assertEqual(Genre.objects.count(), 3)
+        book = Book.objects.get(title='Title 1')
+        self.assertEqual([genre.name for genre in book.genre.all()], ['Poetry'])
+        self.assertEqual(book.language.name, 'English')
+
+    def test_existing_genres_are_reused(self):
+        create_books_from_df(make_books_df(3))
+        create_books_from_df(make_books_df(3))
+
+        self.assertEqual(Genre.objects.filter(name='Travel').count(), 1)
+        self.assertEqual(Book.genre.through.objects.count(), 6)
+
+    def test_missing_genre_and_summary(self):
+        df = make_books_df(2)
+        df.loc[0, 'genre'] = None
+        df.loc[1, 'summary'] = None
+        create_books_from_df(df)
+
+        self.assertEqual(Book.objects.get(title='Title 0').genre.count(), 0)
+        self.assertEqual(Book.objects.get(title='Title 1').summary, '')
+
+    def test_query_count_does_not_depend_on_rows(self):
+        # language + genres (select, insert, re-select) + 2 inserts and a savepoint pair per batch + stats update
+        with self.assertNumQueries(9):
+            create_books_from_df(make_books_df(10), batch_size=100)
+        with self.assertNumQueries(9):
+            create_books_from_df(make_books_df(90, genres=('Drama', 'Comedy')), batch_size=100)
+
+
+class ImportBooksFromFileTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        Language.objects.create(name='English')
+
+    def test_csv_is_imported_in_chunks(self):
+        file = io.StringIO(make_books_df(25).to_csv(index=False))
+        summary = import_books_from_file(file, 'csv', chunksize=10)
+
+        self.assertEqual(summary['rows'], 25)
+        self.assertEqual(summary['created'], 25)
+        self.assertEqual(summary['chunks'], 3)
+        self.assertEqual(summary['errors'], [])
+        self.assertEqual(Book.objects.count(), 25)
+
+    def test_failing_chunk_is_reported(self):
+        file = io.StringIO(make_books_df(20).to_csv(index=False))
+        with mock.patch('catalog.utils.create_books_from_df', side_effect=[10, ValueError('broken row')]):
+            summary = import_books_from_file(file, 'csv', chunksize=10)
+
+        self.assertEqual(summary['rows'], 20)
+        self.assertEqual(len(summary['errors']), 1)
+        self.assertEqual(summary['created'], 10)
+        self.assertEqual(summary['errors'], ['Rows 11-20: broken row'])
+
+    def test_unsupported_format(self):
+        summary = import_books_from_file(io.StringIO(''), 'txt')
+        self.assertEqual(summary['rows'], 0)
+        self.assertEqual(len(summary['errors']), 1)
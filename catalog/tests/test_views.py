@@ -1,4 +1,5 @@
 from django.test import TestCase
+from django.core.cache import cache
 from catalog.models import Author
 from django.urls import reverse
 
@@ -258,4 +259,163 @@ class RenewBookInstancesViewTest(TestCase):
         invalid_date_in_future = datetime.date.today() + datetime.timedelta(weeks=5)
         resp = self.client.post(reverse('renew-book-librarian', kwargs={'pk':self.test_bookinstance1.pk,}), {'renewal_date':invalid_date_in_future} )
         self.assertEqual( resp.status_code,200)
-        self.assertFormError(resp, 'form', 'renewal_date', 'Invalid date - renewal more than 4 weeks ahead')
\ No newline at end of file
+        self.assertFormError(resp, 'form', 'renewal_date', 'Invalid date - renewal more than 4 weeks ahead')
+
+import io
+import json
+import os
+import shutil
+import tempfile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import override_settings
+from catalog.models import ImportJob
+from catalog.utils import run_import_job
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class BookFileUploadViewTest(TestCase):
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        Language.objects.create(name='English')
+        librarian = User.objects.create_user(username='librarian', password='2HJ1vRV0Z&3iD')
+        librarian.user_permissions.add(Permission.objects.get(codename='can_mark_returned'))
+        self.client.force_login(librarian)
+
+    def upload(self, content=b'genre,title,summary,isbn,cover_url\nTravel,Book 1,Summary,123,\nTravel,Book 2,Summary,456,\n'):
+        return self.client.post(reverse('upload_book'), {'file': SimpleUploadedFile('books.csv', content)})
+
+    def test_upload_queues_job(self):
+        resp = self.upload()
+        self.assertEqual(resp.status_code, 200)
+
+        job = resp.context['job']
+        self.assertEqual(job.status, 'q')
+        self.assertEqual(job.file_format, 'csv')
+        self.assertEqual(Book.objects.count(), 0)
+        self.assertContains(resp, job.get_absolute_url())
+
+    def test_worker_imports_job(self):
+        job = self.upload().context['job']
+        call_command('run_import_worker', once=True, stdout=io.StringIO())
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'd')
+        self.assertEqual(job.rows_processed, 2)
+        self.assertEqual(job.books_created, 2)
+        self.assertEqual(Book.objects.count(), 2)
+
+    def test_status_endpoint(self):
+        job = self.upload().context['job']
+        call_command('run_import_worker', once=True, stdout=io.StringIO())
+
+        resp = self.client.get(reverse('import-job-status', kwargs={'pk': job.pk}))
+        self.assertEqual(resp.status_code, 200)
+        data = json.loads(resp.content)
+        self.assertEqual(data['status'], 'Done')
+        self.assertEqual(data['rows_processed'], 2)
+        self.assertEqual(data['errors'], [])
+
+    def test_status_requires_permission(self):
+        job = self.upload().context['job']
+        self.client.logout()
+        resp = self.client.get(reverse('import-job-status', kwargs={'pk': job.pk}))
+        self.assertEqual(resp.status_code, 302)
+        self.assertTrue(resp.url.startswith(reverse('login')))
+
+        reader = User.objects.create_user(username='reader', password='1X<ISRUkw+tuK')
+        self.client.force_login(reader)
+        resp = self.client.get(reverse('import-job-status', kwargs={'pk': job.pk}))
+        self.assertTrue(resp.url.startswith(reverse('login')))
+
+    def test_file_is_deleted_when_job_finishes(self):
+        job = self.upload().context['job']
+        path = job.file.path
+        self.assertTrue(os.path.exists(path))
+        call_command('run_import_worker', once=True, stdout=io.StringIO())
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'd')
+        self.assertFalse(job.file)
+        self.assertFalse(os.path.exists(path))
+
+    def test_job_is_claimed_once(self):
+        job = self.upload().context['job']
+        self.assertEqual(ImportJob.claim_next('worker-1'), job)
+        self.assertIsNone(ImportJob.claim_next('worker-2'))
+
+    def test_stale_job_is_reclaimed_and_resumed(self):
+        job = self.upload(b'genre,title,summary,isbn,cover_url\n' + b''.join(
+            b'Travel,Book %d,Summary,%d,\n' % (i, i) for i in range(1, 6))).context['job']
+        ImportJob.claim_next('worker-1')
+        # Задачу живого воркера другой воркер не берет
+        call_command('run_import_worker', once=True, stdout=io.StringIO())
+        self.assertEqual(Book.objects.count(), 0)
+
+        # worker-1 успел импортировать первые две строки и упал
+        Book.objects.create(title='Book 1', summary='Summary', isbn='1')
+        Book.objects.create(title='Book 2', summary='Summary', isbn='2')
+        stale = timezone.now() - datetime.timedelta(seconds=ImportJob.STALE_AFTER + 1)
+        ImportJob.objects.filter(id=job.id).update(rows_processed=2, books_created=2, heartbeat=stale)
+
+        self.assertEqual(ImportJob.claim_next('worker-2').worker, 'worker-2')
+        job.refresh_from_db()
+        run_import_job(job, chunksize=2)
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.rows_processed, job.books_created), ('d', 5, 5))
+        self.assertEqual(sorted(Book.objects.values_list('title', flat=True)), ['Book %d' % i for i in range(1, 6)])
+
+    def test_unsupported_format(self):
+        resp = self.client.post(reverse('upload_book'), {'file': SimpleUploadedFile('books.txt', b'text')})
+        self.assertContains(resp, 'Unsupported file format')
+        self.assertEqual(ImportJob.objects.count(), 0)
+
+
+class BookListAvailabilityTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        language = Language.objects.create(name='English')
+        cls.books = [Book.objects.create(title='Book %s' % i, summary='', isbn=str(i), language=language) for i in range(12)]
+        # Первые три книги: 2 доступные копии и 1 выданная, остальные без доступных копий
+        for book in cls.books[:3]:
+            for status in ('a', 'a', 'o'):
+                BookInstance.objects.create(book=book, imprint='Imprint', status=status)
+        BookInstance.objects.create(book=cls.books[3], imprint='Imprint', status='m')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_availability_annotations(self):
+        resp = self.client.get(reverse('book-list'))
+        counts = {book.id: (book.available_count, book.total_count) for book in resp.context['book_list']}
+        self.assertEqual(counts[self.books[0].id], (2, 3))
+        self.assertEqual(counts[self.books[3].id], (0, 1))
+        self.assertEqual(counts[self.books[4].id], (0, 0))
+        self.assertContains(resp, '2 of 3 available')
+
+    def test_pages_are_ordered(self):
+        books = list(self.client.get(reverse('book-list')).context['book_list'])
+        books += list(self.client.get(reverse('book-list') + '?page=2').context['book_list'])
+        self.assertEqual([book.id for book in books], [book.id for book in self.books])
+
+    def test_available_filter(self):
+        resp = self.client.get(reverse('book-list') + '?available=1')
+        self.assertEqual(resp.status_code, 200)
+        self.assertFalse(resp.context['is_paginated'])
+        self.assertEqual(sorted(book.id for book in resp.context['book_list']), [book.id for book in self.books[:3]])
+
+    def test_pagination_keeps_filter(self):
+        resp = self.client.get(reverse('book-list'))
+        self.assertNotContains(resp, 'available=1&amp;page')
+        self.assertContains(resp, '?page=2"')
+        BookInstance.objects.bulk_create([BookInstance(book=book, imprint='Imprint', status='a') for book in self.books])
+        resp = self.client.get(reverse('book-list') + '?available=1')
+        self.assertContains(resp, '?page=2&amp;available=1"')
@@ -0,0 +1,86 @@
+from django.test import TestCase
+from django.urls import reverse
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+import json
+
+from catalog import visits
+from catalog.models import Book, Language, VisitCount
+
+
+class VisitBufferTest(TestCase):
+
+    def test_increments_are_flushed_in_one_batch(self):
+        buffer = visits.VisitBuffer(flush_interval=3600, flush_size=3)
+        with self.assertNumQueries(0):
+            buffer.add('a')
+            buffer.add('a')
+            buffer.add('b')
+        self.assertEqual(buffer.pending('a'), 2)
+
+        with CaptureQueriesContext(connection) as queries:
+            buffer.add('c')
+        self.assertEqual(len([query for query in queries if 'INSERT' in query['sql']]), 1)
+        self.assertEqual(dict(VisitCount.objects.values_list('key', 'count')), {'a': 2, 'b': 1, 'c': 1})
+        self.assertEqual(buffer.pending('a'), 0)
+
+    def test_flush_adds_to_existing_counters(self):
+        VisitCount.objects.create(key='a', count=10)
+        buffer = visits.VisitBuffer(flush_interval=3600)
+        buffer.add('a', 5)
+        buffer.flush()
+        self.assertEqual(VisitCount.objects.get(key='a').count, 15)
+
+    def test_flush_on_interval(self):
+        buffer = visits.VisitBuffer(flush_interval=0)
+        buffer.add('a')
+        self.assertEqual(VisitCount.objects.get(key='a').count, 1)
+
+
+class VisitCountingViewsTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        language = Language.objects.create(name='English')
+        cls.book = Book.objects.create(title='Book', summary='', isbn='1', language=language)
+
+    def setUp(self):
+        # Буфер общий для процесса: счетчики тестов не должны попасть в базу после ее удаления
+        visits.buffer.clear()
+        self.addCleanup(visits.buffer.clear)
+
+    def test_page_views_do_not_write(self):
+        self.client.get(reverse('catalog_main_page'))
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('catalog_main_page'))
+            self.client.get(self.book.get_absolute_url())
+        self.assertFalse([query for query in queries if not query['sql'].startswith('SELECT')])
+
+    def test_visits_are_counted_per_visitor(self):
+        # Первый запрос только выдает cookie, посещения считаются со второго
+        self.assertEqual(self.client.get(reverse('catalog_main_page')).context['num_visits'], 0)
+        self.assertEqual(self.client.get(reverse('catalog_main_page')).context['num_visits'], 0)
+        self.assertEqual(self.client.get(reverse('catalog_main_page')).context['num_visits'], 1)
+        visits.buffer.flush()
+        self.assertEqual(self.client.get(reverse('catalog_main_page')).context['num_visits'], 2)
+
+        self.client.cookies.clear()
+        self.assertEqual(self.client.get(reverse('catalog_main_page')).context['num_visits'], 0)
+
+    def test_clients_without_cookie_add_no_counters(self):
+        for _ in range(5):
+            for url in (reverse('catalog_main_page'), self.book.get_absolute_url()):
+                self.client.cookies.clear()
+                self.assertIn(visits.VISITOR_COOKIE, self.client.get(url).cookies)
+        visits.buffer.flush()
+        self.assertEqual(dict(VisitCount.objects.values_list('key', 'count')), {'book:%s' % self.book.id: 5})
+
+    def test_book_popularity(self):
+        for _ in range(3):
+            resp = self.client.get(self.book.get_absolute_url())
+        self.assertEqual(resp.context['visit_num'], 1)
+        visits.buffer.flush()
+
+        resp = self.client.get(reverse('popular-books'))
+        self.assertEqual(json.loads(resp.content)['results'],
+                         [{'id': self.book.id, 'title': 'Book', 'visits': 3, 'url': self.book.get_absolute_url()}])
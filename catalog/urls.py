@@ -1,15 +1,18 @@
 from django.urls import path, re_path
-from . import views
+from . import api, views
 
 urlpatterns = [
     path('', views.catalog_main_page, name='catalog_main_page'),
     re_path(r'^books/$', views.BookListView.as_view(), name='book-list'),
     re_path(r'^book/(?P<pk>\d+)$', views.BookDetailView.as_view(), name='book-detail'),
+    re_path(r'^books/popular/$', views.popular_books_view, name='popular-books'),
+    re_path(r'^books/most-liked/$', views.most_liked_books_view, name='most-liked-books'),
     re_path(r'^authors/$', views.AuthorListView.as_view(), name='author-list'),
     re_path(r'^author/(?P<pk>\d+)$', views.AuthorDetailView.as_view(), name='author-detail'),
 
     re_path(r'^mybooks/$', views.LoanedBooksByUserListView.as_view(), name='my-borrowed'),
     re_path(r'^allborrowed/$', views.AllBorrowedBooksListView.as_view(), name='all-borrowed'),
+    re_path(r'^overdue/$', views.OverdueBooksListView.as_view(), name='overdue-books'),
 
     re_path(r'^book/(?P<pk>[-\w]+)/renew/$', views.renew_book_librarian, name='renew-book-librarian'),
 
@@ -22,10 +25,19 @@ urlpatterns = [
     re_path(r'^book/(?P<pk>\d+)/delete/$', views.BookDelete.as_view(), name='book_delete'),
 
     re_path(r'^book/upload/$', views.book_file_upload_view, name='upload_book'),
+    re_path(r'^book/upload/(?P<pk>\d+)/status/$', views.import_job_status, name='import-job-status'),
+    re_path(r'^books/export/$', views.export_books_view, name='export-books'),
 
     re_path("^search/$", views.searching, name="searching"),
+    re_path(r'^autocomplete/$', views.autocomplete_view, name='autocomplete'),
 
     path('like_book/', views.like_book, name='like_book'),
 
+    path('api/books/', api.BookApiView.as_view(), name='api-books'),
+    path('api/authors/', api.AuthorApiView.as_view(), name='api-authors'),
+    path('api/genres/', api.GenreApiView.as_view(), name='api-genres'),
+    path('api/languages/', api.LanguageApiView.as_view(), name='api-languages'),
+    path('api/copies/', api.CopyApiView.as_view(), name='api-copies'),
+
 
 ]
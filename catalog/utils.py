@@ -1,24 +1,189 @@
+import itertools
+import json
+import time
+
 import pandas as pd
-from .models import Language, Genre, Book
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Language, Genre, Book, ImportJob, LibraryStats
+from .autocomplete import invalidate_snapshot
+
+# Количество книг, вставляемых одним bulk_create (и одной транзакцией)
+IMPORT_BATCH_SIZE = 500
+# Количество строк файла, которые читаются в память за один раз
+IMPORT_CHUNK_SIZE = 5000
+# Разделитель жанров книги в колонке genre (так их пишет catalog.export)
+GENRE_SEPARATOR = '|'
+
+
+def _clean(value, default=''):
+    """
+    Pandas represents empty cells as NaN, the models expect a string (or None).
+    """
+    if value is None or pd.isna(value):
+        return default
+    return str(value).strip()
+
+
+def split_genres(value):
+    """
+    'Travel|Poetry' -> ['Travel', 'Poetry'], without blanks and repeats.
+    """
+    return list(dict.fromkeys(name.strip() for name in value.split(GENRE_SEPARATOR) if name.strip()))
+
+
+def resolve_genres(names):
+    """
+    Returns a {name: Genre} mapping for the given genre names.
+    Genres that do not exist yet are created with a single bulk insert;
+    Genre.name is unique, so a genre created meanwhile by another import is skipped.
+    """
+    names = set(names)
+    genres = {genre.name: genre for genre in Genre.objects.filter(name__in=names)}
+    missing = [name for name in names if name not in genres]
+    if missing:
+        Genre.objects.bulk_create([Genre(name=name) for name in missing], ignore_conflicts=True)
+        genres.update({genre.name: genre for genre in Genre.objects.filter(name__in=missing)})
+    return genres
+
 
-def create_books_from_df(df: pd.DataFrame):
+def create_books_from_df(df: pd.DataFrame, batch_size=IMPORT_BATCH_SIZE):
+    """
+    Imports the books of a DataFrame with the all_books.csv columns
+    (genre, title, summary, isbn, cover_url), several genres of a book
+    are separated by GENRE_SEPARATOR.
 
+    The language and all genres are resolved up front, then the books and
+    their Book.genre through-table rows are inserted with bulk_create,
+    one transaction per batch. The number of queries depends on the number
+    of batches, not on the number of rows. Returns the number of created books.
+    """
     language = Language.objects.get(name__icontains='EN')
-    all_genres = Genre.objects.all()
 
-    for _, row in df.iterrows():
-        title = row['title']
-        summary = row['summary']
-        isbn = row['isbn']
-        cover = row['cover_url']
-        genre = row['genre']
+    rows = [
+        (_clean(row.genre), _clean(row.title), _clean(row.summary), _clean(row.isbn), _clean(row.cover_url, None))
+        for row in df[['genre', 'title', 'summary', 'isbn', 'cover_url']].itertuples(index=False)
+    ]
+    rows = [(split_genres(genre), *rest) for genre, *rest in rows]
+    genres = resolve_genres(name for names, *_ in rows for name in names)
+    BookGenre = Book.genre.through
+
+    created = 0
+    for start in range(0, len(rows), batch_size):
+        batch = rows[start:start + batch_size]
+        books = [
+            Book(title=title, summary=summary, isbn=isbn, language=language, online_cover=cover)
+            for _, title, summary, isbn, cover in batch
+        ]
+        with transaction.atomic():
+            # На SQLite 3.35+ и PostgreSQL bulk_create заполняет pk созданных объектов
+            Book.objects.bulk_create(books)
+            BookGenre.objects.bulk_create([
+                BookGenre(book_id=book.pk, genre_id=genres[name].pk)
+                for book, (names, *_) in zip(books, batch) for name in names
+            ])
+        created += len(books)
+
+    # bulk_create не отправляет сигналы, поэтому статистика, кэш поиска и подсказки обновляются явно.
+    # Версия кэша поиска (catalog.search) повышается тем же UPDATE, что и счетчик книг
+    if created:
+        LibraryStats.adjust(num_books=created, search_version=1)
+        invalidate_snapshot()
+    return created
+
+
+def read_books_file(file, file_format, chunksize=IMPORT_CHUNK_SIZE):
+    """
+    Yields the rows of an uploaded csv/ndjson/xls/xlsx file as DataFrames of at most chunksize rows.
+    """
+    if file_format == 'csv':
+        # Все колонки как строки, иначе у ISBN пропадают ведущие нули
+        yield from pd.read_csv(file, chunksize=chunksize, dtype=str)
+    elif file_format == 'ndjson':
+        # Файл читается построчно, в памяти не больше chunksize строк
+        rows = (json.loads(line) for line in file if line.strip())
+        while chunk := list(itertools.islice(rows, chunksize)):
+            yield pd.DataFrame(chunk)
+    elif file_format in ['xls', 'xlsx']:
+        # pandas can't read Excel files incrementally, so only the import is chunked
+        df = pd.read_excel(file)
+        for start in range(0, len(df), chunksize):
+            yield df.iloc[start:start + chunksize]
+    else:
+        raise ValueError('Unsupported file format')
+
+
+def import_books_from_file(file, file_format, chunksize=IMPORT_CHUNK_SIZE, on_chunk=None, skip_rows=0):
+    """
+    Streams a books file into the catalog chunk by chunk, so memory stays
+    bounded by the chunk size rather than by the file size.
+    A failing chunk is reported and skipped, a parse error stops the import.
+    on_chunk, if given, is called with the running summary after every chunk.
+    The first skip_rows rows are read but not imported (they were imported by an interrupted run).
+    Returns a summary dict with row counts, errors and timing.
+    """
+    summary = {'rows': 0, 'created': 0, 'chunks': 0, 'errors': [], 'seconds': 0}
+    started = time.monotonic()
+
+    chunks = read_books_file(file, file_format, chunksize)
+    while True:
+        try:
+            chunk = next(chunks)
+        except StopIteration:
+            break
+        except Exception as e:
+            summary['errors'].append(f'Error reading {file_format} file after row {summary["rows"]}: {e}')
+            break
+
+        first_row = summary['rows'] + 1
+        summary['chunks'] += 1
+        summary['rows'] += len(chunk)
+        if summary['rows'] <= skip_rows:
+            continue
+        if first_row <= skip_rows:
+            chunk = chunk.iloc[skip_rows - first_row + 1:]
+        try:
+            summary['created'] += create_books_from_df(chunk)
+        except Exception as e:
+            summary['errors'].append(f'Rows {first_row}-{summary["rows"]}: {e}')
+        if on_chunk:
+            on_chunk(summary)
+
+    summary['seconds'] = round(time.monotonic() - started, 3)
+    return summary
+
 
-        book = Book.objects.create(title=title, summary = summary, isbn=isbn, language=language, online_cover=cover)
-        # Create genre as a post-step
-        if not genre in [genre_model.name for genre_model in all_genres]:
-            Genre.objects.create(name=genre)
+def run_import_job(job, chunksize=IMPORT_CHUNK_SIZE):
+    """
+    Imports the file of a claimed ImportJob, storing the progress on the job after every chunk.
+    The uploaded file is deleted once the job is done or failed.
+    A job taken over from a crashed worker continues after the rows it had already processed,
+    only the chunk that was being imported at the crash can be imported twice.
+    """
+    done_rows, done_books, done_errors = job.rows_processed, job.books_created, list(job.errors)
 
-        book_genres = Genre.objects.filter(name__exact = genre)
-        book.genre.set(book_genres) # Присвоение типов many-to-many напрямую недопустимо
+    def save_progress(summary):
+        ImportJob.objects.filter(id=job.id).update(
+            rows_processed=summary['rows'], books_created=done_books + summary['created'],
+            errors=done_errors + summary['errors'], heartbeat=timezone.now())
 
-        book.save()
+    try:
+        with job.file.open('rb') as file:
+            summary = import_books_from_file(file, job.file_format, chunksize, on_chunk=save_progress, skip_rows=done_rows)
+    except Exception as e:
+        job.refresh_from_db(fields=['rows_processed', 'books_created', 'errors'])
+        job.status = 'f'
+        job.errors = job.errors + [f'Import failed: {e}']
+    else:
+        job.status = 'd'
+        job.rows_processed = summary['rows']
+        job.books_created = done_books + summary['created']
+        job.errors = done_errors + summary['errors']
+    job.finished = timezone.now()
+    # Загруженный файл больше не нужен, у задачи остаются итоги импорта.
+    # Файл удаляется только после сохранения статуса, чтобы незавершенную задачу можно было продолжить
+    file_name, job.file = job.file.name, ''
+    job.save(update_fields=['status', 'rows_processed', 'books_created', 'errors', 'finished', 'file'])
+    job.file.storage.delete(file_name)
+    return job
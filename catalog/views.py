@@ -1,5 +1,5 @@
 import datetime
-import pandas as pd
+from urllib.parse import urlencode
 
 from django.shortcuts import get_object_or_404
 from django.contrib.auth.mixins import LoginRequiredMixin, PermissionRequiredMixin
@@ -10,49 +10,87 @@ from django.urls import reverse_lazy, reverse
 from django.shortcuts import render
 from django.views import generic
 from django.views.generic.edit import CreateView, UpdateView, DeleteView
-from django.http import HttpResponseRedirect, HttpResponse, JsonResponse
+from django.http import Http404, HttpResponseRedirect, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.core.paginator import Paginator
+from django.db.models import Prefetch
 from django.contrib.sessions.backends.db import SessionStore
 
+from .api import MAX_ID
 from .forms import RenewBookForm, UploadBooksFileForm
-from .models import Book, Author, BookInstance, Genre, Language
-from .utils import create_books_from_df
+from .pagination import CursorPaginationMixin
+from .models import Book, Author, BookInstance, Genre, Language, ImportJob, LibraryStats
+from . import autocomplete, export, likes, recommendations, visits
+from .search import cached_search
+from users_and_accounts.models import Profile
+from locallibrary.ratelimit import ratelimit
+
+# Количество книг на странице результатов поиска
+SEARCH_PAGE_SIZE = 10
 
 def catalog_main_page(request):
     """
     Функция отображения для домашней страницы сайта.
     """
-    # Генерация "количеств" некоторых главных объектов
-    num_books = Book.objects.all().count()
-    num_instances = BookInstance.objects.all().count()
-    # Доступные книги (статус = 'a')
-    num_instances_available = BookInstance.objects.filter(status__exact='a').count()
-    num_authors = Author.objects.count()  # Метод 'all()' применён по умолчанию.
-
-    # Number of visits to this view, as counted in the session variable.
-    num_visits = request.session.get('num_visits', 0)
-    request.session['num_visits'] = num_visits + 1
+    # "Количества" главных объектов хранятся в LibraryStats и обновляются сигналами
+    stats = LibraryStats.load()
+
+    # Посещения считаются в памяти процесса и пишутся в базу пачками (catalog.visits)
+    # Клиент без cookie посещает страницу впервые, отдельный счетчик для него не заводится
+    visitor = visits.get_visitor(request)
+    num_visits = 0
+    if visitor is not None:
+        visit_key = 'visitor:%s:home' % visitor
+        num_visits = visits.get_count(visit_key)
+        visits.record_visit(visit_key)
     
     # Отрисовка HTML-шаблона index.html с данными внутри
     # переменной контекста context
-    return render(
+    response = render(
         request,
         'catalog/catalog_main_page.html',
         context={
-            'num_books': num_books,
-            'num_instances': num_instances,
-            'num_instances_available': num_instances_available,
-            'num_authors': num_authors,
+            'num_books': stats.num_books,
+            'num_instances': stats.num_instances,
+            'num_instances_available': stats.num_instances_available,
+            'num_authors': stats.num_authors,
             'num_visits':num_visits
             }
     )
+    return visits.set_visitor_cookie(request, response)
     
 
-class BookListView(generic.ListView):
+class BookListView(CursorPaginationMixin, generic.ListView):
     model = Book
     paginate_by = 10
+    # Запросы на страницу: COUNT для пагинации и сами книги вместе с авторами и количеством копий
+    query_budget = 2
+
+    def available_only(self):
+        return self.request.GET.get('available') == '1'
+
+    def get_queryset(self):
+        # Порядок как у курсорной пагинации (cursor_ordering), иначе страницы по номеру нестабильны
+        books = Book.objects.select_related('author').with_availability().order_by('id')
+        if self.available_only():
+            books = books.available()
+        return books
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['available_only'] = self.available_only()
+        # Фильтр сохраняется в ссылках пагинации
+        context['pagination_query'] = '&available=1' if self.available_only() else ''
+        return context
 
 class BookDetailView(generic.DetailView):
     model = Book
+    # Книга с автором и языком, жанры, копии, счетчик посещений (у посетителя с cookie), похожие книги
+    # (+1 для лайка у вошедших пользователей).
+    # Жанры и копии запрашиваются только если их фрагменты нет в кэше
+    query_budget = 5
+
+    def get_queryset(self):
+        return Book.objects.select_related('author', 'language').with_availability()
 
     def get_context_data(self, **kwargs):
         # Взять базовый контекст из родительского класса 
@@ -60,36 +98,48 @@ class BookDetailView(generic.DetailView):
         book = self.object
         book_id = book.id
         
-        # Получаем сессию из request
-        session = self.request.session
-        visit_key = f'num_visits_{book_id}'
-        
-        # Получаем количество посещений или 0 если первый визит
-        visit_num = session.get(visit_key, 0)
-        session[visit_key] = visit_num + 1
-        session.save()
-
-        # Add user_profile to context
+        # Посещения книги считаются без записи в сессию (catalog.visits)
+        visitor = visits.get_visitor(self.request)
+        visit_num = 0
+        visits.record_visit(f'book:{book_id}')
+        if visitor is not None:
+            visit_key = f'visitor:{visitor}:book:{book_id}'
+            visit_num = visits.get_count(visit_key)
+            visits.record_visit(visit_key)
+
+        # Лайкнул ли книгу текущий пользователь - один запрос к промежуточной таблице
         if self.request.user.is_authenticated:
-            context['user_profile'] = self.request.user.profile
-        else:
-            context['user_profile'] = None
+            context['is_liked'] = Profile.liked_books.through.objects.filter(
+                profile__user=self.request.user, book=book).exists()
+
+        # "Читатели, которым понравилась эта книга, также любят" - из заранее посчитанной таблицы
+        context['also_liked'] = recommendations.similar_books(book)
 
         # Добавить новый элемент к контексту
         context['visit_num'] = visit_num
         return context
 
+    def render_to_response(self, context, **response_kwargs):
+        response = super().render_to_response(context, **response_kwargs)
+        return visits.set_visitor_cookie(self.request, response)
 
-class AuthorListView(generic.ListView):
+
+class AuthorListView(CursorPaginationMixin, generic.ListView):
     model = Author
     paginate_by = 10
+    ordering = ['id']
+    query_budget = 2
 
 class AuthorDetailView(generic.DetailView):
     model = Author
-    model = Author
+    # Автор и его книги
+    query_budget = 2
+
+    def get_queryset(self):
+        return Author.objects.prefetch_related(Prefetch('book_set', queryset=Book.objects.with_availability()))
 
     
-class LoanedBooksByUserListView(LoginRequiredMixin, generic.ListView):
+class LoanedBooksByUserListView(LoginRequiredMixin, CursorPaginationMixin, generic.ListView):
     """
         Generic class-based view listing books on loan to current user.
     """
@@ -98,11 +148,15 @@ class LoanedBooksByUserListView(LoginRequiredMixin, generic.ListView):
     model = BookInstance
     template_name ='catalog/bookinstance_list_borrowed_user.html'
     paginate_by = 10
+    cursor_ordering = ('due_back', 'id')
+    # COUNT для пагинации и копии вместе с книгами и читателями (не считая сессии и пользователя)
+    query_budget = 2
 
     def get_queryset(self):
-        return BookInstance.objects.filter(borrower=self.request.user).filter(status__exact='o').order_by('due_back')
+        return (BookInstance.objects.filter(borrower=self.request.user).filter(status__exact='o')
+                .select_related('book', 'borrower').order_by('due_back'))
 
-class AllBorrowedBooksListView(PermissionRequiredMixin, generic.ListView):
+class AllBorrowedBooksListView(PermissionRequiredMixin, CursorPaginationMixin, generic.ListView):
     """
         Generic class-based view listing books on loan for all users.
     """
@@ -114,9 +168,33 @@ class AllBorrowedBooksListView(PermissionRequiredMixin, generic.ListView):
     model = BookInstance
     template_name ='catalog/bookinstance_list_borrowed_all.html'
     paginate_by = 10
+    cursor_ordering = ('due_back', 'id')
+    # COUNT для пагинации и копии вместе с книгами и читателями (не считая сессии и пользователя)
+    query_budget = 2
 
     def get_queryset(self):
-        return BookInstance.objects.filter(status__exact='o').order_by('due_back')        
+        return BookInstance.objects.filter(status__exact='o').select_related('book', 'borrower').order_by('due_back')
+
+class OverdueBooksListView(PermissionRequiredMixin, CursorPaginationMixin, generic.ListView):
+    """
+        Generic class-based view listing overdue loans for librarians, most overdue first.
+    """
+    login_url = reverse_lazy('login')
+
+    permission_required = 'catalog.can_mark_returned'
+    permission_denied_message = "You don't have permission to view this page."
+
+    model = BookInstance
+    template_name ='catalog/bookinstance_list_overdue.html'
+    paginate_by = 10
+    cursor_ordering = ('due_back', 'id')
+    # COUNT для пагинации и копии вместе с книгами и читателями (не считая сессии и пользователя)
+    query_budget = 2
+
+    def get_queryset(self):
+        # Фильтр и сортировка выполняются по индексу (status, due_back), дни просрочки считает база
+        return (BookInstance.objects.overdue().with_days_overdue()
+                .select_related('book', 'borrower').order_by('due_back', 'id'))
 
 @permission_required('catalog.can_mark_returned', login_url='login')  
 def renew_book_librarian(request, pk):
@@ -186,6 +264,7 @@ class BookDelete(DeleteView):
     success_url = reverse_lazy('book-list')
 
 
+@permission_required('catalog.can_mark_returned', login_url='login')
 def book_file_upload_view(request):
     if request.method == 'POST':
         if 'file' not in request.FILES:
@@ -194,51 +273,135 @@ def book_file_upload_view(request):
         file = request.FILES['file']
         file_format = file.name.split('.')[-1].lower()
         
-        if file_format == 'csv':
-            try:
-                df = pd.read_csv(file)
-            except Exception as e:
-                return HttpResponse(f'Error reading CSV file: {e}')
-        elif file_format in ['xls', 'xlsx']:
-            try:
-                df = pd.read_excel(file)
-            except Exception as e:
-                return HttpResponse(f'Error reading Excel file: {e}')
-        else:
+        if file_format not in ['csv', 'ndjson', 'xls', 'xlsx']:
             return HttpResponse('Unsupported file format')
 
-        create_books_from_df(df)
-        
-        return HttpResponse(df.to_html())
+        # Файл сохраняется на диск, импорт выполняет воркер (manage.py run_import_worker)
+        job = ImportJob.objects.create(
+            file=file, file_format=file_format,
+            created_by=request.user if request.user.is_authenticated else None)
+
+        form = UploadBooksFileForm()
+        return render(request, 'catalog/book_file_upload.html', context={'form': form, 'job': job})
     else:
         form = UploadBooksFileForm()
         return render(request, 'catalog/book_file_upload.html', context={'form': form})
 
+@permission_required('catalog.can_mark_returned', login_url='login')
+def import_job_status(request, pk):
+    """
+    Progress of an import job as JSON.
+    """
+    job = get_object_or_404(ImportJob, pk=pk)
+    return JsonResponse({
+        'id': job.id,
+        'status': job.get_status_display(),
+        'rows_processed': job.rows_processed,
+        'books_created': job.books_created,
+        'rows_per_second': job.rows_per_second,
+        'errors': job.errors,
+        'created': job.created,
+        'started': job.started,
+        'finished': job.finished,
+    })
+
+@ratelimit('5/m')
+def export_books_view(request):
+    """
+    Streams the whole catalog in the all_books.csv layout, ?format=csv (default) or ?format=ndjson.
+    The file can be uploaded again with book_file_upload_view.
+    """
+    file_format = request.GET.get('format', 'csv')
+    if file_format not in export.CONTENT_TYPES:
+        return HttpResponse('Unsupported file format', status=400)
+    response = StreamingHttpResponse(export.export_chunks(file_format), content_type=export.CONTENT_TYPES[file_format])
+    response['Content-Disposition'] = 'attachment; filename="all_books.%s"' % file_format
+    return response
+
+@ratelimit('60/m')
 def searching(request):
-    print(request)
+    """
+    Full-text search over books and authors, BM25-ranked and paginated.
+    Results live on cacheable GET urls, a POST is redirected there.
+    """
     if request.method == "POST":
-        searched = request.POST.get('searched').title()
-        print("User search query: ", searched)
-        books_results = Book.objects.filter(title__icontains=searched)
-        authors_results = Author.objects.filter(last_name__icontains=searched)
-        print(books_results, authors_results)
-        return render(request, "catalog/search_page.html", {'searched':searched, 
-                                                            'books_results':books_results,
-                                                            'authors_results':authors_results})
-    else:
+        url = reverse('searching') + '?' + urlencode({'searched': request.POST.get('searched', '')})
+        return HttpResponseRedirect(url)
+
+    searched = request.GET.get('searched', '').strip()
+    if not searched:
         return render(request, "catalog/search_page.html")
-    
-def like_book(request):
-    if request.method == "POST":
-        book_id = request.POST.get('book_id')
-        book = Book.objects.get(pk=book_id)
-        user_profile = request.user.profile  # предполагается, что у пользователя есть профиль
 
-        if user_profile.liked_books.filter(id=book_id).exists():
-            user_profile.liked_books.remove(book)
-            status = 'unliked'
+    book_ids, author_ids = cached_search(searched)
+    page_obj = Paginator(book_ids, SEARCH_PAGE_SIZE).get_page(request.GET.get('page'))
+    books = (Book.objects.filter(id__in=page_obj.object_list).select_related('author').prefetch_related('genre')
+             .with_availability().in_bulk())
+    books_results = [books[book_id] for book_id in page_obj.object_list if book_id in books]
+
+    # Авторы показываются только на первой странице
+    authors_results = []
+    if page_obj.number == 1 and author_ids:
+        authors = Author.objects.in_bulk(author_ids[:SEARCH_PAGE_SIZE])
+        authors_results = [authors[author_id] for author_id in author_ids[:SEARCH_PAGE_SIZE] if author_id in authors]
+
+    return render(request, "catalog/search_page.html", {'searched': searched,
+                                                        'books_results': books_results,
+                                                        'authors_results': authors_results,
+                                                        'page_obj': page_obj,
+                                                        'is_paginated': page_obj.has_other_pages()})
+    
+def popular_books_view(request):
+    """
+    Most visited books with their visit totals as JSON.
+    """
+    popular = visits.popular_books()
+    titles = dict(Book.objects.filter(id__in=[book_id for book_id, _ in popular]).values_list('id', 'title'))
+    return JsonResponse({'results': [
+        {'id': book_id, 'title': titles[book_id], 'visits': count, 'url': reverse('book-detail', args=[book_id])}
+        for book_id, count in popular if book_id in titles
+    ]})
+
+def autocomplete_view(request):
+    """
+    Title and author suggestions for the search box, answered from the in-memory snapshot.
+    """
+    results = []
+    for kind, object_id, label, author in autocomplete.get_snapshot().lookup(request.GET.get('q', '')):
+        if kind == autocomplete.BOOK:
+            results.append({'type': 'book', 'id': object_id, 'title': label, 'author': author,
+                            'url': reverse('book-detail', args=[object_id])})
         else:
-            user_profile.liked_books.add(book)
-            status = 'liked'
+            results.append({'type': 'author', 'id': object_id, 'name': label,
+                            'url': reverse('author-detail', args=[object_id])})
+    return JsonResponse({'results': results})
 
-        return JsonResponse({'status': status})
+@ratelimit('30/m', methods=('POST',))
+def like_book(request):
+    """
+    Toggles the like of the current user on a book, returns the new state and like count.
+    """
+    if request.method != "POST":
+        return JsonResponse({'error': 'POST required'}, status=405)
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'Login required'}, status=403)
+    try:
+        book_id = int(request.POST.get('book_id', ''))
+    except ValueError:
+        book_id = None
+    # id вне диапазона BigAutoField база не принимает (OverflowError в SQLite)
+    if book_id is None or abs(book_id) > MAX_ID:
+        return JsonResponse({'error': 'Invalid book_id'}, status=400)
+    try:
+        liked, like_count = likes.toggle_like(request.user, book_id)
+    except Book.DoesNotExist:
+        raise Http404('No such book')
+    return JsonResponse({'status': 'liked' if liked else 'unliked', 'like_count': like_count})
+
+def most_liked_books_view(request):
+    """
+    Most liked books as JSON, read from the like_count index.
+    """
+    return JsonResponse({'results': [
+        {'id': book_id, 'title': title, 'likes': like_count, 'url': reverse('book-detail', args=[book_id])}
+        for book_id, title, like_count in likes.leaderboard()
+    ]})
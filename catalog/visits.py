@@ -0,0 +1,141 @@
+"""
+Page visit counters that don't write to the database on every request.
+
+Increments are collected in process memory by a VisitBuffer and written
+to the VisitCount table in one batch when FLUSH_SIZE distinct counters are
+pending or FLUSH_INTERVAL seconds have passed (and at process exit).
+A flush is a single executemany of INSERT ... ON CONFLICT DO UPDATE, so
+counters from several worker processes add up correctly.
+
+Counter keys:
+    book:<id>                       - all visits of a book page (popularity)
+    visitor:<visitor>:home          - visits of the home page by one visitor
+                                      (a user or a client that sent the visitor cookie back)
+    visitor:<visitor>:book:<id>     - visits of a book page by one visitor
+"""
+import atexit
+import re
+import threading
+import time
+import uuid
+from collections import Counter
+
+from django.db import DatabaseError, connection, transaction
+
+from .models import VisitCount
+
+# Сколько секунд копятся счетчики перед записью в базу
+FLUSH_INTERVAL = 30
+# Сколько разных счетчиков может накопиться перед записью в базу
+FLUSH_SIZE = 500
+
+VISITOR_COOKIE = 'visitor'
+VISITOR_COOKIE_AGE = 365 * 24 * 60 * 60
+VISITOR_RE = re.compile(r'[0-9a-f]{32}')
+
+
+class VisitBuffer:
+    """
+    Thread-safe in-memory accumulator of counter increments.
+    """
+    def __init__(self, flush_interval=FLUSH_INTERVAL, flush_size=FLUSH_SIZE):
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self._counts = Counter()
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+
+    def add(self, key, amount=1):
+        with self._lock:
+            self._counts[key] += amount
+            due = (len(self._counts) >= self.flush_size
+                   or time.monotonic() - self._last_flush >= self.flush_interval)
+        if due:
+            try:
+                self.flush()
+            except DatabaseError:
+                # Счетчики остались в буфере и будут записаны при следующей попытке
+                pass
+
+    def pending(self, key):
+        with self._lock:
+            return self._counts[key] if key in self._counts else 0
+
+    def clear(self):
+        """
+        Drops all pending increments without writing them.
+        """
+        with self._lock:
+            self._counts = Counter()
+            self._last_flush = time.monotonic()
+
+    def flush(self):
+        """
+        Writes all pending increments in one batch. On a database error they are kept for the next flush.
+        """
+        with self._lock:
+            counts, self._counts = self._counts, Counter()
+            self._last_flush = time.monotonic()
+        if not counts:
+            return
+        table = connection.ops.quote_name(VisitCount._meta.db_table)
+        sql = ('INSERT INTO {table} ("key", "count") VALUES (%s, %s) '
+               'ON CONFLICT ("key") DO UPDATE SET "count" = {table}."count" + excluded."count"').format(table=table)
+        try:
+            with transaction.atomic():
+                with connection.cursor() as cursor:
+                    cursor.executemany(sql, list(counts.items()))
+        except Exception:
+            with self._lock:
+                self._counts.update(counts)
+            raise
+
+
+buffer = VisitBuffer()
+atexit.register(buffer.flush)
+
+
+def get_visitor(request):
+    """
+    Returns an id of the visitor: the user for logged in visitors, otherwise a long-lived cookie.
+    A client without the cookie gets None and a new cookie value, remembered on the request for
+    set_visitor_cookie(), so that clients which never send cookies back (bots) don't create
+    a counter row per request. Their visits are counted from the second request with the cookie.
+    """
+    if request.user.is_authenticated:
+        return 'user%s' % request.user.pk
+    visitor = request.COOKIES.get(VISITOR_COOKIE, '')
+    if VISITOR_RE.fullmatch(visitor):
+        return visitor
+    request.new_visitor = uuid.uuid4().hex
+    return None
+
+
+def set_visitor_cookie(request, response):
+    if getattr(request, 'new_visitor', None):
+        response.set_cookie(VISITOR_COOKIE, request.new_visitor, max_age=VISITOR_COOKIE_AGE, httponly=True, samesite='Lax')
+    return response
+
+
+def get_count(key):
+    """
+    Flushed total plus increments still pending in this process.
+    """
+    flushed = VisitCount.objects.filter(key=key).values_list('count', flat=True).first() or 0
+    return flushed + buffer.pending(key)
+
+
+def record_visit(*keys):
+    """
+    Counts a visit for every key. Doesn't touch the database unless a flush is due.
+    """
+    for key in keys:
+        buffer.add(key)
+
+
+def popular_books(limit=10):
+    """
+    Returns [(book_id, visits)] of the most visited books, as flushed to the database.
+    """
+    rows = VisitCount.objects.filter(key__startswith='book:').order_by('-count').values_list('key', 'count')[:limit]
+    return [(int(key.split(':')[1]), count) for key, count in rows]
@@ -0,0 +1,451 @@
+"""
+Load and benchmark suite of the library, run by 'manage.py run_benchmarks'.
+
+seed() fills an empty database with a dataset scaled from all_books.csv:
+the template rows are repeated until there are as many books as asked,
+every repetition with a numbered title and its own ISBN, plus authors,
+copies, readers and likes in fixed proportions. The random generator has
+a fixed seed, so two runs of the same scale see the same data.
+
+scenarios() has one request for every URL pattern of catalog.urls and
+users_and_accounts.urls, and missing_scenarios() names the patterns that
+have none, so a new view can't be left out silently. run_scenario() sends
+the request repeatedly with the test client and records its latency
+percentiles, queries per request and the peak memory allocated by one
+request. benchmark_import() measures the upload page and the import worker
+on a generated file.
+
+Results are plain JSON. compare() checks them against a baseline of the
+same scale: more queries per request is always a regression, peak memory
+is one when it grows by more than the tolerance. Timings depend on the
+machine, so median latency and import throughput are compared only when
+the baseline was recorded on the same host (meta.host) or when asked to
+with compare_latency=True. The p90 and p99 latencies are recorded but not
+compared, a few dozen requests make them too noisy to fail on.
+"""
+import csv
+import datetime
+import io
+import platform
+import random
+import statistics
+import time
+import tracemalloc
+from collections import namedtuple
+
+import django
+import pandas as pd
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Permission, User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, URLResolver, get_resolver, reverse
+
+from catalog import autocomplete, recommendations, search, visits
+from catalog.models import Author, Book, BookInstance, Genre, ImportJob, Language, LibraryStats
+from catalog.utils import run_import_job, split_genres
+from users_and_accounts.models import Profile
+
+SCALES = {'10k': 10_000, '100k': 100_000, '1m': 1_000_000}
+TEMPLATE_FILE = settings.BASE_DIR / 'all_books.csv'
+URLCONFS = ('catalog.urls', 'users_and_accounts.urls')
+
+# Пропорции набора данных
+BOOKS_PER_AUTHOR = 10
+COPIES_PER_BOOK = 2
+BOOKS_PER_READER = 100
+LIKES_PER_READER = 20
+SEED_BATCH_SIZE = 5000
+
+READER = 'reader'
+LIBRARIAN = 'librarian'
+PASSWORD = 'benchmark'
+
+# Запросов на сценарий, если у сценария не указано свое число
+DEFAULT_REQUESTS = 30
+DEFAULT_IMPORT_ROWS = 5000
+# Допустимый рост задержки и памяти относительно базовой линии (0.5 = +50%)
+DEFAULT_TOLERANCE = 0.5
+# Меньшие изменения считаются шумом
+MIN_LATENCY_DELTA_MS = 2.0
+MIN_MEMORY_DELTA_KIB = 256
+
+Scenario = namedtuple('Scenario', 'name method path data user requests', defaults=(None, None, None))
+
+
+class BenchmarkError(Exception):
+    pass
+
+
+def read_template():
+    """
+    The all_books.csv rows as (genre, title, summary, cover_url) tuples.
+    """
+    df = pd.read_csv(TEMPLATE_FILE, dtype=str).fillna('')
+    return list(df[['genre', 'title', 'summary', 'cover_url']].itertuples(index=False, name=None))
+
+
+def _recount_likes(book_ids):
+    likes = (Profile.liked_books.through.objects.filter(book_id=OuterRef('pk')).order_by()
+             .values('book_id').annotate(n=Count('*')).values('n'))
+    for start in range(0, len(book_ids), SEED_BATCH_SIZE):
+        Book.objects.filter(pk__in=book_ids[start:start + SEED_BATCH_SIZE]).update(like_count=Coalesce(Subquery(likes), 0))
+
+
+def seed(num_books, stdout=None):
+    """
+    Fills an empty database with num_books books built from the all_books.csv template.
+    Memory use depends on the batch size, not on num_books.
+    """
+    rng = random.Random(0)
+    template = read_template()
+    today = datetime.date.today()
+
+    # Триггеры полнотекстового индекса замедляют вставку, индекс строится один раз в конце
+    if search.is_supported():
+        search.drop_search_index()
+
+    # Импорт ищет язык по name__icontains='EN', второго совпадающего языка быть не должно
+    english, _ = Language.objects.get_or_create(name='English')
+    # Жанры создаются по алфавиту, чтобы их id не зависели от порядка обхода множества
+    names = sorted({name for genre, *_ in template for name in split_genres(genre)})
+    Genre.objects.bulk_create([Genre(name=name) for name in names], ignore_conflicts=True)
+    genres = Genre.objects.in_bulk(names, field_name='name')
+    template_genres = [[genres[name].pk for name in split_genres(genre)] for genre, *_ in template]
+
+    authors = Author.objects.bulk_create(
+        [Author(first_name='First%s' % i, last_name='Last%s' % i) for i in range(max(num_books // BOOKS_PER_AUTHOR, 1))],
+        batch_size=SEED_BATCH_SIZE)
+    author_ids = [author.pk for author in authors]
+
+    # Один хеш на всех: make_password намеренно медленный
+    password = make_password(PASSWORD)
+    readers = User.objects.bulk_create(
+        [User(username='%s%s' % (READER, i), password=password) for i in range(max(num_books // BOOKS_PER_READER, 10))],
+        batch_size=SEED_BATCH_SIZE)
+    librarian = User.objects.create(username=LIBRARIAN, password=password, is_staff=True)
+    librarian.user_permissions.add(Permission.objects.get(codename='can_mark_returned'))
+    profiles = Profile.objects.bulk_create([Profile(user=user) for user in readers + [librarian]], batch_size=SEED_BATCH_SIZE)
+    reader_ids = [reader.pk for reader in readers]
+
+    BookGenre = Book.genre.through
+    first_book_id = None
+    for start in range(0, num_books, SEED_BATCH_SIZE):
+        numbers = range(start, min(start + SEED_BATCH_SIZE, num_books))
+        books = Book.objects.bulk_create([
+            Book(title=template[i % len(template)][1] + (' #%s' % (i // len(template)) if i >= len(template) else ''),
+                 summary=template[i % len(template)][2], isbn='%013d' % i, online_cover=template[i % len(template)][3] or None,
+                 author_id=author_ids[i % len(author_ids)], language=english)
+            for i in numbers])
+        first_book_id = first_book_id or books[0].pk
+        BookGenre.objects.bulk_create([
+            BookGenre(book_id=book.pk, genre_id=genre_id)
+            for i, book in zip(numbers, books) for genre_id in template_genres[i % len(template)]])
+
+        copies = []
+        for book in books:
+            for _ in range(COPIES_PER_BOOK):
+                status = rng.choice('aaaoorm')
+                on_loan = status == 'o'
+                copies.append(BookInstance(
+                    book_id=book.pk, imprint='Benchmark imprint', status=status,
+                    due_back=today + datetime.timedelta(days=rng.randint(-30, 30)) if on_loan else None,
+                    borrower_id=rng.choice(reader_ids) if on_loan else None))
+        BookInstance.objects.bulk_create(copies)
+
+    # Лайки читателей, с перекосом в сторону первых книг, чтобы были общие лайки для рекомендаций
+    LikedBook = Profile.liked_books.through
+    liked = set()
+    for profile in profiles:
+        picks = {first_book_id + min(int(rng.paretovariate(1.2)) - 1, num_books - 1) for _ in range(LIKES_PER_READER)}
+        liked.update((profile.pk, book_id) for book_id in picks)
+    LikedBook.objects.bulk_create([LikedBook(profile_id=profile_id, book_id=book_id) for profile_id, book_id in liked],
+                                  batch_size=SEED_BATCH_SIZE)
+    _recount_likes(sorted({book_id for _, book_id in liked}))
+
+    LibraryStats.reconcile()
+    if search.is_supported():
+        search.rebuild_search_index()
+    recommendations.build_similarities()
+    ImportJob.objects.create(file='imports/benchmark.csv', file_format='csv', status='d')
+    cache.clear()
+    autocomplete.invalidate_snapshot()
+    if stdout:
+        stdout.write('Seeded %s books, %s authors, %s copies, %s readers, %s likes' % (
+            num_books, len(author_ids), num_books * COPIES_PER_BOOK, len(readers), len(liked)))
+
+
+def url_names(urlconf):
+    """
+    Names of all URL patterns of a urlconf module, including the ones it includes.
+    """
+    names = set()
+
+    def walk(patterns):
+        for pattern in patterns:
+            if isinstance(pattern, URLResolver):
+                walk(pattern.url_patterns)
+            elif isinstance(pattern, URLPattern) and pattern.name:
+                names.add(pattern.name)
+    walk(get_resolver(urlconf).url_patterns)
+    return names
+
+
+def scenarios(num_books):
+    """
+    One request per URL pattern, on objects in the middle of the seeded catalog.
+    """
+    book = Book.objects.order_by('id')[num_books // 2]
+    author_id = book.author_id
+    copy_id = BookInstance.objects.filter(status__exact='o').order_by('id').values_list('id', flat=True).first()
+    genre_id = book.genre.order_by('name').values_list('id', flat=True).first()
+    job_id = ImportJob.objects.order_by('id').values_list('id', flat=True).first()
+    word = book.title.split()[0]
+    return [
+        Scenario('catalog_main_page', 'get', reverse('catalog_main_page')),
+        Scenario('book-list', 'get', reverse('book-list') + '?page=%s' % max(num_books // 20, 1)),
+        Scenario('book-detail', 'get', reverse('book-detail', args=[book.pk])),
+        Scenario('popular-books', 'get', reverse('popular-books')),
+        Scenario('most-liked-books', 'get', reverse('most-liked-books')),
+        Scenario('author-list', 'get', reverse('author-list') + '?paginate=cursor'),
+        Scenario('author-detail', 'get', reverse('author-detail', args=[author_id])),
+        Scenario('my-borrowed', 'get', reverse('my-borrowed'), user=READER + '0'),
+        Scenario('all-borrowed', 'get', reverse('all-borrowed') + '?paginate=cursor', user=LIBRARIAN),
+        Scenario('overdue-books', 'get', reverse('overdue-books') + '?paginate=cursor', user=LIBRARIAN),
+        Scenario('renew-book-librarian', 'get', reverse('renew-book-librarian', args=[copy_id]), user=LIBRARIAN),
+        Scenario('author_create', 'get', reverse('author_create')),
+        Scenario('author_update', 'get', reverse('author_update', args=[author_id])),
+        Scenario('author_delete', 'get', reverse('author_delete', args=[author_id])),
+        Scenario('book_create', 'get', reverse('book_create'), user=LIBRARIAN),
+        Scenario('book_update', 'get', reverse('book_update', args=[book.pk])),
+        Scenario('book_delete', 'get', reverse('book_delete', args=[book.pk])),
+        Scenario('upload_book', 'get', reverse('upload_book'), user=LIBRARIAN),
+        Scenario('import-job-status', 'get', reverse('import-job-status', args=[job_id]), user=LIBRARIAN),
+        # Экспорт всего каталога, поэтому запросов меньше
+        Scenario('export-books', 'get', reverse('export-books'), requests=3),
+        Scenario('searching', 'get', reverse('searching') + '?searched=%s' % word),
+        Scenario('autocomplete', 'get', reverse('autocomplete') + '?q=%s' % word[:3]),
+        Scenario('like_book', 'post', reverse('like_book'), data={'book_id': book.pk}, user=READER + '1'),
+        Scenario('api-books', 'get', reverse('api-books') + '?page_size=100&genre=%s' % genre_id),
+        Scenario('api-authors', 'get', reverse('api-authors') + '?page_size=100'),
+        Scenario('api-genres', 'get', reverse('api-genres') + '?page_size=100'),
+        Scenario('api-languages', 'get', reverse('api-languages')),
+        Scenario('api-copies', 'get', reverse('api-copies') + '?book=%s' % book.pk),
+
+        Scenario('login', 'get', reverse('login')),
+        Scenario('logout', 'post', reverse('logout'), user=READER + '2'),
+        Scenario('register', 'get', reverse('register')),
+        Scenario('validate_username', 'get', reverse('validate_username') + '?username=%s2' % READER),
+        Scenario('contact_form', 'get', reverse('contact_form')),
+        Scenario('profile_edit', 'get', reverse('profile_edit'), user=READER + '3'),
+        Scenario('password_change', 'get', reverse('password_change'), user=READER + '4'),
+        Scenario('password_change_done', 'get', reverse('password_change_done'), user=READER + '4'),
+        Scenario('password_reset', 'get', reverse('password_reset')),
+        Scenario('password_reset_done', 'get', reverse('password_reset_done')),
+        Scenario('password_reset_confirm', 'get', reverse('password_reset_confirm', kwargs={'uidb64': 'MQ', 'token': 'invalid-token'})),
+        Scenario('password_reset_complete', 'get', reverse('password_reset_complete')),
+    ]
+
+
+def missing_scenarios(names):
+    """
+    URL pattern names of URLCONFS without a scenario.
+    """
+    return sorted(set().union(*(url_names(urlconf) for urlconf in URLCONFS)) - set(names))
+
+
+def percentile(sorted_values, fraction):
+    """
+    Nearest-rank percentile of an already sorted list.
+    """
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values) + 0.5) - 1))
+    return sorted_values[index]
+
+
+def _send(client, scenario):
+    response = getattr(client, scenario.method)(scenario.path, scenario.data or {})
+    if response.streaming:
+        # Ответ читается кусками, как клиентом, и не собирается в памяти
+        for _ in response.streaming_content:
+            pass
+    if response.status_code >= 400:
+        raise BenchmarkError('%s %s returned %s' % (scenario.method.upper(), scenario.path, response.status_code))
+    return response
+
+
+def run_scenario(scenario, requests=DEFAULT_REQUESTS):
+    """
+    Sends the request of a scenario requests times after one warm-up request.
+    Returns latency percentiles in ms, the median queries per request and the peak KiB allocated by one request.
+    """
+    client = Client()
+    if scenario.user:
+        client.force_login(User.objects.get(username=scenario.user))
+    status = _send(client, scenario).status_code
+
+    timings, queries = [], []
+    for _ in range(scenario.requests or requests):
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            _send(client, scenario)
+            timings.append((time.perf_counter() - started) * 1000)
+        queries.append(len(captured))
+
+    tracemalloc.start()
+    try:
+        _send(client, scenario)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    timings.sort()
+    return {
+        'status': status,
+        'requests': len(timings),
+        'p50_ms': round(percentile(timings, 0.5), 3),
+        'p90_ms': round(percentile(timings, 0.9), 3),
+        'p99_ms': round(percentile(timings, 0.99), 3),
+        'max_ms': round(timings[-1], 3),
+        # Верхняя медиана: у чередующихся запросов (лайк/снятие лайка) берется больший из двух счетчиков
+        'queries': statistics.median_high(queries),
+        'peak_kib': round(peak / 1024, 1),
+    }
+
+
+def books_file(rows, first_number):
+    """
+    A CSV file in the all_books.csv layout with rows books from the template.
+    """
+    template = read_template()
+    output = io.StringIO()
+    writer = csv.writer(output, lineterminator='\n')
+    writer.writerow(('genre', 'title', 'summary', 'isbn', 'cover_url'))
+    for i in range(rows):
+        genre, title, summary, cover = template[i % len(template)]
+        writer.writerow((genre, '%s (import %s)' % (title, i), summary, '%013d' % (first_number + i), cover))
+    return output.getvalue().encode()
+
+
+def _import(content, staff):
+    """
+    Uploads the file through book_file_upload_view and runs the import worker on it.
+    """
+    client = Client()
+    client.force_login(staff)
+    client.post(reverse('upload_book'), {'file': SimpleUploadedFile('benchmark.csv', content)})
+    job = ImportJob.claim_next('benchmark')
+    run_import_job(job)
+    if job.errors or job.books_created != job.rows_processed:
+        raise BenchmarkError('Import failed: %s' % job.errors)
+    return job
+
+
+def benchmark_import(rows=DEFAULT_IMPORT_ROWS):
+    """
+    Times an upload and import of rows books, then repeats it under tracemalloc for the peak memory.
+    """
+    staff = User.objects.get(username=LIBRARIAN)
+    first_number = Book.objects.count()
+    content = books_file(rows, first_number)
+    with CaptureQueriesContext(connection) as captured:
+        started = time.perf_counter()
+        _import(content, staff)
+        seconds = time.perf_counter() - started
+
+    tracemalloc.start()
+    try:
+        _import(books_file(rows, first_number + rows), staff)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {
+        'rows': rows,
+        'seconds': round(seconds, 3),
+        'rows_per_second': round(rows / seconds, 1),
+        'queries': len(captured),
+        'peak_kib': round(peak / 1024, 1),
+    }
+
+
+# Сценарии повторяют запросы быстрее, чем разрешают лимиты представлений
+@override_settings(RATELIMIT_ENABLED=False)
+def run(num_books, requests=DEFAULT_REQUESTS, import_rows=DEFAULT_IMPORT_ROWS, only=None, stdout=None):
+    """
+    Runs every scenario (or the ones named in only) and the import benchmark on an already seeded database.
+    """
+    all_scenarios = scenarios(num_books)
+    missing = missing_scenarios(scenario.name for scenario in all_scenarios)
+    if missing:
+        raise BenchmarkError('No benchmark scenario for: %s' % ', '.join(missing))
+
+    visits.buffer.flush()
+    results = {
+        'meta': {
+            'books': num_books,
+            'requests': requests,
+            'database': connection.vendor,
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'host': platform.node(),
+            'created': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        },
+        'urls': {},
+    }
+    for scenario in all_scenarios:
+        if only and scenario.name not in only:
+            continue
+        results['urls'][scenario.name] = result = run_scenario(scenario, requests)
+        if stdout:
+            stdout.write('%-26s p50 %8.2f ms  p90 %8.2f ms  p99 %8.2f ms  %3s queries  %9.1f KiB' % (
+                scenario.name, result['p50_ms'], result['p90_ms'], result['p99_ms'], result['queries'], result['peak_kib']))
+    if import_rows and not only:
+        results['import'] = benchmark_import(import_rows)
+        if stdout:
+            stdout.write('%-26s %8.1f rows/s  %3s queries  %9.1f KiB' % (
+                'import', results['import']['rows_per_second'], results['import']['queries'], results['import']['peak_kib']))
+    return results
+
+
+def _grew(new, old, tolerance, min_delta):
+    return new > old * (1 + tolerance) and new - old > min_delta
+
+
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE, compare_latency=None):
+    """
+    Returns the regressions of results against baseline as a list of messages.
+    compare_latency=None compares timings only if both were recorded on the same host.
+    """
+    if results['meta']['books'] != baseline['meta']['books']:
+        raise BenchmarkError('The baseline was recorded with %s books, these results with %s' % (
+            baseline['meta']['books'], results['meta']['books']))
+    if compare_latency is None:
+        host = baseline['meta'].get('host')
+        compare_latency = host is not None and host == results['meta'].get('host')
+    regressions = []
+    for name, old in baseline['urls'].items():
+        new = results['urls'].get(name)
+        if new is None:
+            continue
+        if new['queries'] > old['queries']:
+            regressions.append('%s: %s queries per request, baseline %s' % (name, new['queries'], old['queries']))
+        # p90 и p99 из нескольких десятков запросов слишком шумные, сравнивается медиана
+        if compare_latency and _grew(new['p50_ms'], old['p50_ms'], tolerance, MIN_LATENCY_DELTA_MS):
+            regressions.append('%s: p50 %.2f ms, baseline %.2f ms' % (name, new['p50_ms'], old['p50_ms']))
+        if _grew(new['peak_kib'], old['peak_kib'], tolerance, MIN_MEMORY_DELTA_KIB):
+            regressions.append('%s: peak %.1f KiB, baseline %.1f KiB' % (name, new['peak_kib'], old['peak_kib']))
+
+    new, old = results.get('import'), baseline.get('import')
+    if new and old and new['rows'] == old['rows']:
+        if new['queries'] > old['queries']:
+            regressions.append('import: %s queries, baseline %s' % (new['queries'], old['queries']))
+        if compare_latency and new['rows_per_second'] * (1 + tolerance) < old['rows_per_second']:
+            regressions.append('import: %.1f rows/s, baseline %.1f rows/s' % (new['rows_per_second'], old['rows_per_second']))
+        if _grew(new['peak_kib'], old['peak_kib'], tolerance, MIN_MEMORY_DELTA_KIB):
+            regressions.append('import: peak %.1f KiB, baseline %.1f KiB' % (new['peak_kib'], old['peak_kib']))
+    return regressions
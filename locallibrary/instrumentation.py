@@ -0,0 +1,135 @@
+"""
+Per-request SQL instrumentation.
+
+QueryInstrumentationMiddleware installs a connection.execute_wrapper on
+every database connection for the duration of a request. The wrapper
+counts the queries and their time per SQL text. Django passes parameters
+separately, so the same text repeated means the same query run again,
+usually an N+1 loop, and those repeats are reported as duplicates.
+
+With settings.SERVER_TIMING_HEADER (on by default only with DEBUG, as it
+discloses database timings) every response gets a Server-Timing header
+(db, app and total durations, shown by the browser dev tools). Requests
+slower than settings.SLOW_REQUEST_THRESHOLD_MS are written to the
+'locallibrary.slow_requests' logger as one JSON object per line, with
+their slowest queries normalized (IN lists collapsed, literals replaced
+by ?).
+
+The wrapper only does a perf_counter() pair and a dict update per query,
+nothing is normalized or serialized unless the request is slow, so it is
+meant to stay on in production. Queries run while a streaming response
+is being sent happen after the middleware has returned and aren't
+counted.
+"""
+import json
+import logging
+import re
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger('locallibrary.slow_requests')
+
+# Сколько самых медленных запросов попадает в запись журнала
+SLOW_LOG_QUERIES = 10
+
+_IN_LIST = re.compile(r'\((?:\s*%s\s*,)+\s*%s\s*\)')
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'(?<![\w"])-?\d+(?:\.\d+)?\b')
+_SPACES = re.compile(r'\s+')
+
+
+def normalize_sql(sql):
+    """
+    Query text with IN lists collapsed and literals replaced, so the same query with other values looks the same.
+    """
+    sql = _IN_LIST.sub('(%s, ...)', sql)
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    return _SPACES.sub(' ', sql).strip()
+
+
+class QueryStats:
+    """
+    Queries of one request: {sql: [count, seconds]}.
+    """
+    def __init__(self):
+        self.queries = {}
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.count += 1
+            self.seconds += elapsed
+            entry = self.queries.get(sql)
+            if entry is None:
+                self.queries[sql] = [1, elapsed]
+            else:
+                entry[0] += 1
+                entry[1] += elapsed
+
+    @property
+    def duplicates(self):
+        return self.count - len(self.queries)
+
+    def slowest(self, limit=SLOW_LOG_QUERIES):
+        """
+        The limit queries with the most total time, normalized and merged.
+        """
+        merged = {}
+        for sql, (count, seconds) in self.queries.items():
+            entry = merged.setdefault(normalize_sql(sql), [0, 0.0])
+            entry[0] += count
+            entry[1] += seconds
+        ranked = sorted(merged.items(), key=lambda item: item[1][1], reverse=True)[:limit]
+        return [{'sql': sql, 'count': count, 'ms': round(seconds * 1000, 2)} for sql, (count, seconds) in ranked]
+
+
+def server_timing(stats, total):
+    db = stats.seconds * 1000
+    return 'db;dur=%.1f;desc="%s queries, %s duplicates", app;dur=%.1f, total;dur=%.1f' % (
+        db, stats.count, stats.duplicates, max(total * 1000 - db, 0), total * 1000)
+
+
+class QueryInstrumentationMiddleware:
+    """
+    Counts the queries of every request, adds a Server-Timing header if enabled and logs slow requests.
+    Should be the first middleware, so that the queries of the other ones are counted too.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not getattr(settings, 'QUERY_INSTRUMENTATION_ENABLED', True):
+            return self.get_response(request)
+
+        stats = QueryStats()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(stats))
+            response = self.get_response(request)
+        total = time.perf_counter() - started
+
+        if getattr(settings, 'SERVER_TIMING_HEADER', False):
+            response['Server-Timing'] = server_timing(stats, total)
+        threshold = getattr(settings, 'SLOW_REQUEST_THRESHOLD_MS', 500)
+        if threshold is not None and total * 1000 >= threshold:
+            logger.warning(json.dumps({
+                'method': request.method,
+                'path': request.path,
+                'status': response.status_code,
+                'total_ms': round(total * 1000, 2),
+                'db_ms': round(stats.seconds * 1000, 2),
+                'queries': stats.count,
+                'duplicates': stats.duplicates,
+                'slowest': stats.slowest(),
+            }))
+        return response
@@ -0,0 +1,181 @@
+"""
+Token bucket rate limiting shared by all worker processes.
+
+Buckets live in a small SQLite file of their own (settings.RATELIMIT_STORE),
+so every gunicorn worker sees the same counters without an external
+service and without taking the write lock of the main database. Taking a
+token is a single INSERT ... ON CONFLICT DO UPDATE ... RETURNING
+statement, which refills the bucket, consumes a token if there is one
+and reports the result atomically.
+
+Limits are applied per view with the @ratelimit decorator and to every
+request with RateLimitMiddleware (settings.RATELIMIT_GLOBAL_RATE).
+Requests over the limit get 429 with a Retry-After header. If the store
+fails, requests are let through.
+
+Rates are written as '<tokens>/<period>', period s, m, h or d, e.g. '30/m':
+a bucket of 30 tokens refilled at 30 tokens per minute.
+"""
+import functools
+import math
+import random
+import sqlite3
+import threading
+import time
+
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+# Доля запросов, после которых из хранилища удаляются давно не использованные корзины
+PURGE_PROBABILITY = 0.001
+PURGE_AFTER = 86400
+
+TAKE_SQL = """
+    INSERT INTO buckets (key, tokens, updated, allowed) VALUES (:key, :capacity - 1, :now, 1)
+    ON CONFLICT (key) DO UPDATE SET
+        allowed = min(:capacity, tokens + (:now - updated) * :rate) >= 1,
+        tokens = min(:capacity, tokens + (:now - updated) * :rate) - (min(:capacity, tokens + (:now - updated) * :rate) >= 1),
+        updated = :now
+    RETURNING allowed, tokens
+"""
+
+
+def parse_rate(rate):
+    """
+    '30/m' -> (30, 0.5): bucket capacity and tokens refilled per second.
+    """
+    count, period = rate.split('/')
+    count = int(count)
+    return count, count / PERIODS[period]
+
+
+class SQLiteStore:
+    """
+    Token buckets in a SQLite file, one connection per thread.
+    """
+    def __init__(self, path):
+        self.path = str(path)
+        self._local = threading.local()
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=1, isolation_level=None, check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=OFF')
+            connection.execute('CREATE TABLE IF NOT EXISTS buckets '
+                               '(key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL, allowed INTEGER NOT NULL)')
+            self._local.connection = connection
+        return connection
+
+    def take(self, key, capacity, rate, now=None):
+        """
+        Takes a token from the bucket. Returns (allowed, seconds until the next token is available).
+        """
+        now = time.time() if now is None else now
+        connection = self._connection()
+        allowed, tokens = connection.execute(TAKE_SQL, {'key': key, 'capacity': capacity, 'rate': rate, 'now': now}).fetchone()
+        if random.random() < PURGE_PROBABILITY:
+            connection.execute('DELETE FROM buckets WHERE updated < ?', (now - PURGE_AFTER,))
+        return bool(allowed), 0 if allowed else math.ceil((1 - tokens) / rate)
+
+    def clear(self):
+        self._connection().execute('DELETE FROM buckets')
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_store():
+    path = str(settings.RATELIMIT_STORE)
+    with _stores_lock:
+        if path not in _stores:
+            _stores[path] = SQLiteStore(path)
+        return _stores[path]
+
+
+def client_ip(request):
+    if getattr(settings, 'RATELIMIT_TRUST_X_FORWARDED_FOR', False) and request.META.get('HTTP_X_FORWARDED_FOR'):
+        return request.META['HTTP_X_FORWARDED_FOR'].split(',')[0].strip()
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def client_keys(request, key):
+    """
+    Bucket keys of the client: 'ip', 'user' (skipped for anonymous users) or 'user_or_ip'.
+    """
+    user = getattr(request, 'user', None)
+    authenticated = user is not None and user.is_authenticated
+    if key == 'ip' or (key == 'user_or_ip' and not authenticated):
+        return ['ip:' + client_ip(request)]
+    if authenticated:
+        return ['user:%s' % user.pk]
+    return []
+
+
+def check(request, scope, rate, key='user_or_ip'):
+    """
+    Takes a token for every key of the client. Returns None if the request may proceed,
+    otherwise the number of seconds to wait.
+    """
+    if not getattr(settings, 'RATELIMIT_ENABLED', True):
+        return None
+    capacity, per_second = parse_rate(rate)
+    try:
+        store = get_store()
+        for client_key in client_keys(request, key):
+            allowed, retry_after = store.take('%s:%s' % (scope, client_key), capacity, per_second)
+            if not allowed:
+                return retry_after
+    except sqlite3.Error:
+        # Недоступное хранилище не должно ронять сайт
+        return None
+    return None
+
+
+def too_many_requests(request, retry_after):
+    if request.headers.get('x-requested-with') == 'XMLHttpRequest' or 'application/json' in request.headers.get('accept', ''):
+        response = JsonResponse({'error': 'Too many requests', 'retry_after': retry_after}, status=429)
+    else:
+        response = HttpResponse('Too many requests, retry in %s seconds.' % retry_after, status=429)
+    response['Retry-After'] = str(retry_after)
+    return response
+
+
+def ratelimit(rate, key='user_or_ip', methods=None, scope=None):
+    """
+    View decorator: @ratelimit('30/m') limits the view per user (or per IP for anonymous visitors).
+    methods restricts the limit to some HTTP methods, e.g. methods=('POST',).
+    """
+    def decorator(view):
+        view_scope = scope or '%s.%s' % (view.__module__, view.__name__)
+
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if methods is None or request.method in methods:
+                retry_after = check(request, view_scope, rate, key)
+                if retry_after is not None:
+                    return too_many_requests(request, retry_after)
+            return view(request, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class RateLimitMiddleware:
+    """
+    Limits every client IP to settings.RATELIMIT_GLOBAL_RATE requests, whatever the view.
+    Needs to come after AuthenticationMiddleware.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.static_prefix = '/' + settings.STATIC_URL.lstrip('/')
+
+    def __call__(self, request):
+        rate = getattr(settings, 'RATELIMIT_GLOBAL_RATE', None)
+        if rate and not request.path.startswith(self.static_prefix):
+            retry_after = check(request, 'global', rate, key='ip')
+            if retry_after is not None:
+                return too_many_requests(request, retry_after)
+        return self.get_response(request)
@@ -45,11 +45,13 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'locallibrary.instrumentation.QueryInstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'locallibrary.ratelimit.RateLimitMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -133,6 +135,46 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media/')
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Тесты работают с отдельным хранилищем ограничения частоты запросов и без журнала медленных запросов
+TEST_RUNNER = 'locallibrary.test_runner.TestRunner'
+
+# Ограничение частоты запросов (locallibrary.ratelimit), общее для всех процессов gunicorn
+RATELIMIT_ENABLED = config('RATELIMIT_ENABLED', default=True, cast=bool)
+RATELIMIT_STORE = BASE_DIR / 'ratelimit.sqlite3'
+# Общий лимит на клиента для всех страниц, отдельные представления ограничены строже
+RATELIMIT_GLOBAL_RATE = '300/m'
+# За прокси (nginx перед gunicorn) REMOTE_ADDR - адрес прокси, и все клиенты делили бы одну корзину.
+# Включать только если прокси сам выставляет X-Forwarded-For, иначе клиент может подделать заголовок
+RATELIMIT_TRUST_X_FORWARDED_FOR = config('RATELIMIT_TRUST_X_FORWARDED_FOR', default=False, cast=bool)
+
+# Счетчики SQL-запросов и заголовок Server-Timing (locallibrary.instrumentation)
+QUERY_INSTRUMENTATION_ENABLED = config('QUERY_INSTRUMENTATION_ENABLED', default=True, cast=bool)
+# Заголовок раскрывает время работы базы и число запросов, поэтому вне DEBUG включается явно
+SERVER_TIMING_HEADER = config('SERVER_TIMING_HEADER', default=DEBUG, cast=bool)
+# Запросы дольше порога пишутся в журнал медленных запросов
+SLOW_REQUEST_THRESHOLD_MS = config('SLOW_REQUEST_THRESHOLD_MS', default=500, cast=int)
+SLOW_REQUEST_LOG = config('SLOW_REQUEST_LOG', default=BASE_DIR / 'slow_requests.log', cast=Path)
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        # Сообщение уже JSON, к нему добавляется только время
+        'json_line': {'format': '{"time": "%(asctime)s", "request": %(message)s}'},
+    },
+    'handlers': {
+        'slow_requests': {
+            'class': 'logging.FileHandler',
+            'filename': SLOW_REQUEST_LOG,
+            'formatter': 'json_line',
+            'delay': True,
+        },
+    },
+    'loggers': {
+        'locallibrary.slow_requests': {'handlers': ['slow_requests'], 'level': 'WARNING', 'propagate': False},
+    },
+}
+
 LOGIN_REDIRECT_URL = '/'
 LOGOUT_REDIRECT_URL = '/'
 
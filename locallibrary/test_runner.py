@@ -0,0 +1,23 @@
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+
+
+class TestRunner(DiscoverRunner):
+    """
+    Runs the tests with their own rate limit store, so buckets left by another run
+    (or by the development server) don't throttle the test client, and without
+    the slow request log, which would collect every slow test request in the working tree.
+    """
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.state_dir = tempfile.mkdtemp()
+        settings.RATELIMIT_STORE = self.state_dir + '/ratelimit.sqlite3'
+        # Тесты журнала включают его через override_settings и перехватывают записи assertLogs
+        settings.SLOW_REQUEST_THRESHOLD_MS = None
+
+    def teardown_test_environment(self, **kwargs):
+        super().teardown_test_environment(**kwargs)
+        shutil.rmtree(self.state_dir, ignore_errors=True)
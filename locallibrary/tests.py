@@ -0,0 +1,205 @@
+from django.test import TestCase, RequestFactory, override_settings
+from django.urls import reverse
+from django.contrib.auth.models import AnonymousUser
+import shutil
+import tempfile
+
+from catalog import visits
+from locallibrary import ratelimit
+
+STORE_DIR = tempfile.mkdtemp()
+
+
+@override_settings(RATELIMIT_ENABLED=True, RATELIMIT_STORE=STORE_DIR + '/ratelimit.sqlite3', RATELIMIT_GLOBAL_RATE='1000/m')
+class RateLimitTest(TestCase):
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(STORE_DIR, ignore_errors=True)
+
+    def setUp(self):
+        ratelimit.get_store().clear()
+        visits.buffer.clear()
+        self.addCleanup(visits.buffer.clear)
+
+    def test_parse_rate(self):
+        self.assertEqual(ratelimit.parse_rate('30/m'), (30, 0.5))
+        self.assertEqual(ratelimit.parse_rate('5/s'), (5, 5))
+
+    def test_token_bucket_refills(self):
+        store = ratelimit.get_store()
+        results = [store.take('bucket', 3, 1, now=100) for _ in range(4)]
+        self.assertEqual([allowed for allowed, _ in results], [True, True, True, False])
+        self.assertEqual(results[-1][1], 1)
+        self.assertTrue(store.take('bucket', 3, 1, now=101)[0])
+        self.assertFalse(store.take('bucket', 3, 1, now=101)[0])
+        self.assertEqual(store.take('other', 3, 1, now=101), (True, 0))
+
+    def test_decorator_returns_429_with_retry_after(self):
+        @ratelimit.ratelimit('2/m', scope='test')
+        def view(request):
+            return 'ok'
+
+        request = RequestFactory().get('/', REMOTE_ADDR='10.0.0.1')
+        request.user = AnonymousUser()
+        self.assertEqual([view(request), view(request)], ['ok', 'ok'])
+        response = view(request)
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '30')
+
+        # Другой адрес считается отдельно
+        other = RequestFactory().get('/', REMOTE_ADDR='10.0.0.2')
+        other.user = AnonymousUser()
+        self.assertEqual(view(other), 'ok')
+
+    def test_ajax_endpoint_is_limited(self):
+        url = reverse('validate_username')
+        for _ in range(20):
+            self.assertEqual(self.client.get(url, {'username': 'x'}).status_code, 200)
+        response = self.client.get(url, {'username': 'x'}, headers={'x-requested-with': 'XMLHttpRequest'})
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response.json()['error'], 'Too many requests')
+
+    @override_settings(RATELIMIT_GLOBAL_RATE='2/h')
+    def test_middleware_limits_every_page(self):
+        self.client.get(reverse('catalog_main_page'))
+        self.client.get(reverse('author-list'))
+        response = self.client.get(reverse('book-list'))
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '1800')
+
+    @override_settings(RATELIMIT_ENABLED=False)
+    def test_disabled(self):
+        request = RequestFactory().get('/')
+        request.user = AnonymousUser()
+        self.assertIsNone(ratelimit.check(request, 'test', '1/h'))
+        self.assertIsNone(ratelimit.check(request, 'test', '1/h'))
+
+    def test_client_ip_behind_proxy(self):
+        request = RequestFactory().get('/', REMOTE_ADDR='10.0.0.1', HTTP_X_FORWARDED_FOR='203.0.113.5, 10.0.0.1')
+        self.assertEqual(ratelimit.client_ip(request), '10.0.0.1')
+        with self.settings(RATELIMIT_TRUST_X_FORWARDED_FOR=True):
+            self.assertEqual(ratelimit.client_ip(request), '203.0.113.5')
+
+
+import json
+
+from locallibrary import benchmarks
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class BenchmarkSuiteTest(TestCase):
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        visits.buffer.clear()
+        self.addCleanup(visits.buffer.clear)
+
+    def test_every_url_has_a_scenario_and_responds(self):
+        benchmarks.seed(60)
+        results = benchmarks.run(60, requests=1, import_rows=20)
+        self.assertEqual(benchmarks.missing_scenarios(results['urls']), [])
+        for name, result in results['urls'].items():
+            self.assertLess(result['status'], 400, name)
+        self.assertEqual(results['import']['rows'], 20)
+        # Результаты сериализуются в JSON
+        json.dumps(results)
+
+    def test_missing_scenarios(self):
+        self.assertIn('book-detail', benchmarks.missing_scenarios(['book-list']))
+
+
+class BenchmarkCompareTest(TestCase):
+
+    def results(self, queries=2, p50=10.0, peak=100.0, books=10000, host='bench-1'):
+        return {'meta': {'books': books, 'host': host},
+                'urls': {'book-list': {'queries': queries, 'p50_ms': p50, 'p90_ms': p50, 'peak_kib': peak}}}
+
+    def test_no_regression_within_tolerance(self):
+        self.assertEqual(benchmarks.compare(self.results(p50=14.0, peak=300.0), self.results(), tolerance=0.5), [])
+
+    def test_small_latency_changes_are_noise(self):
+        self.assertEqual(benchmarks.compare(self.results(p50=2.5), self.results(p50=1.0), tolerance=0.5), [])
+
+    def test_regressions(self):
+        regressions = benchmarks.compare(self.results(queries=3, p50=30.0, peak=1000.0), self.results(), tolerance=0.5)
+        self.assertEqual(len(regressions), 3)
+        self.assertIn('3 queries per request, baseline 2', regressions[0])
+
+    def test_latency_from_another_host_is_not_compared(self):
+        regressions = benchmarks.compare(self.results(p50=30.0, host='laptop'), self.results(), tolerance=0.5)
+        self.assertEqual(regressions, [])
+        regressions = benchmarks.compare(self.results(p50=30.0, host='laptop'), self.results(), tolerance=0.5,
+                                         compare_latency=True)
+        self.assertEqual(len(regressions), 1)
+        # Базовая линия без хоста записана неизвестно где
+        self.assertEqual(benchmarks.compare(self.results(p50=30.0), self.results(host=None), tolerance=0.5), [])
+
+    def test_queries_and_memory_are_always_compared(self):
+        regressions = benchmarks.compare(self.results(queries=3, peak=1000.0, host='laptop'), self.results(), tolerance=0.5)
+        self.assertEqual(len(regressions), 2)
+
+    def test_different_scale(self):
+        with self.assertRaises(benchmarks.BenchmarkError):
+            benchmarks.compare(self.results(books=100), self.results())
+
+
+from django.db import connection
+
+from catalog.models import Author
+from locallibrary import instrumentation
+
+
+class QueryInstrumentationTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        for author_num in range(3):
+            Author.objects.create(first_name='First %s' % author_num, last_name='Last %s' % author_num)
+
+    @override_settings(SERVER_TIMING_HEADER=True)
+    def test_server_timing_header(self):
+        resp = self.client.get(reverse('author-list'))
+        timing = resp['Server-Timing']
+        self.assertRegex(timing, r'^db;dur=[\d.]+;desc="2 queries, 0 duplicates", app;dur=[\d.]+, total;dur=[\d.]+$')
+
+    def test_duplicates_are_counted(self):
+        stats = instrumentation.QueryStats()
+        with connection.execute_wrapper(stats):
+            for author in Author.objects.all():
+                Author.objects.filter(pk=author.pk).exists()
+        self.assertEqual(stats.count, 4)
+        self.assertEqual(stats.duplicates, 2)
+        self.assertEqual(sorted(query['count'] for query in stats.slowest()), [1, 3])
+
+    @override_settings(SLOW_REQUEST_THRESHOLD_MS=0)
+    def test_slow_request_is_logged(self):
+        with self.assertLogs('locallibrary.slow_requests', 'WARNING') as logs:
+            self.client.get(reverse('author-list'))
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['path'], reverse('author-list'))
+        self.assertEqual(record['status'], 200)
+        # COUNT для пагинации и страница авторов
+        self.assertEqual(record['queries'], 2)
+        self.assertTrue(any('LIMIT ?' in query['sql'] for query in record['slowest']))
+
+    @override_settings(SERVER_TIMING_HEADER=False, SLOW_REQUEST_THRESHOLD_MS=0)
+    def test_header_is_optional(self):
+        with self.assertLogs('locallibrary.slow_requests', 'WARNING'):
+            self.assertNotIn('Server-Timing', self.client.get(reverse('author-list')))
+
+    @override_settings(QUERY_INSTRUMENTATION_ENABLED=False, SERVER_TIMING_HEADER=True)
+    def test_disabled(self):
+        self.assertNotIn('Server-Timing', self.client.get(reverse('author-list')))
+
+    def test_normalize_sql(self):
+        self.assertEqual(
+            instrumentation.normalize_sql('SELECT "t1"."id" FROM "t1" WHERE "t1"."id" IN (%s, %s,  %s) AND name = \'x\'\n LIMIT 21'),
+            'SELECT "t1"."id" FROM "t1" WHERE "t1"."id" IN (%s, ...) AND name = ? LIMIT ?')
@@ -0,0 +1,67 @@
+"""
+Conditional GET for the generic API views.
+
+The validators are computed with one small query before anything is
+serialized: the `updated` timestamp of the object for detail views and
+(max(updated), count) of the filtered queryset for list views. A request
+whose If-None-Match (or, for detail views, If-Modified-Since) still
+matches gets 304 Not Modified without running the serializers.
+
+List views only send an ETag: a deleted row lowers the count but not
+max(updated), so Last-Modified could not tell that the list changed.
+"""
+import hashlib
+
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+
+class ConditionalGetMixin:
+
+    def get_validators(self):
+        """
+        Returns (state, last_modified): a string identifying the current data, or None if there is nothing
+        to validate against, and a datetime for Last-Modified, or None.
+        """
+        raise NotImplementedError
+
+    def get_etag(self, state):
+        # Страница курсора и формат ответа (json или browsable API) входят в ETag
+        key = '%s|%s|%s' % (self.request.get_full_path(), self.request.accepted_renderer.format, state)
+        return 'W/' + quote_etag(hashlib.sha1(key.encode()).hexdigest())
+
+    def get(self, request, *args, **kwargs):
+        state, last_modified = self.get_validators()
+        if state is None:
+            return super().get(request, *args, **kwargs)
+        etag = self.get_etag(state)
+        timestamp = int(last_modified.timestamp()) if last_modified else None
+        response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+        if response is None:
+            response = super().get(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            if timestamp is not None:
+                response['Last-Modified'] = http_date(timestamp)
+        return response
+
+
+class ConditionalListMixin(ConditionalGetMixin):
+
+    def get_validators(self):
+        state = self.filter_queryset(self.get_queryset()).aggregate(last=Max('updated'), count=Count('pk'))
+        return '%s|%s' % (state['last'], state['count']), None
+
+
+class ConditionalDetailMixin(ConditionalGetMixin):
+
+    def get_validators(self):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        updated = (self.filter_queryset(self.get_queryset())
+                   .filter(**{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+                   .values_list('updated', flat=True).first())
+        if updated is None:
+            # Объекта нет, ответ 404 строит обычный обработчик
+            return None, None
+        return '%s|%s' % (self.kwargs[lookup_url_kwarg], updated.isoformat()), updated
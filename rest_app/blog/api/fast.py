@@ -0,0 +1,57 @@
+"""
+Opt-in fast read path for the list endpoints (settings.API_FAST_LISTS).
+
+Instead of building model instances and running them through the
+ModelSerializer fields, a FastListMixin view reads plain values() rows,
+collects the related id lists with one values_list() query per relation
+and hands the finished page to the JSON renderer, returning its bytes
+directly. The payload is the same, byte for byte, as the serializers
+produce; the browsable API and writes keep using the serializers.
+"""
+from collections import defaultdict
+
+from django.conf import settings
+from django.http import HttpResponse
+
+
+def related_ids(queryset, key, ids):
+    """
+    {key value: [related ids]} for the rows of queryset whose key is in ids, in the queryset's order.
+    """
+    grouped = defaultdict(list)
+    for key_value, related_id in queryset.filter(**{key + '__in': ids}).values_list(key, 'id'):
+        grouped[key_value].append(related_id)
+    return grouped
+
+
+class FastListMixin:
+    """
+    List view mixin serving JSON list responses from fast_rows() instead of the serializer.
+    """
+    fast_fields = ()
+
+    def use_fast_path(self):
+        return getattr(settings, 'API_FAST_LISTS', False) and self.request.accepted_renderer.format == 'json'
+
+    def fast_rows(self, rows):
+        """
+        Turns the values() rows of a page into the dicts the serializer would return.
+        """
+        raise NotImplementedError
+
+    def list(self, request, *args, **kwargs):
+        if not self.use_fast_path():
+            return super().list(request, *args, **kwargs)
+        queryset = self.filter_queryset(self.get_queryset()).prefetch_related(None).values(*self.fast_fields)
+        page = self.paginate_queryset(queryset)
+        if page is None:
+            data = self.fast_rows(list(queryset))
+        else:
+            data = {
+                'next': self.paginator.get_next_link(),
+                'previous': self.paginator.get_previous_link(),
+                'results': self.fast_rows(page),
+            }
+        renderer = request.accepted_renderer
+        content = renderer.render(data, request.accepted_media_type, self.get_renderer_context())
+        return HttpResponse(content, content_type=renderer.media_type)
@@ -0,0 +1,63 @@
+import time
+import tracemalloc
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import override_settings
+from rest_framework.test import APIClient
+
+from api.models import Comment, Post
+
+
+class Command(BaseCommand):
+    help = ("Compares requests per second and memory allocated per request of the list endpoints "
+            "with the serializers and with the fast values() path, on a throwaway test database.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=5000)
+        parser.add_argument('--page-size', type=int, default=100)
+        parser.add_argument('--requests', type=int, default=200)
+
+    def handle(self, *args, **options):
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            self.seed(options['posts'])
+            for url in ('/users/', '/posts/', '/comments/'):
+                url += '?page_size=%s' % options['page_size']
+                slow = self.measure(url, options['requests'], fast=False)
+                fast = self.measure(url, options['requests'], fast=True)
+                self.stdout.write(self.style.MIGRATE_HEADING(url))
+                self.stdout.write(f'  serializers: {slow[0]:8.1f} req/s, {slow[1]:8.1f} KiB peak allocation per request')
+                self.stdout.write(f'  fast path:   {fast[0]:8.1f} req/s, {fast[1]:8.1f} KiB peak allocation per request')
+                self.stdout.write(f'  speedup:     {fast[0] / slow[0]:8.2f}x')
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def seed(self, num_posts):
+        users = User.objects.bulk_create([User(username='user%s' % i) for i in range(max(num_posts // 10, 1))])
+        posts = Post.objects.bulk_create(
+            [Post(title='Post %s' % i, body='Body of post %s' % i, owner=users[i % len(users)]) for i in range(num_posts)],
+            batch_size=1000)
+        Comment.objects.bulk_create(
+            [Comment(body='Comment %s' % i, owner=users[i % len(users)], post=posts[i % len(posts)]) for i in range(3 * num_posts)],
+            batch_size=1000)
+
+    def measure(self, url, number, fast):
+        """
+        Returns (requests per second, KiB allocated at peak by one request).
+        """
+        client = APIClient()
+        with override_settings(API_FAST_LISTS=fast, ALLOWED_HOSTS=['testserver']):
+            assert client.get(url).status_code == 200
+            start = time.perf_counter()
+            for _ in range(number):
+                client.get(url)
+            seconds = time.perf_counter() - start
+
+            tracemalloc.start()
+            client.get(url)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        return number / seconds, peak / 1024
@@ -3,6 +3,8 @@ from django.db import models
 
 class Post(models.Model):
     created = models.DateTimeField(auto_now_add=True)
+    # Меняется и при изменении комментариев поста (api.signals), по нему считаются ETag
+    updated = models.DateTimeField(auto_now=True, db_index=True)
     title = models.CharField(max_length=100, blank=True, default='')
     body = models.TextField(blank=True, default='')
     owner = models.ForeignKey('auth.User', related_name='posts', on_delete=models.CASCADE)
@@ -12,6 +14,7 @@ class Post(models.Model):
 
 class Comment(models.Model):
     created = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(auto_now=True, db_index=True)
     body = models.TextField(blank=False)
     owner = models.ForeignKey('auth.User', related_name='comments', on_delete=models.CASCADE)
     post = models.ForeignKey('Post', related_name='comments', on_delete=models.CASCADE)
@@ -0,0 +1,12 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import Comment, Post
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def comment_changed(sender, instance, **kwargs):
+    # Пост показывает id своих комментариев, поэтому его ETag тоже должен измениться
+    Post.objects.filter(pk=instance.post_id).update(updated=timezone.now())
@@ -1,3 +1,146 @@
 from django.test import TestCase
+from django.contrib.auth.models import User
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from .models import Post, Comment
+
+
+class ListQueryCountTest(TestCase):
+    """
+    List endpoints run the same number of queries whatever the page size.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        for user_num in range(30):
+            user = User.objects.create_user(username='user%s' % user_num)
+            post = Post.objects.create(title='Post %s' % user_num, body='', owner=user)
+            for comment_num in range(3):
+                Comment.objects.create(body='Comment %s' % comment_num, owner=user, post=post)
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def assertConstantQueries(self, url, num_queries, total):
+        for page_size in (1, 10, 50):
+            with self.assertNumQueries(num_queries):
+                response = self.client.get(url, {'page_size': page_size})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.data['results']), min(page_size, total))
+
+    def test_users(self):
+        # Пользователи, их посты и комментарии
+        self.assertConstantQueries('/users/', 3, total=30)
+
+    def test_posts(self):
+        # ETag (max(updated), count), посты с авторами и id комментариев
+        self.assertConstantQueries('/posts/', 3, total=30)
+
+    def test_comments(self):
+        # ETag и комментарии с авторами
+        self.assertConstantQueries('/comments/', 2, total=90)
+
+    def test_related_ids(self):
+        user = User.objects.get(username='user0')
+        response = self.client.get('/users/%s/' % user.pk)
+        self.assertEqual(response.data['posts'], list(user.posts.values_list('id', flat=True)))
+        self.assertEqual(response.data['comments'], list(user.comments.values_list('id', flat=True)))
+
+    def test_cursor_pagination_walks_every_post(self):
+        ids, url = [], '/posts/?page_size=7'
+        while url:
+            response = self.client.get(url)
+            ids += [post['id'] for post in response.data['results']]
+            url = response.data['next']
+        self.assertEqual(ids, sorted(Post.objects.values_list('id', flat=True)))
+
+
+class ConditionalGetTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='author', password='12345')
+        cls.post = Post.objects.create(title='Post', body='', owner=cls.user)
+        cls.comment = Comment.objects.create(body='Comment', owner=cls.user, post=cls.post)
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def assertNotModified(self, url, etag, num_queries=1):
+        with self.assertNumQueries(num_queries):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_list_returns_304_until_it_changes(self):
+        for url in ('/posts/', '/comments/'):
+            etag = self.client.get(url)['ETag']
+            self.assertNotModified(url, etag)
+            self.assertNotEqual(self.client.get(url + '?page_size=1')['ETag'], etag)
+
+        etag = self.client.get('/comments/')['ETag']
+        Comment.objects.create(body='Another', owner=self.user, post=self.post)
+        self.assertEqual(self.client.get('/comments/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_list_etag_changes_on_delete(self):
+        Comment.objects.create(body='Older', owner=self.user, post=self.post)
+        etag = self.client.get('/comments/')['ETag']
+        Comment.objects.order_by('updated').first().delete()
+        self.assertEqual(self.client.get('/comments/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_detail_returns_304(self):
+        url = '/posts/%s/' % self.post.pk
+        response = self.client.get(url)
+        self.assertIn('Last-Modified', response)
+        self.assertNotModified(url, response['ETag'])
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code, 304)
+        self.assertEqual(self.client.get('/posts/0/', HTTP_IF_NONE_MATCH=response['ETag']).status_code, 404)
+
+    def test_new_comment_changes_post_etag(self):
+        url = '/posts/%s/' % self.post.pk
+        etag = self.client.get(url)['ETag']
+        Comment.objects.create(body='Another', owner=self.user, post=self.post)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['comments']), 2)
+
+
+from django.test import override_settings
+
+class FastListTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        users = [User.objects.create_user(username=name) for name in ('ann', 'Борис', 'no_posts')]
+        for post_num in range(7):
+            post = Post.objects.create(title='Post "%s"   ünïcode' % post_num, body='line\nbreak\t\\', owner=users[post_num % 2])
+            for comment_num in range(post_num % 3):
+                Comment.objects.create(body='Comment </script> %s' % comment_num, owner=users[comment_num % 2], post=post)
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def fetch_all(self, url):
+        pages = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            pages.append((response.content, response['Content-Type']))
+            url = response.json()['next']
+        return pages
+
+    def test_fast_path_is_byte_for_byte_compatible(self):
+        for url in ('/users/?page_size=2', '/posts/?page_size=3', '/comments/?page_size=4', '/posts/?format=json'):
+            expected = self.fetch_all(url)
+            with override_settings(API_FAST_LISTS=True):
+                self.assertEqual(self.fetch_all(url), expected)
+
+    @override_settings(API_FAST_LISTS=True)
+    def test_fast_path_queries(self):
+        # ETag, посты и id комментариев
+        with self.assertNumQueries(3):
+            self.client.get('/posts/')
+        # Браузерный API по-прежнему строится сериализаторами
+        response = self.client.get('/posts/', HTTP_ACCEPT='text/html')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Post List', response.content.decode())
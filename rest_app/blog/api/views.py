@@ -5,45 +5,90 @@ from django.contrib.auth.models import User
 # Create your views here.
 from .models import Post, Comment
 from rest_framework import generics, permissions
+from django.db.models import Prefetch
 from .serializers import PostSerializer
 from .permissions import IsOwnerOrReadOnly
-    
+from .conditional import ConditionalDetailMixin, ConditionalListMixin
+from .fast import FastListMixin, related_ids
 
-class UserList(generics.ListAPIView):
-    queryset = User.objects.all()
+
+# Для списков связанных id нужны только id: один запрос на связь для всей страницы
+def users_with_related_ids():
+    return User.objects.prefetch_related(
+        Prefetch('posts', queryset=Post.objects.only('id', 'owner_id')),
+        Prefetch('comments', queryset=Comment.objects.only('id', 'owner_id')))
+
+
+def posts_with_related_ids():
+    return Post.objects.select_related('owner').prefetch_related(
+        Prefetch('comments', queryset=Comment.objects.only('id', 'post_id')))
+
+
+class UserList(FastListMixin, generics.ListAPIView):
     serializer_class = serializers.UserSerializer
+    fast_fields = ('id', 'username')
+
+    def get_queryset(self):
+        return users_with_related_ids()
+
+    def fast_rows(self, rows):
+        ids = [row['id'] for row in rows]
+        posts, comments = related_ids(Post.objects, 'owner', ids), related_ids(Comment.objects, 'owner', ids)
+        return [{'id': row['id'], 'username': row['username'], 'posts': posts[row['id']], 'comments': comments[row['id']]}
+                for row in rows]
 
 
 class UserDetail(generics.RetrieveAPIView):
-    queryset = User.objects.all()
     serializer_class = serializers.UserSerializer
 
-class PostList(generics.ListCreateAPIView):
-    queryset = Post.objects.all()
+    def get_queryset(self):
+        return users_with_related_ids()
+
+class PostList(ConditionalListMixin, FastListMixin, generics.ListCreateAPIView):
     serializer_class = PostSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    fast_fields = ('id', 'title', 'body', 'owner__username')
+
+    def get_queryset(self):
+        return posts_with_related_ids()
+
+    def fast_rows(self, rows):
+        comments = related_ids(Comment.objects, 'post', [row['id'] for row in rows])
+        return [{'id': row['id'], 'title': row['title'], 'body': row['body'], 'owner': row['owner__username'],
+                 'comments': comments[row['id']]} for row in rows]
 
     def perform_create(self, serializer):
         serializer.save(owner=self.request.user)
 
 
-class PostDetail(generics.RetrieveUpdateDestroyAPIView):
-    queryset = Post.objects.all()
+class PostDetail(ConditionalDetailMixin, generics.RetrieveUpdateDestroyAPIView):
     serializer_class = PostSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly,
                             IsOwnerOrReadOnly]
 
-class CommentList(generics.ListCreateAPIView):
-    queryset = Comment.objects.all()
+    def get_queryset(self):
+        return posts_with_related_ids()
+
+class CommentList(ConditionalListMixin, FastListMixin, generics.ListCreateAPIView):
     serializer_class = serializers.CommentSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    fast_fields = ('id', 'body', 'owner__username', 'post')
+
+    def get_queryset(self):
+        return Comment.objects.select_related('owner')
+
+    def fast_rows(self, rows):
+        return [{'id': row['id'], 'body': row['body'], 'owner': row['owner__username'], 'post': row['post']}
+                for row in rows]
 
     def perform_create(self, serializer):
         serializer.save(owner=self.request.user)
 
-class CommentDetail(generics.RetrieveUpdateDestroyAPIView):
-    queryset = Comment.objects.all()
+class CommentDetail(ConditionalDetailMixin, generics.RetrieveUpdateDestroyAPIView):
     serializer_class = serializers.CommentSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly,
                             IsOwnerOrReadOnly]
+
+    def get_queryset(self):
+        return Comment.objects.select_related('owner')
     
\ No newline at end of file
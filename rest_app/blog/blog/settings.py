@@ -128,3 +128,11 @@ STATIC_URL = 'static/'
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+REST_FRAMEWORK = {
+    # Курсорная пагинация по id для всех списков
+    'DEFAULT_PAGINATION_CLASS': 'api.pagination.IdCursorPagination',
+}
+
+# Списки в JSON строятся из values() без сериализаторов (api.fast)
+API_FAST_LISTS = False
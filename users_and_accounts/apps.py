@@ -1,6 +1,16 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate, post_save
 
 
 class UsersAndAccountsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'users_and_accounts'
+
+    def ready(self):
+        from django.contrib.auth.models import User
+        from .usernames import create_username_index, username_saved
+
+        # Новые пользователи этого процесса сразу попадают в фильтр проверки логинов
+        post_save.connect(username_saved, sender=User, dispatch_uid='users_and_accounts.username_saved')
+        # Функциональный индекс по lower(username) на чужой таблице auth_user создается после migrate
+        post_migrate.connect(create_username_index, sender=self)
@@ -1,3 +1,54 @@
 from django.test import TestCase
+from django.urls import reverse
+from django.db import connection
+from django.contrib.auth.models import User
 
-# Create your tests here.
+from . import usernames
+
+
+class UsernameFilterTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        User.objects.create_user(username='MaryShelley')
+
+    def setUp(self):
+        usernames.invalidate_filter()
+
+    def test_bloom_filter_has_no_false_negatives(self):
+        bloom = usernames.BloomFilter(1000)
+        names = ['user%s' % i for i in range(1000)]
+        for name in names:
+            bloom.add(name)
+        self.assertTrue(all(name in bloom for name in names))
+        false_positives = sum('other%s' % i in bloom for i in range(10000))
+        self.assertLess(false_positives, 300)
+
+    def test_validate_username(self):
+        url = reverse('validate_username')
+        self.assertTrue(self.client.get(url, {'username': 'maryshelley'}).json()['is_taken'])
+        self.assertFalse(self.client.get(url, {'username': 'percy'}).json()['is_taken'])
+
+    def test_free_username_needs_no_query(self):
+        usernames.get_filter()
+        with self.assertNumQueries(0):
+            self.assertFalse(usernames.is_username_taken('percy'))
+        with self.assertNumQueries(1):
+            self.assertTrue(usernames.is_username_taken('MARYSHELLEY'))
+
+    def test_new_users_are_added_to_the_filter(self):
+        usernames.get_filter()
+        User.objects.create_user(username='Percy')
+        self.assertTrue(usernames.is_username_taken('percy'))
+
+    def test_non_ascii_username(self):
+        User.objects.create_user(username='Иван')
+        usernames.get_filter()
+        self.assertTrue(usernames.is_username_taken('Иван'))
+        self.assertEqual(usernames.is_username_taken('иван'), User.objects.filter(username__iexact='иван').exists())
+        self.assertFalse(usernames.is_username_taken('Пётр'))
+
+    def test_lower_index_exists(self):
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, User._meta.db_table)
+        self.assertIn(usernames.USERNAME_LOWER_INDEX, constraints)
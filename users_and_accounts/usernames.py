@@ -0,0 +1,113 @@
+"""
+Fast username availability check for the registration form.
+
+Every worker keeps a Bloom filter over the lower-cased usernames. A name
+the filter doesn't contain is definitely free and is answered without a
+query; only "maybe taken" names are checked in the database. Both sides
+are folded the same way as username__iexact: ASCII names with
+lower(username) = %s, answered by the functional index created after
+migrate, other names with iexact itself, because SQLite's lower() only
+folds ASCII letters. Users saved in this process are added from post_save, users
+created by other workers are picked up when the filter is rebuilt every
+FILTER_TTL seconds, until then they are caught by the database check of
+the registration form itself.
+"""
+import hashlib
+import math
+import threading
+import time
+
+from django.contrib.auth.models import User
+from django.db import connections, DEFAULT_DB_ALIAS
+from django.db.models.functions import Lower
+
+USERNAME_LOWER_INDEX = 'auth_user_username_lower_idx'
+# Доля ложных "возможно занято", на которую рассчитывается фильтр
+FALSE_POSITIVE_RATE = 0.01
+# Через сколько секунд фильтр перестраивается, чтобы увидеть пользователей других процессов
+FILTER_TTL = 300
+
+
+class BloomFilter:
+    """
+    Bloom filter over strings, sized for capacity items at the given false positive rate.
+    """
+    def __init__(self, capacity, false_positive_rate=FALSE_POSITIVE_RATE):
+        capacity = max(capacity, 1)
+        self.capacity = capacity
+        self.size = max(8, int(-capacity * math.log(false_positive_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, value):
+        # Двойное хеширование: k позиций из двух 64-битных половин одного blake2b
+        digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+        return ((first + i * second) % self.size for i in range(self.hashes))
+
+    def add(self, value):
+        for position in self._positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, value):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+
+def build_filter():
+    usernames = User.objects.values_list('username', flat=True)
+    # Запас вдвое, чтобы регистрации до следующей перестройки не портили точность
+    bloom = BloomFilter(2 * User.objects.count() + 1000)
+    # Имена приводятся к нижнему регистру в Python, как и проверяемое имя
+    for username in usernames.iterator(chunk_size=10000):
+        bloom.add(username.lower())
+    bloom.built = time.monotonic()
+    return bloom
+
+
+_lock = threading.Lock()
+_filter = None
+
+
+def get_filter():
+    global _filter
+    with _lock:
+        if _filter is None or time.monotonic() - _filter.built > FILTER_TTL or _filter.count > _filter.capacity:
+            _filter = build_filter()
+        return _filter
+
+
+def invalidate_filter():
+    global _filter
+    with _lock:
+        _filter = None
+
+
+def username_saved(sender, instance, **kwargs):
+    if _filter is not None:
+        with _lock:
+            _filter.add(instance.username.lower())
+
+
+def is_username_taken(username):
+    """
+    Case-insensitive check whether a user with this username exists.
+    """
+    username = username or ''
+    if username.lower() not in get_filter():
+        return False
+    if username.isascii():
+        # Для ASCII lower(username) = %s совпадает с iexact и использует индекс
+        return User.objects.annotate(username_lower=Lower('username')).filter(username_lower=username.lower()).exists()
+    return User.objects.filter(username__iexact=username).exists()
+
+
+def create_username_index(using=DEFAULT_DB_ALIAS, **kwargs):
+    """
+    Creates the lower(username) index on the auth_user table. Safe to call repeatedly, used as a post_migrate handler.
+    """
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        cursor.execute('CREATE INDEX IF NOT EXISTS %s ON %s (lower(%s))' % (
+            USERNAME_LOWER_INDEX, connection.ops.quote_name(User._meta.db_table), connection.ops.quote_name('username')))
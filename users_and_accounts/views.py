@@ -2,11 +2,12 @@ from django.shortcuts import render, redirect
 from django.urls import reverse_lazy
 from .forms import NewUserForm, UserEditForm, ProfileEditForm, ContactForm
 from .models import Profile
+from .usernames import is_username_taken
+from locallibrary.ratelimit import ratelimit
 from django.contrib.auth import login
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 
-from django.contrib.auth.models import User
 from django.http import JsonResponse
 from django.contrib.auth.forms import UserCreationForm
 from django.views.generic.edit import CreateView
@@ -23,11 +24,14 @@ from django.views.generic.edit import CreateView
 #         login(self.request, self.object)
 #         return valid
 
+# Запрос на каждое нажатие клавиши: 10 в секунду с запасом на быстрый набор
+@ratelimit('20/s', key='ip')
 def validate_username(request):
     """Проверка доступности логина"""
     username = request.GET.get('username', None)
+    # Свободные логины определяются фильтром в памяти, без запроса к базе
     response = {
-        'is_taken': User.objects.filter(username__iexact=username).exists()
+        'is_taken': is_username_taken(username)
     }
     return JsonResponse(response)
 
@@ -70,6 +74,7 @@ def profile_edit(request):
 def is_ajax(request):
     return request.META.get('HTTP_X_REQUESTED_WITH') == 'XMLHttpRequest'
 
+@ratelimit('5/m', methods=('POST',))
 def contact_form(request):
     form = ContactForm()
     if request.method == "POST" and is_ajax(request):